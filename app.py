@@ -1,28 +1,21 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import graphviz
-from sklearn.metrics import accuracy_score # We might use this later
-from sklearn.datasets import load_iris
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.tree import export_graphviz
-
-import matplotlib # 导入 matplotlib
-
-# --- 设置 Matplotlib 支持中文 (适配 Streamlit Cloud) ---
-# 这是第三步需要修改的地方：
-try:
-    # 指定使用通过 packages.txt 安装的 WenQuanYi Micro Hei 字体
-    plt.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei']
-    plt.rcParams['axes.unicode_minus'] = False # 解决保存图像是负号'-'显示为方块的问题
-    print("成功设置字体为 WenQuanYi Micro Hei") # 在后台日志中打印，便于调试
-except Exception as e:
-    # 如果设置失败，发出警告
-    st.warning(f"无法设置中文字体 'WenQuanYi Micro Hei'，图表标签可能显示为方框。请确保 packages.txt 文件包含 'fonts-wqy-microhei' 并已成功安装。错误: {e}")
-    print(f"字体设置失败: {e}") # 在后台日志中打印错误
 
+# instrumentation 最先导入：启动测量模式下要记录之后所有重型依赖的导入耗时。
+# sklearn / matplotlib / pandas 都在各阶段第一次用到时才导入，页面标题和阶段 1 不必等它们。
+from instrumentation import STARTUP_LOG_PATH, STARTUP_PROFILE, Profiler, startup_report
+from figures import FigureManager, global_stats
+from stages import data_source, stage1, stage2, stage3, stage4, stage5, stage6, stage7, stage8
+from stages.common import (GRAPH_COLLAPSE_DEPTH, GRAPH_COLLAPSE_SAMPLES, GRAPH_FULL_MAX_NODES, get_artifact_store,
+                           get_model_cache, get_render_cache, simple_data)
+
+# --- Profiling ---
+# 每个会话一个性能记录器：每个阶段和耗时调用记录为 span，页面底部的侧边栏显示本次重跑的分解和历史
+if "profiler" not in st.session_state:
+    st.session_state.profiler = Profiler()
+profiler = st.session_state.profiler
+profiler.begin_run(trace_memory=st.session_state.get("profile_trace_memory", False))
+profiler.stage("页面准备")
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -33,855 +26,117 @@ st.set_page_config(
 
 st.title("🌳 决策树探秘之旅")
 st.caption("一步步理解决策树如何进行分类")
-
-# --- Helper Function for Plotting ---
-def plot_data(X, y, split_feature=None, split_value=None, ax=None, title="数据分布"):
-    """绘制二维数据点及可选的分割线"""
-    if ax is None:
-        fig, ax = plt.subplots(figsize=(6, 5))
-    else:
-        fig = ax.figure
-
-    colors = {0: 'red', 1: 'blue'}
-    markers = {0: 'o', 1: 's'}
-    labels = {0: '类别 0', 1: '类别 1'}
-
-    for class_value in np.unique(y):
-        subset = X[y == class_value]
-        ax.scatter(subset[:, 0], subset[:, 1],
-                   c=colors[class_value],
-                   label=labels[class_value],
-                   marker=markers[class_value],
-                   edgecolor='k', s=50)
-
-    ax.set_xlabel("特征 X1")
-    ax.set_ylabel("特征 X2")
-    ax.set_title(title) # 标题会使用设置的中文字体
-    ax.legend() # 图例也会使用设置的中文字体
-    ax.grid(True, linestyle='--', alpha=0.6)
-
-    # 绘制分割线
-    if split_feature is not None and split_value is not None:
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        if split_feature == 0: # Split on X1 (vertical line)
-            ax.vlines(split_value, ymin=ylim[0], ymax=ylim[1], color='green', lw=3, linestyle='--')
-            ax.text(split_value + 0.05 * (xlim[1]-xlim[0]), ylim[0] + 0.9 * (ylim[1]-ylim[0]),
-                    f'X1 = {split_value:.2f}', color='green', ha='left')
-        elif split_feature == 1: # Split on X2 (horizontal line)
-            ax.hlines(split_value, xmin=xlim[0], xmax=xlim[1], color='green', lw=3, linestyle='--')
-            ax.text(xlim[0] + 0.05 * (xlim[1]-xlim[0]), split_value + 0.05 * (ylim[1]-ylim[0]),
-                    f'X2 = {split_value:.2f}', color='green', va='bottom')
-        ax.set_xlim(xlim)
-        ax.set_ylim(ylim)
-
-    return fig, ax
-
-# --- Stage 1: 分类的直觉 ---
-st.header("阶段 1: 分类的直觉 - 用规则区分")
-st.markdown("""
-想象一下我们有一些数据点，每个点属于两个类别（红色圆圈🔵 或 蓝色方块🟥）中的一个。
-我们的目标是找到一些简单的“规则”来区分它们。
-
-**任务:** 尝试调整下面的滑块，画出一条**垂直**或**水平**的分割线，看看是否能很好地把红点和蓝点分开。
-""")
-
-# 1.1 生成简单的二维数据
-np.random.seed(42) # for reproducibility
-X_simple = np.random.rand(50, 2) * 5
-# 简单的线性规则: 如果 X1 > 2.5，则为类别 1 (蓝色)，否则为类别 0 (红色)
-y_simple = (X_simple[:, 0] > 2.5).astype(int)
-# 加入一些噪音
-noise_indices = np.random.choice(len(X_simple), size=5, replace=False)
-y_simple[noise_indices] = 1 - y_simple[noise_indices]
-
-
-# 1.2 互动控件
-col1_1, col1_2 = st.columns([1, 2])
-
-with col1_1:
-    st.subheader("选择分割规则")
-    feature_map = {"特征 X1 (画垂直线)": 0, "特征 X2 (画水平线)": 1}
-    selected_feature_name = st.radio("选择要依据的特征:", list(feature_map.keys()))
-    selected_feature_idx = feature_map[selected_feature_name]
-
-    # 根据所选特征设置滑块范围
-    min_val = X_simple[:, selected_feature_idx].min()
-    max_val = X_simple[:, selected_feature_idx].max()
-    step = (max_val - min_val) / 50
-    default_val = (min_val + max_val) / 2
-
-    split_value = st.slider(f"设置 '{selected_feature_name.split(' ')[1]}' 的分割阈值:",
-                            min_value=min_val, max_value=max_val, value=default_val, step=step)
-
-with col1_2:
-    st.subheader("数据和你的分割线")
-    fig1, ax1 = plot_data(X_simple, y_simple,
-                          split_feature=selected_feature_idx,
-                          split_value=split_value,
-                          title="简单数据集与你的分割尝试") # 标题是中文
-    st.pyplot(fig1)
-
-st.markdown("""
-**思考:**
-*   你画的这条线能完美分开两种颜色的点吗？
-*   只用一条线够吗？如果不够，可能需要怎么做？
-*   选择哪个特征（X1 或 X2）和哪个阈值似乎分得更好？
-""")
-st.markdown("---")
-
-
-# --- Stage 2: 决策树的样子 ---
-st.header("阶段 2: 决策树的样子 - 像流程图一样思考")
-st.markdown("""
-决策树就像一个流程图，它把我们在阶段 1 中尝试的“规则”（提问）串联起来。
-
-下面是一个针对上面简单数据集构建的**示例决策树**:
-""")
-
-# 2.1 预设一个简单的决策树 (DOT 语言)
-# 这个树对应 X1 <= 2.5 的分割规则
-dot_simple_tree = graphviz.Digraph(comment='简单决策树示例')
-dot_simple_tree.node('0', 'X1 <= 2.61 ?\n(根节点)')
-dot_simple_tree.node('1', '预测: 红色 🔵\n(叶节点)')
-dot_simple_tree.node('2', '预测: 蓝色 🟥\n(叶节点)')
-dot_simple_tree.edge('0', '1', label='是 (True)')
-dot_simple_tree.edge('0', '2', label='否 (False)')
-
-st.graphviz_chart(dot_simple_tree)
-
-st.markdown("""
-**解读:**
-1.  从 **根节点** 开始提问：“特征 X1 是否小于等于 2.61？”
-2.  如果答案是 **是 (True)**，则沿着标有“是”的 **分支** 向左走，到达 **叶节点**，预测该点为 **红色 🔵**。
-3.  如果答案是 **否 (False)**，则沿着标有“否”的 **分支** 向右走，到达另一个 **叶节点**，预测该点为 **蓝色 🟥**。
-
-**互动演示:** 输入一个新数据点的坐标，看看它会沿着树的哪个路径走。
-""")
-
-col2_1, col2_2 = st.columns(2)
-
-with col2_1:
-    st.subheader("输入新数据点坐标")
-    new_x1 = st.number_input("输入 特征 X1 的值:", value=1.5, step=0.1)
-    new_x2 = st.number_input("输入 特征 X2 的值:", value=3.0, step=0.1)
-
-with col2_2:
-    st.subheader("决策路径分析")
-    # 根据简单树的规则判断
-    if new_x1 <= 2.61:
-        st.success(f"1. **问题:** X1 ({new_x1:.2f}) <= 2.61 ?  **回答: 是 (True)**")
-        st.info("   -> 沿着 '是' 分支走...")
-        st.markdown("2. **到达叶节点:** 预测为 **红色 🔵**")
-        final_prediction = "红色 🔵"
+profiler.mark("header")
+
+# --- Figure Management ---
+# 每个会话一个图像管理器：每个绘图位置复用同一张画布，重跑时原地更新，不往 pyplot 的全局注册表里堆积图像
+if "figure_manager" not in st.session_state:
+    st.session_state.figure_manager = FigureManager()
+figure_manager = st.session_state.figure_manager
+figure_manager.begin_run()
+
+# --- Tree Graph Display Settings ---
+with st.sidebar.expander("结构图显示", expanded=False):
+    st.slider("大树折叠深度", min_value=2, max_value=10, value=GRAPH_COLLAPSE_DEPTH, key="graph_collapse_depth",
+              help=f"节点数超过 {GRAPH_FULL_MAX_NODES} 的树只展开到这一层，更深的子树折叠为汇总节点。")
+    st.slider("折叠样本数阈值", min_value=1, max_value=50, value=GRAPH_COLLAPSE_SAMPLES, key="graph_collapse_samples",
+              help="大树中样本数少于此值的子树也会被折叠。")
+
+# --- Stages ---
+# 每个阶段是一个独立的片段 (st.fragment)：阶段内的控件变化时只重跑该阶段，
+# 侧边栏的设置 (数据源、结构图折叠) 变化时才整页重跑。示例数据等确定性结果整个进程只生成一次，所有会话共享。
+X_simple, y_simple = simple_data()
+stage1.render(X_simple, y_simple)
+stage2.render(X_simple, y_simple)
+
+profiler.stage("数据源")
+pipe_data, table_data = data_source.render(X_simple, y_simple)
+
+stage3.render(pipe_data)
+stage4.render(pipe_data)
+stage5.render(pipe_data)
+stage6.render(table_data)
+stage7.render(X_simple, y_simple)
+stage8.render()
+
+# --- Model Cache Stats ---
+profiler.stage("侧边栏")
+with st.sidebar.expander("模型缓存", expanded=False):
+    cache_stats = get_model_cache().stats()
+    st.caption(f"已缓存 {cache_stats['size']}/{cache_stats['max_entries']} 个模型 · "
+               f"命中 {cache_stats['hits']} · 训练 {cache_stats['misses']} · 淘汰 {cache_stats['evictions']}")
+    for job_name, progress in cache_stats['prewarm'].items():
+        st.progress(progress['done'] / max(progress['total'], 1), text=f"预热 {job_name}: {progress['done']}/{progress['total']}")
+
+# --- Figure Memory Stats ---
+with st.sidebar.expander("图像内存", expanded=False):
+    session_fig_stats = figure_manager.stats()
+    process_fig_stats = global_stats()
+    st.caption(f"本会话: {session_fig_stats['figures']} 张图 · {session_fig_stats['bytes'] / 1e3:.1f} KB")
+    st.caption(f"整个进程: {process_fig_stats['sessions']} 个会话 · {process_fig_stats['figures']} 张图 · "
+               f"{process_fig_stats['bytes'] / 1e3:.1f} KB")
+
+with st.sidebar.expander("结构图渲染缓存", expanded=False):
+    render_stats = get_render_cache().stats()
+    if render_stats['available']:
+        st.caption(f"已缓存 {render_stats['size']} 张 SVG · {render_stats['bytes'] / 1e3:.1f} KB · "
+                   f"命中 {render_stats['hits']} · 排版 {render_stats['misses']} · 淘汰 {render_stats['evictions']}")
     else:
-        st.success(f"1. **问题:** X1 ({new_x1:.2f}) <= 2.61 ?  **回答: 否 (False)**")
-        st.info("   -> 沿着 '否' 分支走...")
-        st.markdown("2. **到达叶节点:** 预测为 **蓝色 🟥**")
-        final_prediction = "蓝色 🟥"
-
-    # 可视化这个新点
-    fig2, ax2 = plot_data(X_simple, y_simple, title="数据点与新输入的点") # 中文标题
-    ax2.scatter(new_x1, new_x2, c='lime', marker='*', s=200, edgecolor='black', label=f'新点 ({new_x1:.1f}, {new_x2:.1f})\n预测: {final_prediction}')
-    ax2.legend() # 图例
-    st.pyplot(fig2)
-
-
-st.markdown("""
-**小结:** 决策树提供了一种结构化的方式来应用一系列规则，对数据进行分类。每个内部节点代表一个问题（基于某个特征的测试），每个分支代表一个答案，每个叶节点代表一个最终的分类预测。
-""")
-st.markdown("---")
-
-
-# --- Stage 3: 决策的核心 - 如何选择“最好的”问题？ ---
-st.header("阶段 3: 决策的核心 - 如何选择“最好的”问题？")
-st.markdown(r"""
-在阶段 1，我们凭直觉尝试分割数据。但机器如何**自动**找到“最好”的分割线呢？
-决策树通过衡量数据的“**纯度**”或“**不纯度**”来做到这一点。一个好的分割应该让分割后的两个区域都尽可能“纯”（即包含的类别尽量单一）。
-
-我们使用 **基尼不纯度 (Gini Impurity)** 来衡量这种混乱程度：
-*   公式: $Gini = 1 - \sum_{k} (p_k)^2$，其中 $p_k$ 是类别 $k$ 的样本比例。
-*   Gini = 0 表示完全纯净（所有样本属于同一类）。
-*   Gini = 0.5 表示最混乱（二分类情况下，两类样本各占一半）。
-
-**目标:** 找到一个分割（一个特征 + 一个阈值），使得分割后的**加权平均 Gini 不纯度最小**，也就是**信息增益最大**。
-
-**信息增益 = (分割前的 Gini) - (分割后的加权平均 Gini)**
-
-**任务:** 再次尝试选择特征和分割阈值，观察分割如何影响 Gini 不纯度，并找到使**信息增益**最大的分割。
-""")
-
-# --- Impurity Calculation Functions ---
-def calculate_gini(y):
-    """计算一个节点 (或数据集) 的基尼不纯度"""
-    if len(y) == 0:
-        return 0
-    # 使用 np.bincount 计算每个类别的样本数，确保考虑所有可能的类别（即使当前子集中没有）
-    # 假设 y 中的值是从 0 开始的整数类别标签
-    max_label = np.max(y_simple) if len(y_simple) > 0 else 0 # 获取全局最大标签值
-    counts = np.bincount(y, minlength=max_label + 1)
-    # 仅考虑实际存在的样本进行比例计算
-    valid_counts = counts[counts > 0]
-    if len(valid_counts) == 0: # 如果节点为空或只有无效标签？
-        return 0
-    proportions = valid_counts / len(y)
-    gini = 1 - np.sum(proportions**2)
-    return gini
-
-def calculate_weighted_gini(y_left, y_right):
-    """计算分割后的加权平均基尼不纯度"""
-    n_left, n_right = len(y_left), len(y_right)
-    n_total = n_left + n_right
-    if n_total == 0:
-        return 0
-
-    gini_left = calculate_gini(y_left)
-    gini_right = calculate_gini(y_right)
-
-    weighted_gini = (n_left / n_total) * gini_left + (n_right / n_total) * gini_right
-    return weighted_gini
-
-# --- Stage 3 Interactive Elements ---
-
-# 3.1 计算初始 Gini 不纯度
-initial_gini = calculate_gini(y_simple)
-st.subheader(f"初始状态 (未分割)")
-st.metric(label="整体 Gini 不纯度", value=f"{initial_gini:.4f}")
-st.markdown("这个值衡量了开始时数据混合的程度。")
-
-
-# 3.2 互动控件和结果展示
-col3_1, col3_2 = st.columns([1, 2])
-
-with col3_1:
-    st.subheader("再次选择分割规则")
-    # 重用阶段1的控件变量名，但这里的操作是独立的
-    feature_map_s3 = {"特征 X1 (垂直线)": 0, "特征 X2 (水平线)": 1}
-    selected_feature_name_s3 = st.radio("选择要依据的特征:", list(feature_map_s3.keys()), key="s3_feature") # key 避免和 stage 1 冲突
-    selected_feature_idx_s3 = feature_map_s3[selected_feature_name_s3]
-
-    min_val_s3 = X_simple[:, selected_feature_idx_s3].min()
-    max_val_s3 = X_simple[:, selected_feature_idx_s3].max()
-    step_s3 = (max_val_s3 - min_val_s3) / 50
-    # 使用一个稍微不同的默认值或让用户选择
-    default_val_s3 = np.median(X_simple[:, selected_feature_idx_s3]) # 用中位数作为默认值
-
-    split_value_s3 = st.slider(f"设置 '{selected_feature_name_s3.split(' ')[1]}' 的分割阈值:",
-                               min_value=min_val_s3, max_value=max_val_s3, value=default_val_s3, step=step_s3, key="s3_slider")
-
-
-    # 3.3 根据用户的分割进行计算
-    # 分割数据
-    if selected_feature_idx_s3 == 0: # Split on X1
-        left_indices = X_simple[:, 0] <= split_value_s3
-        right_indices = X_simple[:, 0] > split_value_s3
-    else: # Split on X2
-        left_indices = X_simple[:, 1] <= split_value_s3
-        right_indices = X_simple[:, 1] > split_value_s3
-
-    y_left = y_simple[left_indices]
-    y_right = y_simple[right_indices]
-
-    # 计算 Gini
-    gini_left = calculate_gini(y_left)
-    gini_right = calculate_gini(y_right)
-    weighted_gini_after_split = calculate_weighted_gini(y_left, y_right)
-    information_gain = initial_gini - weighted_gini_after_split
-
-    st.subheader("分割后的 Gini 不纯度")
-    st.markdown(f"**左侧子集 (<= {split_value_s3:.2f})**")
-    st.metric(label=f"样本数: {len(y_left)}", value=f"Gini: {gini_left:.4f}")
-    if len(y_left) > 0:
-        # 确保 bincount 长度至少为全局类别数
-        global_num_classes = len(np.unique(y_simple))
-        counts_left = np.bincount(y_left, minlength=global_num_classes)
-        st.caption(f"红🔵: {counts_left[0]}, 蓝🟥: {counts_left[1]}")
-
-    st.markdown(f"**右侧子集 (> {split_value_s3:.2f})**")
-    st.metric(label=f"样本数: {len(y_right)}", value=f"Gini: {gini_right:.4f}")
-    if len(y_right) > 0:
-        global_num_classes = len(np.unique(y_simple))
-        counts_right = np.bincount(y_right, minlength=global_num_classes)
-        st.caption(f"红🔵: {counts_right[0]}, 蓝🟥: {counts_right[1]}")
-
-    st.subheader("总体评估")
-    st.metric(label="分割后的加权平均 Gini", value=f"{weighted_gini_after_split:.4f}")
-    st.metric(label="信息增益 (Gini 减少量)", value=f"{information_gain:.4f}",
-              delta=f"{information_gain - 0:.4f}", # 显示增益值本身作为 delta
-              help="值越大，表示这次分割带来的“纯度提升”越多。决策树会选择信息增益最大的分割。")
-
-
-with col3_2:
-    st.subheader("数据与当前分割线")
-    fig3, ax3 = plot_data(X_simple, y_simple,
-                          split_feature=selected_feature_idx_s3,
-                          split_value=split_value_s3,
-                          title=f"当前分割 (信息增益: {information_gain:.3f})") # 中文标题
-    st.pyplot(fig3)
-
-st.markdown("""
-**动手试试:**
-*   拖动滑块，改变分割阈值。观察左右子集的 Gini 值、加权平均 Gini 和信息增益如何变化。
-*   切换选择的特征（X1 或 X2）。
-*   你能找到哪个特征和哪个阈值组合，能让**信息增益**达到最大吗？这个组合就是决策树（在第一步）会选择的最佳分割！
-""")
-st.markdown("---")
-
-# --- Stage 4: 递归构建 - 分而治之 ---
-st.header("阶段 4: 递归构建 - 分而治之")
-st.markdown("""
-我们已经知道如何评估一次分割的好坏（阶段 3）。决策树的构建过程就是**重复**这个寻找“最佳分割”的步骤。
-
-1.  对当前数据集，找到**信息增益最大**的那个分割（特征 + 阈值）。
-2.  根据这个分割，将数据集分成两个（或多个）**子集**。
-3.  对**每个子集**，**重复步骤 1 和 2**。
-
-这个重复的过程叫做“**递归**”，就像剥洋葱一样，一层一层地处理数据。
-
-**这个过程什么时候停止呢？** 当满足以下任一条件时，就不再对一个子集进行分割，该子集成为一个**叶节点**：
-*   **纯净节点:** 该子集里的所有样本都属于同一个类别。 (Gini = 0)
-*   **最小样本数:** 该子集的样本数量少于预设的阈值 (例如 `min_samples_leaf`)。
-*   **最大深度:** 树的层数已经达到预设的最大深度 (例如 `max_depth`)。
-*   **无法再提升纯度:** 找不到任何分割能进一步降低 Gini 不纯度（信息增益 <= 0）。
-""")
-
-# --- Function to Find the Best Split ---
-def find_best_split(X, y):
-    """
-    在给定数据集上找到最佳分割点（最大化信息增益）
-    返回: best_feature_idx, best_threshold, max_info_gain
-    """
-    n_samples, n_features = X.shape
-    if n_samples <= 1: # 如果样本太少，无法分割
-        return None, None, -1
-
-    current_gini = calculate_gini(y)
-    if current_gini == 0: # 如果节点已经纯净，无需分割
-         return None, None, -1
-
-    max_info_gain = -1 # 初始化为负数，确保只有正增益才有效
-    best_feature_idx = None
-    best_threshold = None
-
-    for feature_idx in range(n_features):
-        # 获取该特征的所有唯一值作为潜在分割点
-        thresholds = np.unique(X[:, feature_idx])
-        if len(thresholds) > 1:
-            # 潜在阈值是排序后相邻不同值的中点
-            potential_thresholds = (thresholds[:-1] + thresholds[1:]) / 2
+        st.caption("服务器上没有 graphviz 的 dot 可执行文件，结构图由浏览器排版。")
+
+with st.sidebar.expander("共享数据缓存", expanded=False):
+    artifact_stats = get_artifact_store().stats()
+    st.caption(f"所有会话共享 {artifact_stats['size']} 项 · {artifact_stats['bytes'] / 1e3:.1f} KB"
+               f" / {artifact_stats['max_bytes'] / 2**20:.0f} MB · 命中 {artifact_stats['hits']} · "
+               f"计算 {artifact_stats['misses']} · 淘汰 {artifact_stats['evictions']}")
+
+# --- Profiling Panel ---
+# 到这里本次重跑的所有阶段都已结束；面板本身的绘制不计入
+run_profile = profiler.end_run()
+startup = startup_report(run_profile) # 只在启动测量模式下有值
+PROFILE_KIND_NAMES = {'stage': '阶段', 'fit': '训练', 'predict': '预测', 'plot': '绘图', 'dot': 'DOT 导出',
+                      'render': '显示', 'load': '读取数据'}
+
+with st.sidebar.expander("性能分析", expanded=False):
+    st.toggle("记录峰值内存 (tracemalloc)", key="profile_trace_memory",
+              help="从下一次重跑开始生效。开启后所有内存分配都会被跟踪，执行会变慢；多个会话同时运行时数值会互相影响。")
+    st.caption(f"本次重跑耗时 {run_profile['seconds'] * 1e3:.0f} ms · 共 {len(run_profile['spans'])} 个 span")
+    profile_rows = [{
+        "名称": "　" * span_record['depth'] + span_record['name'], # 全角空格缩进表示嵌套
+        "类型": PROFILE_KIND_NAMES.get(span_record['kind'], span_record['kind']),
+        "耗时 (ms)": span_record['seconds'] * 1e3,
+        "峰值内存 (KB)": None if span_record['peak_bytes'] is None else span_record['peak_bytes'] / 1e3,
+    } for span_record in run_profile['spans']]
+    st.dataframe(profile_rows, hide_index=True, use_container_width=True,
+                 column_config={"耗时 (ms)": st.column_config.NumberColumn(format="%.1f"),
+                                "峰值内存 (KB)": st.column_config.NumberColumn(format="%.0f")})
+
+    # 最近若干次重跑中各阶段的耗时 (堆叠柱状图)，被中断的重跑也包含在内；
+    # 只重跑某个阶段 (片段) 时，该次记录里只有这一个阶段
+    history_rows = {}
+    for record in profiler.history:
+        history_rows[record['run']] = {span_record['name']: span_record['seconds'] * 1e3
+                                       for span_record in record['spans'] if span_record['kind'] == 'stage'}
+    if len(history_rows) > 1:
+        n_fragment_runs = sum(1 for record in profiler.history if record['scope'] != 'page')
+        st.caption(f"最近 {len(history_rows)} 次重跑各阶段耗时 (ms)，其中 {n_fragment_runs} 次只重跑了单个阶段")
+        import pandas as pd # 到这里阶段 4 早已导入过 pandas
+        st.bar_chart(pd.DataFrame.from_dict(history_rows, orient='index').fillna(0), height=220)
+    if profiler.log_path:
+        st.caption(f"每次重跑的记录追加写入 `{profiler.log_path}` (JSON Lines)")
+
+if STARTUP_PROFILE:
+    with st.sidebar.expander("冷启动", expanded=False):
+        if startup is None:
+            st.caption("本进程还没有完成过一次整页重跑。")
         else:
-            # 如果只有一个唯一值，无法基于此特征分割
-            continue # 跳过这个特征
-
-        for threshold in potential_thresholds:
-            # 分割数据
-            left_indices = X[:, feature_idx] <= threshold
-            right_indices = X[:, feature_idx] > threshold
-
-            y_left = y[left_indices]
-            y_right = y[right_indices]
-
-            # 确保分割后的子集都不为空
-            if len(y_left) == 0 or len(y_right) == 0:
-                continue
-
-            # 计算这次分割的信息增益
-            weighted_gini = calculate_weighted_gini(y_left, y_right)
-            info_gain = current_gini - weighted_gini
-
-            # 更新最佳分割记录
-            if info_gain > max_info_gain:
-                max_info_gain = info_gain
-                best_feature_idx = feature_idx
-                best_threshold = threshold
-
-    # 只有当最大信息增益明确大于0时，才返回有效分割
-    # （避免浮点数精度问题导致微小的负增益被选中）
-    if max_info_gain > 1e-9: # 使用一个小的阈值
-        return best_feature_idx, best_threshold, max_info_gain
-    else:
-        return None, None, -1 # 表示找不到好的分割
-
-
-# --- 4.1 Apply Best Split to Initial Data ---
-st.subheader("4.1 算法找到的第一个最佳分割")
-
-best_feature_idx_s4, best_threshold_s4, max_info_gain_s4 = find_best_split(X_simple, y_simple)
-
-if best_feature_idx_s4 is not None:
-    st.success(f"算法找到的最佳初始分割:")
-    st.write(f"- **特征:** X{best_feature_idx_s4 + 1}")
-    st.write(f"- **阈值:** {best_threshold_s4:.4f}")
-    st.write(f"- **最大信息增益:** {max_info_gain_s4:.4f}")
-
-    col4_1a, col4_1b = st.columns(2)
-    with col4_1a:
-        fig4a, ax4a = plot_data(X_simple, y_simple,
-                                split_feature=best_feature_idx_s4,
-                                split_value=best_threshold_s4,
-                                title="第一个最佳分割线") # 中文标题
-        st.pyplot(fig4a)
-
-    with col4_1b:
-        # 生成对应的 1 层决策树图
-        dot_tree_s4a = graphviz.Digraph()
-        node_text = f"X{best_feature_idx_s4 + 1} <= {best_threshold_s4:.2f} ?\nGini={initial_gini:.3f}\nSamples={len(y_simple)}"
-        dot_tree_s4a.node('0', node_text)
-
-        # 分割数据以计算子节点信息 (仅用于显示)
-        left_indices_s4 = X_simple[:, best_feature_idx_s4] <= best_threshold_s4
-        right_indices_s4 = X_simple[:, best_feature_idx_s4] > best_threshold_s4
-        y_left_s4 = y_simple[left_indices_s4]
-        y_right_s4 = y_simple[right_indices_s4]
-        gini_left_s4 = calculate_gini(y_left_s4)
-        gini_right_s4 = calculate_gini(y_right_s4)
-        # 预测类别应基于多数类
-        pred_left = np.argmax(np.bincount(y_left_s4, minlength=global_num_classes)) if len(y_left_s4)>0 else -1
-        pred_right = np.argmax(np.bincount(y_right_s4, minlength=global_num_classes)) if len(y_right_s4)>0 else -1
-        class_labels = {0: "红🔵", 1: "蓝🟥", -1: "空"}
-
-
-        node_left_text = f"Gini={gini_left_s4:.3f}\nSamples={len(y_left_s4)}\nPred: {class_labels[pred_left]}"
-        node_right_text = f"Gini={gini_right_s4:.3f}\nSamples={len(y_right_s4)}\nPred: {class_labels[pred_right]}"
-
-        dot_tree_s4a.node('1', node_left_text)
-        dot_tree_s4a.node('2', node_right_text)
-        dot_tree_s4a.edge('0', '1', label='是 (True)')
-        dot_tree_s4a.edge('0', '2', label='否 (False)')
-        st.graphviz_chart(dot_tree_s4a)
-
-else:
-    st.warning("在此数据集上找不到有效的初始分割。")
-
-
-# --- 4.2 Explore Splitting a Subset ---
-st.subheader("4.2 对子集重复寻找最佳分割")
-st.markdown("""
-现在数据被分成了两个子集（对应上面树图的两个椭圆）。决策树会对**每个**纯度不为0（Gini > 0）的子集，**重复**寻找最佳分割的过程。
-
-让我们选择其中一个子集，看看算法会如何继续分割它：
-""")
-
-# 让用户选择要进一步分割的子集
-if best_feature_idx_s4 is not None: # 只有在找到第一个分割后才进行
-    # 在分割数据集之后再定义 left_indices_s4 和 right_indices_s4
-    left_indices_s4 = X_simple[:, best_feature_idx_s4] <= best_threshold_s4
-    right_indices_s4 = X_simple[:, best_feature_idx_s4] > best_threshold_s4
-
-    subset_choice = st.radio("选择要进一步分析的子集:",
-                             (f"左子集 (X{best_feature_idx_s4 + 1} <= {best_threshold_s4:.2f})",
-                              f"右子集 (X{best_feature_idx_s4 + 1} > {best_threshold_s4:.2f})"),
-                             key="subset_choice")
-
-    if subset_choice.startswith("左子集"):
-        X_subset = X_simple[left_indices_s4]
-        y_subset = y_simple[left_indices_s4]
-        parent_node_id = '1' # 对应上面树图的左节点 ID
-        st.markdown(f"当前分析: **左子集** (包含 {len(y_subset)} 个样本)")
-    else:
-        X_subset = X_simple[right_indices_s4]
-        y_subset = y_simple[right_indices_s4]
-        parent_node_id = '2' # 对应上面树图的右节点 ID
-        st.markdown(f"当前分析: **右子集** (包含 {len(y_subset)} 个样本)")
-
-    # 对选定的子集寻找最佳分割
-    best_feature_idx_sub, best_threshold_sub, max_info_gain_sub = find_best_split(X_subset, y_subset)
-
-    if best_feature_idx_sub is not None:
-        st.success(f"算法找到该子集的最佳分割:")
-        st.write(f"- **特征:** X{best_feature_idx_sub + 1}")
-        st.write(f"- **阈值:** {best_threshold_sub:.4f}")
-        st.write(f"- **信息增益 (相对于此子集):** {max_info_gain_sub:.4f}")
-
-        col4_2a, col4_2b = st.columns(2)
-        with col4_2a:
-            # 仅绘制子集数据和其分割线
-            fig4b, ax4b = plot_data(X_subset, y_subset,
-                                    split_feature=best_feature_idx_sub,
-                                    split_value=best_threshold_sub,
-                                    title="子集内的最佳分割线") # 中文标题
-            st.pyplot(fig4b)
-
-        with col4_2b:
-            st.markdown("**决策树生长:**")
-            # 复制基础树结构
-            dot_tree_s4b = dot_tree_s4a.copy()
-            # 添加新的层级
-            new_node_id_base = parent_node_id # '1' or '2'
-            new_node_text = f"X{best_feature_idx_sub + 1} <= {best_threshold_sub:.2f} ?\nGini={calculate_gini(y_subset):.3f}\nSamples={len(y_subset)}"
-            # 替换原子集节点为新的内部节点
-            dot_tree_s4b.node(new_node_id_base, new_node_text)
-
-            # 分割子集数据以计算叶节点信息
-            left_indices_sub = X_subset[:, best_feature_idx_sub] <= best_threshold_sub
-            right_indices_sub = X_subset[:, best_feature_idx_sub] > best_threshold_sub
-            y_left_sub = y_subset[left_indices_sub]
-            y_right_sub = y_subset[right_indices_sub]
-            gini_left_sub = calculate_gini(y_left_sub)
-            gini_right_sub = calculate_gini(y_right_sub)
-            # 预测基于多数类
-            pred_left_sub = np.argmax(np.bincount(y_left_sub, minlength=global_num_classes)) if len(y_left_sub)>0 else -1
-            pred_right_sub = np.argmax(np.bincount(y_right_sub, minlength=global_num_classes)) if len(y_right_sub)>0 else -1
-
-            # 创建新的叶节点
-            new_leaf_left_id = new_node_id_base + 'L' # e.g., '1L' or '2L'
-            new_leaf_right_id = new_node_id_base + 'R' # e.g., '1R' or '2R'
-            node_left_sub_text = f"Gini={gini_left_sub:.3f}\nSamples={len(y_left_sub)}\nPred: {class_labels[pred_left_sub]}"
-            node_right_sub_text = f"Gini={gini_right_sub:.3f}\nSamples={len(y_right_sub)}\nPred: {class_labels[pred_right_sub]}"
-            dot_tree_s4b.node(new_leaf_left_id, node_left_sub_text)
-            dot_tree_s4b.node(new_leaf_right_id, node_right_sub_text)
-            dot_tree_s4b.edge(new_node_id_base, new_leaf_left_id, label='是 (True)')
-            dot_tree_s4b.edge(new_node_id_base, new_leaf_right_id, label='否 (False)')
-
-            st.graphviz_chart(dot_tree_s4b)
-            st.caption("观察决策树如何在选定的分支下增加了新的节点。")
-
-    else:
-        gini_subset = calculate_gini(y_subset)
-        if gini_subset == 0:
-            st.info(f"该子集已经**纯净** (Gini = {gini_subset:.3f})，无需再分割，成为叶节点。")
-            fig4b_pure, ax4b_pure = plot_data(X_subset, y_subset, title="纯净的子集") # 中文标题
-            st.pyplot(fig4b_pure)
-        elif len(y_subset) <= 1: # 示例：添加一个最小样本数的停止条件
-             st.info(f"该子集样本数 ({len(y_subset)}) 过少，停止分割，成为叶节点。")
-             fig4b_small, ax4b_small = plot_data(X_subset, y_subset, title="样本过少的子集") # 中文标题
-             st.pyplot(fig4b_small)
-        else:
-            st.warning(f"在此子集上找不到信息增益大于 0 的有效分割 (当前 Gini = {gini_subset:.3f})。该子集成为叶节点。")
-            fig4b_nosplit, ax4b_nosplit = plot_data(X_subset, y_subset, title="无法有效分割的子集") # 中文标题
-            st.pyplot(fig4b_nosplit)
-
-st.markdown("""
-**理解关键点:**
-*   决策树构建是一个**递归**过程，不断地对产生的子集应用“寻找最佳分割”的逻辑。
-*   这个过程会持续下去，直到满足**停止条件**（节点纯净、样本太少、达到最大深度等），这时就形成了树的叶子。
-*   整个过程的目标是逐步降低不纯度，提高分类的准确性。
-""")
-st.markdown("---")
-
-# --- Stage 5: 过拟合的陷阱与超参数的缰绳 ---
-st.header("Stage 5: 过拟合的陷阱与超参数的缰绳")
-st.markdown("""
-我们已经了解了决策树是如何一步步构建的。现在，让我们看看如果让算法**自由生长**（不加限制），会发生什么。
-我们会使用 Scikit-learn 库来自动构建树。
-""")
-
-# --- 5.1 演示过拟合 ---
-st.subheader("5.1 “自由生长”的决策树：过拟合演示")
-st.markdown("""
-下面的决策树是在我们之前的简单二维数据集上训练的，但是**没有设置最大深度 (`max_depth`) 或叶节点最小样本数 (`min_samples_leaf`) 的限制**。
-观察它的结构和决策边界：
-""")
-
-col5_1_vis, col5_1_exp = st.columns([2, 1]) # 可视化区域宽，解释区域窄
-
-with col5_1_vis:
-    # 训练一个“完全生长”的树
-    try:
-        clf_overfit = DecisionTreeClassifier(
-            criterion='gini', # 可以选择 gini 或 entropy
-            random_state=42,
-            max_depth=None, # 不限制深度
-            min_samples_leaf=1 # 允许叶子只有1个样本
-        )
-        clf_overfit.fit(X_simple, y_simple) # 在简单数据集上训练
-
-        # 显示树结构
-        st.markdown("**决策树结构图 (可能非常复杂)**")
-        dot_data_overfit = export_graphviz(clf_overfit, out_file=None,
-                                          feature_names=['X1', 'X2'], # 简单特征名
-                                          class_names=['红🔵', '蓝🟥'],
-                                          filled=True, rounded=True,
-                                          special_characters=True)
-        st.graphviz_chart(dot_data_overfit)
-        acc_overfit = accuracy_score(y_simple, clf_overfit.predict(X_simple))
-        st.caption(f"模型在训练集上的准确率: {acc_overfit:.2%}")
-
-
-        # 绘制决策边界
-        st.markdown("**决策边界图 (可能非常曲折)**")
-        fig5_overfit, ax5_overfit = plt.subplots(figsize=(7, 6))
-
-        x_min_of, x_max_of = X_simple[:, 0].min() - 0.5, X_simple[:, 0].max() + 0.5
-        y_min_of, y_max_of = X_simple[:, 1].min() - 0.5, X_simple[:, 1].max() + 0.5
-        h_of = 0.02
-        xx_of, yy_of = np.meshgrid(np.arange(x_min_of, x_max_of, h_of), np.arange(y_min_of, y_max_of, h_of))
-
-        Z_of = clf_overfit.predict(np.c_[xx_of.ravel(), yy_of.ravel()])
-        Z_of = Z_of.reshape(xx_of.shape)
-
-        cmap_light_of = plt.cm.RdYlBu
-        ax5_overfit.contourf(xx_of, yy_of, Z_of, cmap=cmap_light_of, alpha=0.6)
-
-        colors_simple = ['red', 'blue']
-        markers_simple = ['o', 's']
-        for cl in np.unique(y_simple):
-            ax5_overfit.scatter(X_simple[y_simple==cl, 0], X_simple[y_simple==cl, 1],
-                               c=colors_simple[cl], marker=markers_simple[cl], edgecolor='k', s=50, label=f'类别 {cl}')
-
-        ax5_overfit.set_xlabel("特征 X1")
-        ax5_overfit.set_ylabel("特征 X2")
-        ax5_overfit.set_title("自由生长树的决策边界") # 中文标题
-        ax5_overfit.legend() # 图例
-        ax5_overfit.grid(True, linestyle='--', alpha=0.6)
-        st.pyplot(fig5_overfit)
-
-    except Exception as e:
-        st.error(f"构建或可视化自由生长树时出错: {e}")
-
-
-with col5_1_exp:
-    st.warning("**观察到了吗？**")
-    st.markdown("""
-    *   树的结构可能变得非常深、非常复杂，有很多层和很多叶子节点。
-    *   决策边界变得非常**弯曲和不规则**，它试图完美地包围训练数据中的每一个点，甚至是那些看起来像“噪音”的点（比如混在对方颜色区域里的点）。
-    *   虽然它在训练数据上的准确率可能很高（甚至100%），但这种过于复杂的模型很可能无法很好地适应**新的、未见过的数据**。我们称这种现象为“**过拟合 (Overfitting)**”。
-    """)
-
-
-# --- 5.2 引入超参数控制 ---
-st.subheader("5.2 使用超参数控制复杂度")
-st.markdown("""
-为了防止过拟合，我们需要给决策树的生长加上限制。就像给马套上缰绳，我们可以使用**超参数 (Hyperparameters)** 来控制模型的复杂度。
-
-**尝试调整下面的超参数，观察决策树结构和决策边界如何变化：**
-""")
-
-col5_2_params, col5_2_vis = st.columns([1, 2]) # 参数栏窄，可视化区域宽
-
-with col5_2_params:
-    st.markdown("**限制条件:**")
-    # 超参数控件
-    max_depth_s5_ctrl = st.slider(
-        "最大深度 (max_depth): 限制树的最大层数",
-        min_value=1, max_value=15, value=3, step=1, key="s5_ctrl_max_depth",
-        help="较小的值使树更简单，防止过拟合。None表示不限制。"
-    )
-    min_samples_leaf_s5_ctrl = st.slider(
-        "叶节点最小样本数 (min_samples_leaf): 叶子节点最少包含的样本数",
-        min_value=1, max_value=len(X_simple)//2 if len(X_simple)>1 else 1, value=1, step=1, key="s5_ctrl_min_leaf", # 最大不超过总样本一半
-        help="较大的值防止树分得过细，使模型更稳定。"
-    )
-    # 可选: 增加 criterion 控制
-    # criterion_s5_ctrl = st.radio("分裂标准 (criterion)", ('gini', 'entropy'), key="s5_ctrl_criterion")
-
-
-with col5_2_vis:
-    # 根据用户选择的超参数重新训练模型
-    try:
-        clf_controlled = DecisionTreeClassifier(
-            criterion='gini', # 使用上面选的 criterion_s5_ctrl 如果添加了该控件
-            random_state=42,
-            max_depth=max_depth_s5_ctrl if max_depth_s5_ctrl > 0 else None, # slider 最小值是 1，所以可以直接用
-            min_samples_leaf=min_samples_leaf_s5_ctrl
-        )
-        clf_controlled.fit(X_simple, y_simple)
-
-        # 显示受控树的结构
-        st.markdown("**受控决策树结构图**")
-        dot_data_ctrl = export_graphviz(clf_controlled, out_file=None,
-                                        feature_names=['X1', 'X2'],
-                                        class_names=['红🔵', '蓝🟥'],
-                                        filled=True, rounded=True,
-                                        special_characters=True)
-        st.graphviz_chart(dot_data_ctrl)
-        acc_controlled = accuracy_score(y_simple, clf_controlled.predict(X_simple))
-        st.caption(f"当前模型在训练集上的准确率: {acc_controlled:.2%}")
-
-
-        # 绘制受控树的决策边界
-        st.markdown("**受控决策树边界图**")
-        fig5_ctrl, ax5_ctrl = plt.subplots(figsize=(7, 6))
-
-        # 重用之前的网格和颜色映射
-        Z_ctrl = clf_controlled.predict(np.c_[xx_of.ravel(), yy_of.ravel()])
-        Z_ctrl = Z_ctrl.reshape(xx_of.shape)
-
-        ax5_ctrl.contourf(xx_of, yy_of, Z_ctrl, cmap=cmap_light_of, alpha=0.6)
-
-        for cl in np.unique(y_simple): # 重绘数据点
-            ax5_ctrl.scatter(X_simple[y_simple==cl, 0], X_simple[y_simple==cl, 1],
-                             c=colors_simple[cl], marker=markers_simple[cl], edgecolor='k', s=50, label=f'类别 {cl}')
-
-        ax5_ctrl.set_xlabel("特征 X1")
-        ax5_ctrl.set_ylabel("特征 X2")
-        ax5_ctrl.set_title(f"受控树边界 (depth={max_depth_s5_ctrl}, min_leaf={min_samples_leaf_s5_ctrl})") # 中文标题
-        ax5_ctrl.legend() # 图例
-        ax5_ctrl.grid(True, linestyle='--', alpha=0.6)
-        st.pyplot(fig5_ctrl)
-
-    except Exception as e:
-        st.error(f"构建或可视化受控树时出错: {e}")
-
-st.markdown("""
-**思考与总结:**
-*   比较“自由生长”的树和“受控”的树，它们在结构复杂度和决策边界平滑度上有何不同？
-*   `max_depth` 如何影响树的大小和边界？ 值越小，树越简单，边界越趋向于直线或简单的阶梯状。
-*   `min_samples_leaf` 如何影响树的大小和边界？ 值越大，树越不容易产生那些只针对少数几个点的细小分支，边界也可能更平滑。
-*   通过调整这些超参数，我们可以找到一个在“拟合训练数据”（可能导致过拟合）和“保持模型简单以适应新数据”（可能导致欠拟合）之间的**平衡点**。这在机器学习中称为**模型选择**或**超参数调优**。
-""")
-st.markdown("---")
-
-
-# --- Stage 6: 应用于 Iris 数据集 ---
-st.header("Stage 6: 应用于 Iris 数据集")
-st.markdown("""
-现在我们已经理解了过拟合以及如何用超参数控制它。让我们在一个更真实、稍复杂的数据集——**鸢尾花 (Iris)** 上，应用这些知识。
-
-**任务:** 像刚才一样，调整超参数，观察在 Iris 数据集上生成的决策树结构和二维决策边界。注意 Iris 数据有 3 个类别。
-""")
-
-# --- 加载 Iris 数据并创建 DataFrame ---
-@st.cache_data # 缓存 Iris 数据加载
-def load_iris_data():
-    iris = load_iris()
-    X_iris = iris.data
-    y_iris = iris.target
-    feature_names_iris = ['花萼长(cm)', '花萼宽(cm)', '花瓣长(cm)', '花瓣宽(cm)'] # 使用中文特征名
-    target_names_iris = iris.target_names # 保持英文类别名 'setosa', 'versicolor', 'virginica'
-    df_iris = pd.DataFrame(data=X_iris, columns=feature_names_iris)
-    # 添加类别名称列（可选，用于显示）
-    target_name_map_iris = {0: 'setosa', 1: 'versicolor', 2: 'virginica'}
-    df_iris['类别名称'] = pd.Categorical.from_codes(y_iris, target_names_iris)
-    return X_iris, y_iris, feature_names_iris, target_names_iris, df_iris
-
-X_iris, y_iris, feature_names_iris, target_names_iris, df_iris = load_iris_data()
-
-
-st.subheader("鸢尾花 (Iris) 数据集回顾")
-st.dataframe(df_iris.head(3)) # 显示少量数据，包含中文特征名
-
-# --- 超参数控制 (针对 Iris) ---
-st.subheader("调整超参数并观察 Iris 数据结果")
-
-col6_params, col6_vis = st.columns([1, 3])
-
-with col6_params:
-    st.markdown("**控制树的复杂度:**")
-    # 使用新的 key 以免冲突
-    max_depth_s6 = st.slider("最大深度 (max_depth)", min_value=1, max_value=10, value=3, step=1, key="s6_max_depth")
-    min_samples_leaf_s6 = st.slider("叶节点最小样本数 (min_samples_leaf)", min_value=1, max_value=20, value=1, step=1, key="s6_min_leaf")
-    criterion_s6 = st.radio("分裂标准 (criterion)", ('gini', 'entropy'), key="s6_criterion")
-
-    st.markdown("**选择2D可视化特征:**")
-    # format_func 使用 feature_names_iris (已经是中文)
-    x_feature_idx_s6 = st.selectbox("X轴特征", range(len(feature_names_iris)), format_func=lambda i: feature_names_iris[i], index=2, key="s6_x_feature")
-    y_feature_idx_s6 = st.selectbox("Y轴特征", range(len(feature_names_iris)), format_func=lambda i: feature_names_iris[i], index=3, key="s6_y_feature")
-
-    if x_feature_idx_s6 == y_feature_idx_s6:
-        st.warning("请为X轴和Y轴选择不同的特征。")
-        st.stop()
-
-# --- 训练模型与可视化 (针对 Iris) ---
-with col6_vis:
-    # 1. 训练完整模型 (Iris)
-    try:
-        clf_iris_full_s6 = DecisionTreeClassifier(
-            max_depth=max_depth_s6,
-            min_samples_leaf=min_samples_leaf_s6,
-            criterion=criterion_s6,
-            random_state=42
-        )
-        # 使用包含中文特征名的 DataFrame 训练，避免潜在警告
-        clf_iris_full_s6.fit(df_iris[feature_names_iris], y_iris) # 使用 DataFrame 训练
-
-        # 2. 生成树结构图 (Iris)
-        st.markdown("**决策树结构图 (基于全部4个特征)**")
-        dot_data_iris_s6 = export_graphviz(clf_iris_full_s6, out_file=None,
-                                          feature_names=feature_names_iris, # 传递中文特征名
-                                          class_names=target_names_iris, # 类别名保持英文
-                                          filled=True, rounded=True,
-                                          special_characters=True)
-        st.graphviz_chart(dot_data_iris_s6)
-        # 预测时也使用 DataFrame
-        accuracy_iris_s6 = accuracy_score(y_iris, clf_iris_full_s6.predict(df_iris[feature_names_iris]))
-        st.caption(f"当前模型在训练集上的准确率: {accuracy_iris_s6:.2%}")
-
-    except Exception as e:
-        st.error(f"无法构建或显示 Iris 决策树结构图。错误: {e}")
-
-    # 3. 训练 2D 模型 (Iris)
-    try:
-        # 选择对应的两列数据 (仍然是 NumPy 数组)
-        X_iris_2d_s6 = X_iris[:, [x_feature_idx_s6, y_feature_idx_s6]]
-        # 获取选择的特征名（中文）
-        selected_feature_names_2d = [feature_names_iris[x_feature_idx_s6], feature_names_iris[y_feature_idx_s6]]
-
-        clf_iris_2d_s6 = DecisionTreeClassifier(
-            max_depth=max_depth_s6,
-            min_samples_leaf=min_samples_leaf_s6,
-            criterion=criterion_s6,
-            random_state=42
-        )
-        # 训练 2D 模型 (可以用 NumPy 数组，或者用对应的 DataFrame 子集)
-        # clf_iris_2d_s6.fit(X_iris_2d_s6, y_iris)
-        clf_iris_2d_s6.fit(df_iris[selected_feature_names_2d], y_iris) # 用 DataFrame 子集训练更好
-
-        # 4. 绘制决策边界 (Iris)
-        st.markdown(f"**决策边界图 (基于 '{selected_feature_names_2d[0]}' 和 '{selected_feature_names_2d[1]}')**")
-        fig6, ax6 = plt.subplots(figsize=(8, 6))
-
-        x_min_i, x_max_i = X_iris_2d_s6[:, 0].min() - 0.5, X_iris_2d_s6[:, 0].max() + 0.5
-        y_min_i, y_max_i = X_iris_2d_s6[:, 1].min() - 0.5, X_iris_2d_s6[:, 1].max() + 0.5
-        h_i = 0.02
-        xx_i, yy_i = np.meshgrid(np.arange(x_min_i, x_max_i, h_i), np.arange(y_min_i, y_max_i, h_i))
-
-        # 预测网格点时，需要构造包含这两个特征名的 DataFrame
-        mesh_data = pd.DataFrame(np.c_[xx_i.ravel(), yy_i.ravel()], columns=selected_feature_names_2d)
-        Z_i = clf_iris_2d_s6.predict(mesh_data)
-        Z_i = Z_i.reshape(xx_i.shape)
-
-        cmap_light_i = plt.cm.RdYlBu
-        ax6.contourf(xx_i, yy_i, Z_i, cmap=cmap_light_i, alpha=0.6)
-
-        cmap_bold_i = plt.cm.viridis
-        scatter_i = ax6.scatter(X_iris_2d_s6[:, 0], X_iris_2d_s6[:, 1], c=y_iris, cmap=cmap_bold_i,
-                                edgecolor='k', s=40)
-
-        ax6.set_xlabel(selected_feature_names_2d[0]) # X轴标签是中文
-        ax6.set_ylabel(selected_feature_names_2d[1]) # Y轴标签是中文
-        ax6.set_title("Iris 数据集决策边界") # 中文标题
-        handles_i, _ = scatter_i.legend_elements(prop="colors")
-        ax6.legend(handles_i, target_names_iris, title="类别") # 类别名保持英文
-        ax6.grid(True, linestyle='--', alpha=0.6)
-        st.pyplot(fig6)
-
-    except Exception as e:
-        st.error(f"无法绘制 Iris 决策边界图。错误: {e}")
-
-st.markdown("---")
-
-
-# --- Stage 7: 总结与应用 ---
-st.header("Stage 7: 总结与应用")
-
-st.markdown("""
-恭喜你完成了决策树探秘之旅！让我们回顾一下核心要点：
-
-1.  **是什么？** 决策树是一种监督学习算法，通过学习一系列基于特征的“是/否”问题（规则），来对数据进行分类或回归。它像一个流程图。
-2.  **如何构建？**
-    *   **选择最佳分割:** 在每个节点，算法会尝试所有可能的特征和阈值，找到能最大程度“纯化”数据（例如，最大化信息增益或最小化基尼不纯度）的分割。
-    *   **递归分裂:** 对分割产生的子集重复寻找最佳分割的过程，直到满足停止条件。
-    *   **停止条件:** 节点纯净、样本数过少、达到最大深度等，防止树无限生长。
-3.  **过拟合与控制？**
-    *   **过拟合:** 决策树容易过度学习训练数据的细节和噪声，导致在新数据上表现不佳。
-    *   **超参数控制:** 使用**超参数**（如 `max_depth`, `min_samples_leaf`）来限制树的复杂度，防止过拟合，提高模型的泛化能力。
-4.  **如何使用？** 可以使用 Scikit-learn 等库自动构建和调整决策树模型。
-
-**决策树的优点:**
-*   **可解释性强:** 树的结构清晰，容易理解分类规则。
-*   **对数据预处理要求低:** 通常不需要特征缩放。
-*   **可以处理数值型和类别型特征。**
-
-**决策树的缺点:**
-*   **容易过拟合:** 特别是当树很深时。
-*   **对数据微小变动敏感:** 数据的小变化可能导致生成完全不同的树（不稳定）。
-*   **可能产生有偏树:** 如果某些类别样本量远大于其他类别。
-
-**应用场景:**
-决策树本身可用于分类和回归任务。更重要的是，它是许多更强大的**集成学习算法**的基础模块，例如：
-*   **随机森林 (Random Forest):** 构建多棵不同的决策树并综合它们的预测结果，通常更稳定且不易过拟合。
-*   **梯度提升决策树 (Gradient Boosting Decision Tree - GBDT, XGBoost, LightGBM):** 逐步构建树来纠正之前树的错误，通常精度很高。
-
-希望这次旅程能帮助你建立对决策树的直观理解！
-""")
\ No newline at end of file
+            st.caption(f"进程 {startup['pid']} 的第一次整页重跑：标题 {startup['marks']['header'] * 1e3:.0f} ms · "
+                       f"阶段 1 {startup['stages'].get('阶段 1', float('nan')) * 1e3:.0f} ms · "
+                       f"整页 {startup['seconds'] * 1e3:.0f} ms · 导入依赖共 {startup['import_seconds'] * 1e3:.0f} ms")
+            st.dataframe([{
+                "包": ("　" if record['parent'] else "") + record['package'], # 缩进表示在另一个包导入时被导入
+                "耗时 (ms)": record['seconds'] * 1e3,
+                "导入位置": record['stage'] or record['thread'],
+            } for record in startup['imports']], hide_index=True, use_container_width=True,
+                column_config={"耗时 (ms)": st.column_config.NumberColumn(format="%.1f")})
+            st.caption(f"报告追加写入 `{STARTUP_LOG_PATH}` (JSON Lines)")
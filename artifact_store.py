@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+进程级的确定性结果缓存：对每个访问者都相同的数据和中间结果 (示例数据集、示例 DOT、自定义树等)
+只计算一次，所有会话共享同一份只读对象，会话里只保留各自的控件状态
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def artifact_nbytes(value, _seen=None):
+    """
+    估算对象占用的字节数：NumPy 数组按 nbytes，字符串按 UTF-8 长度，容器和普通对象递归累加其内容
+    (同一个对象只计一次)，用于按字节数限制缓存容量
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.base is None else 0 # 视图不额外占内存
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(artifact_nbytes(k, seen) + artifact_nbytes(v, seen)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(artifact_nbytes(item, seen) for item in value)
+    if hasattr(value, 'memory_usage'): # DataFrame
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + artifact_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+def _freeze(value):
+    """把结果中的 NumPy 数组设为只读：共享对象被某个会话意外修改时立即报错，而不是悄悄影响其他会话"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+class ArtifactStore:
+    """
+    线程安全、按字节数限制容量的 LRU 缓存：键 -> 计算结果
+    同一个键同时被多个会话请求时只计算一次 (每个键一把锁，其余请求等待结果)，不同的键互不阻塞。
+    结果是所有会话共享的，调用方只能读取，不要修改。
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._artifacts = OrderedDict() # 键 -> (结果, 字节数)
+        self._bytes = 0
+        self._inflight = {} # 正在计算的键 -> threading.Event
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._artifacts)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._artifacts
+
+    def get_or_compute(self, key, compute):
+        """返回键对应的结果；没有时调用 compute() 计算并放入缓存。compute 抛出异常时不缓存，等待者会重新计算。"""
+        while True:
+            with self._lock:
+                entry = self._artifacts.get(key)
+                if entry is not None:
+                    self._artifacts.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                event = self._inflight.get(key)
+                if event is None:
+                    self.misses += 1
+                    self._inflight[key] = event = threading.Event()
+                    break
+            event.wait() # 另一个线程正在计算同一个键，等它完成后重新查找
+
+        try:
+            value = _freeze(compute())
+            size = artifact_nbytes(value)
+            if size <= self.max_bytes: # 单个结果超过整个缓存的容量时直接返回不缓存
+                with self._lock:
+                    self._artifacts[key] = (value, size)
+                    self._bytes += size
+                    while self._bytes > self.max_bytes:
+                        _, (_, evicted_size) = self._artifacts.popitem(last=False)
+                        self._bytes -= evicted_size
+                        self.evictions += 1
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._artifacts),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+无界面的批量导出 (不依赖 Streamlit)：在各阶段滑块的取值网格上生成教程中的图像和决策树，写成 PNG / SVG / DOT 文件，
+另外写一份清单 manifest.json，记录每个文件对应的阶段、超参数、大小和 sha256，可用作课程素材，也可以与之前的清单比较做回归检查。
+网格按任务分组分给进程池并行；同一组内共用训练好的树 (阶段 5 的各个深度由同一棵完全生长的树截断得到，与页面上相同)。
+
+    python batch_export.py --output exported
+    python batch_export.py --stages 4,5 --formats png,dot --jobs 4
+    python batch_export.py --quick --output /tmp/assets --baseline exported/manifest.json
+
+文件名只由超参数的取值决定 (阶段 1 按阈值在取值范围中的千分位命名)，--quick 或只导出部分阶段时得到的是完整导出的子集，
+可以和完整导出的清单比较：这时只比较两边都有的文件，缺少 / 新增的文件只作提示。
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+
+from datasets import load_iris_data, make_simple_data
+from tree_core import IMPURITY_NAMES, TreeTruncator, build_tree, tree_to_dot
+
+STAGES = ('1', '4', '5', '6')
+FORMATS = ('png', 'svg', 'dot') # png/svg 用于图像，svg/dot 用于决策树结构图
+SIMPLE_FEATURE_NAMES = ('X1', 'X2')
+SIMPLE_CLASS_NAMES = ("红🔵", "蓝🟥") # 与数据源选择 "简单二维数据" 时相同
+STAGE1_STEPS = 50 # 阶段 1 阈值滑块的步数 (步长为取值范围的 1/50)，须整除 1000
+STAGE4_DEPTHS = range(1, 11)
+STAGE4_LEAFS = range(1, 11)
+STAGE4_SPLITTERS = ('exact', 'binned')
+STAGE5_DEPTHS = range(1, 16)
+STAGE6_DEPTHS = range(1, 11)
+STAGE6_LEAFS = range(1, 21)
+STAGE6_CRITERIA = ('gini', 'entropy')
+IRIS_BOUNDARY_FEATURES = (2, 3) # 阶段 6 默认的二维可视化特征 (花瓣长/宽)
+QUICK_DEPTHS = range(1, 4)
+QUICK_LEAFS = range(1, 3)
+QUICK_STEPS = 5 # 须整除 STAGE1_STEPS，快速导出的阈值才是完整导出阈值的子集
+DEFAULT_DPI = 100
+# 去掉图像中的时间戳等元数据，相同的输入得到逐字节相同的文件，清单中的 sha256 才能用来做回归比较
+FIGURE_METADATA = {'png': {'Software': None}, 'svg': {'Date': None, 'Creator': None}}
+
+
+# --- Datasets ---
+# 每个 worker 进程只生成 / 加载一次
+@lru_cache(maxsize=None)
+def _simple_data():
+    return make_simple_data()
+
+@lru_cache(maxsize=None)
+def _iris_data():
+    return load_iris_data()
+
+
+# --- Writers ---
+def _file_record(out_dir, path):
+    with open(os.path.join(out_dir, path), 'rb') as f:
+        content = f.read()
+    return {'path': path, 'bytes': len(content), 'sha256': hashlib.sha256(content).hexdigest()}
+
+def _save_figure(fig, out_dir, stem, options):
+    """把图像按 options['formats'] 中的图像格式保存为 stem.png / stem.svg，返回 {格式: 文件记录}"""
+    files = {}
+    for fmt in ('png', 'svg'):
+        if fmt in options['formats']:
+            path = f"{stem}.{fmt}"
+            fig.savefig(os.path.join(out_dir, path), format=fmt, dpi=options['dpi'], metadata=FIGURE_METADATA[fmt])
+            files[fmt] = _file_record(out_dir, path)
+    return files
+
+def _save_tree(dot_source, out_dir, stem, options):
+    """把 DOT 源码保存为 stem.dot，服务器上有 graphviz 的 dot 可执行文件时另外排版为 stem.svg"""
+    files = {}
+    if 'dot' in options['formats']:
+        path = f"{stem}.dot"
+        with open(os.path.join(out_dir, path), 'w', encoding='utf-8') as f:
+            f.write(dot_source)
+        files['dot'] = _file_record(out_dir, path)
+    if 'svg' in options['formats'] and options['tree_svg']:
+        import graphviz
+        path = f"{stem}.svg"
+        graphviz.Source(dot_source).render(outfile=os.path.join(out_dir, path), format='svg', cleanup=True)
+        files['svg'] = _file_record(out_dir, path)
+    return files
+
+def _tree_dot(model, feature_names, class_names):
+    """与页面上小树的导出方式相同 (sklearn 模型用 export_graphviz，自建树用 tree_to_dot)，批量导出时不折叠"""
+    if hasattr(model, 'tree_'):
+        from sklearn.tree import export_graphviz
+        return export_graphviz(model, out_file=None, feature_names=list(feature_names), class_names=list(class_names),
+                               filled=True, rounded=True, special_characters=True)
+    return tree_to_dot(model, feature_names, class_names)
+
+def _asset(stage, kind, params, files):
+    return {'stage': stage, 'kind': kind, 'params': params, 'files': files}
+
+
+# --- Stage Tasks ---
+# 每个任务在 worker 进程中运行，写出一组文件并返回它们的清单记录
+def stage1_task(out_dir, options, feature, n_steps):
+    """阶段 1: 某个特征上阈值滑块的每个取值对应的分割线"""
+    from plotting import plot_data
+
+    X, y = _simple_data()
+    low, high = X[:, feature].min(), X[:, feature].max()
+    assets = []
+    for step in range(n_steps + 1):
+        # 按阈值在取值范围中的位置 (千分位) 命名并计算阈值，不同步数下的同一位置得到同名、同内容的文件
+        permille = step * 1000 // n_steps
+        split_value = float(low + (high - low) * (permille / 1000))
+        fig, _ = plot_data(X, y, split_feature=feature, split_value=split_value, title="简单数据集与你的分割尝试")
+        stem = f"stage1/split_x{feature + 1}_at{permille:04d}"
+        assets.append(_asset('1', 'split', {'feature': feature, 'split_value': split_value},
+                             _save_figure(fig, out_dir, stem, options)))
+    return assets
+
+def stage4_task(out_dir, options, criterion, splitter, min_samples_leaf, max_depths, first_split):
+    """阶段 4: 自建树的第一次分割和子集分割 (first_split 为真时)，以及每个深度的完整树和决策边界"""
+    from plotting import plot_data, plot_decision_boundary
+
+    X, y = _simple_data()
+    assets = []
+    if first_split:
+        tree = build_tree(X, y, max_depth=2, criterion=criterion)
+        if not tree.is_leaf(0):
+            feature, threshold = int(tree.feature[0]), float(tree.threshold[0])
+            fig, _ = plot_data(X, y, split_feature=feature, split_value=threshold, title="第一个最佳分割线")
+            stem = f"stage4/first_split_{criterion}"
+            files = _save_figure(fig, out_dir, stem, options)
+            files.update(_save_tree(tree_to_dot(tree, SIMPLE_FEATURE_NAMES, SIMPLE_CLASS_NAMES, expanded_nodes={0}),
+                                    out_dir, stem, options))
+            assets.append(_asset('4', 'first_split', {'criterion': criterion, 'feature': feature,
+                                                      'threshold': threshold}, files))
+            # 4.2: 分别展开两个子集
+            for side, child in (('left', tree.children_left[0]), ('right', tree.children_right[0])):
+                subset = X[:, feature] <= threshold if side == 'left' else X[:, feature] > threshold
+                child_split = not tree.is_leaf(child)
+                fig, _ = plot_data(X[subset], y[subset],
+                                   split_feature=int(tree.feature[child]) if child_split else None,
+                                   split_value=float(tree.threshold[child]) if child_split else None,
+                                   title="对子集的最佳分割" if child_split else "无法有效分割的子集")
+                stem = f"stage4/subset_split_{criterion}_{side}"
+                files = _save_figure(fig, out_dir, stem, options)
+                files.update(_save_tree(tree_to_dot(tree, SIMPLE_FEATURE_NAMES, SIMPLE_CLASS_NAMES,
+                                                    expanded_nodes={0, int(child)}), out_dir, stem, options))
+                assets.append(_asset('4', 'subset_split', {'criterion': criterion, 'subset': side}, files))
+
+    for max_depth in max_depths:
+        tree = build_tree(X, y, max_depth=max_depth, min_samples_leaf=min_samples_leaf, splitter=splitter,
+                          criterion=criterion)
+        fig, _ = plot_decision_boundary(tree, X, y, title=f"自建树的决策边界 (depth={max_depth}, min_leaf={min_samples_leaf})")
+        stem = f"stage4/tree_{criterion}_{splitter}_depth{max_depth:02d}_leaf{min_samples_leaf:02d}"
+        files = _save_figure(fig, out_dir, stem, options)
+        files.update(_save_tree(tree_to_dot(tree, SIMPLE_FEATURE_NAMES, SIMPLE_CLASS_NAMES), out_dir, stem, options))
+        assets.append(_asset('4', 'tree', {'criterion': criterion, 'splitter': splitter, 'max_depth': max_depth,
+                                           'min_samples_leaf': min_samples_leaf, 'node_count': tree.node_count},
+                             files))
+    return assets
+
+def stage5_task(out_dir, options, min_samples_leaf, max_depths):
+    """
+    阶段 5: 一个 min_samples_leaf 的完全生长树截断到每个深度 (比完全树更深的限制得到同一棵树，只导出一次)；
+    min_samples_leaf=1 的完全树就是 5.1 中 "自由生长" 的树
+    """
+    from sklearn.tree import DecisionTreeClassifier
+    from plotting import plot_decision_boundary
+
+    X, y = _simple_data()
+    model = DecisionTreeClassifier(min_samples_leaf=min_samples_leaf, random_state=42).fit(X, y) # 与模型缓存相同
+    truncator = TreeTruncator(model)
+    assets = []
+    if min_samples_leaf == 1:
+        fig, _ = plot_decision_boundary(model, X, y, title="自由生长树的决策边界")
+        stem = "stage5/overfit"
+        files = _save_figure(fig, out_dir, stem, options)
+        files.update(_save_tree(_tree_dot(model, SIMPLE_FEATURE_NAMES, SIMPLE_CLASS_NAMES), out_dir, stem, options))
+        assets.append(_asset('5', 'overfit', {'node_count': int(model.tree_.node_count)}, files))
+    for max_depth in max_depths:
+        if max_depth > truncator.max_depth:
+            break
+        tree = truncator.truncate(max_depth)
+        fig, _ = plot_decision_boundary(tree, X, y, title=f"受控树边界 (depth={max_depth}, min_leaf={min_samples_leaf})")
+        stem = f"stage5/tree_depth{max_depth:02d}_leaf{min_samples_leaf:02d}"
+        files = _save_figure(fig, out_dir, stem, options)
+        files.update(_save_tree(tree_to_dot(tree, SIMPLE_FEATURE_NAMES, SIMPLE_CLASS_NAMES), out_dir, stem, options))
+        assets.append(_asset('5', 'tree', {'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf,
+                                           'full_depth': truncator.max_depth, 'node_count': tree.node_count}, files))
+    return assets
+
+def stage6_task(out_dir, options, criterion, min_samples_leaf, max_depths):
+    """阶段 6: Iris 上全部特征的决策树结构图，以及花瓣长/宽两个特征上的决策边界"""
+    from sklearn.tree import DecisionTreeClassifier
+    from plotting import plot_decision_boundary
+
+    X, y, feature_names, class_names, _ = _iris_data()
+    X_2d = np.ascontiguousarray(X[:, list(IRIS_BOUNDARY_FEATURES)])
+    names_2d = tuple(feature_names[i] for i in IRIS_BOUNDARY_FEATURES)
+    assets = []
+    for max_depth in max_depths:
+        params = dict(criterion=criterion, max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42)
+        model = DecisionTreeClassifier(**params).fit(X, y)
+        model_2d = DecisionTreeClassifier(**params).fit(X_2d, y)
+        stem = f"stage6/iris_{criterion}_depth{max_depth:02d}_leaf{min_samples_leaf:02d}"
+        files = _save_tree(_tree_dot(model, feature_names, class_names), out_dir, f"{stem}_tree", options)
+        fig, _ = plot_decision_boundary(model_2d, X_2d, y, title="Iris 数据集 决策边界", feature_names=names_2d,
+                                        class_names=list(class_names))
+        files.update(_save_figure(fig, out_dir, f"{stem}_boundary", options))
+        assets.append(_asset('6', 'tree', {'criterion': criterion, 'max_depth': max_depth,
+                                           'min_samples_leaf': min_samples_leaf,
+                                           'node_count': int(model.tree_.node_count),
+                                           'boundary_features': list(names_2d)}, files))
+    return assets
+
+TASKS = {'stage1': stage1_task, 'stage4': stage4_task, 'stage5': stage5_task, 'stage6': stage6_task}
+
+def build_tasks(stages, quick=False):
+    """把各阶段的网格拆成任务列表 [(任务名, 参数)]，每个任务的工作量大致相当 (一组深度)"""
+    def depths(full):
+        return list(QUICK_DEPTHS if quick else full)
+
+    def leafs(full):
+        return QUICK_LEAFS if quick else full
+
+    tasks = []
+    if '1' in stages:
+        tasks += [('stage1', dict(feature=feature, n_steps=QUICK_STEPS if quick else STAGE1_STEPS))
+                  for feature in (0, 1)]
+    if '4' in stages:
+        tasks += [('stage4', dict(criterion=criterion, splitter=splitter, min_samples_leaf=leaf,
+                                  max_depths=depths(STAGE4_DEPTHS),
+                                  first_split=splitter == STAGE4_SPLITTERS[0] and i == 0))
+                  for criterion in IMPURITY_NAMES for splitter in STAGE4_SPLITTERS
+                  for i, leaf in enumerate(leafs(STAGE4_LEAFS))]
+    if '5' in stages:
+        max_leaf = max(len(_simple_data()[0]) // 2, 1) # 与阶段 5 的 min_samples_leaf 滑块范围相同
+        tasks += [('stage5', dict(min_samples_leaf=leaf, max_depths=depths(STAGE5_DEPTHS)))
+                  for leaf in leafs(range(1, max_leaf + 1))]
+    if '6' in stages:
+        tasks += [('stage6', dict(criterion=criterion, min_samples_leaf=leaf, max_depths=depths(STAGE6_DEPTHS)))
+                  for criterion in STAGE6_CRITERIA for leaf in leafs(STAGE6_LEAFS)]
+    return tasks
+
+
+# --- Runner ---
+def _init_export_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['svg.hashsalt'] = 'batch-export' # SVG 中的 id 不再随机，与 FIGURE_METADATA 一起保证可重复
+
+def run_task(name, params, out_dir, options):
+    start = time.perf_counter()
+    assets = TASKS[name](out_dir, options, **params)
+    return assets, time.perf_counter() - start
+
+def export(out_dir, stages=STAGES, formats=FORMATS, n_jobs=None, quick=False, dpi=DEFAULT_DPI, log=print):
+    """导出所有任务，返回清单 (dict)，同时写入 out_dir/manifest.json"""
+    start = time.perf_counter()
+    tree_svg = 'svg' in formats and shutil.which('dot') is not None
+    if 'svg' in formats and not tree_svg:
+        log("没有找到 graphviz 的 dot 可执行文件，决策树结构图只导出 DOT (图像仍导出 SVG)")
+    options = {'formats': tuple(formats), 'dpi': dpi, 'tree_svg': tree_svg}
+    tasks = build_tasks(stages, quick)
+    for directory in sorted({name for name, _ in tasks}):
+        os.makedirs(os.path.join(out_dir, directory), exist_ok=True)
+    n_jobs = min(os.cpu_count() or 1, len(tasks)) if n_jobs is None else max(1, int(n_jobs))
+
+    results = [None] * len(tasks)
+    if n_jobs == 1:
+        _init_export_worker()
+        for i, (name, params) in enumerate(tasks):
+            results[i] = run_task(name, params, out_dir, options)
+            log(f"[{i + 1}/{len(tasks)}] {name} {params} ({results[i][1]:.1f} 秒)")
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_export_worker) as executor:
+            futures = {executor.submit(run_task, name, params, out_dir, options): i
+                       for i, (name, params) in enumerate(tasks)}
+            for n_done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                results[i] = future.result()
+                log(f"[{n_done}/{len(tasks)}] {tasks[i][0]} {tasks[i][1]} ({results[i][1]:.1f} 秒)")
+
+    assets = [asset for task_assets, _ in results for asset in task_assets] # 按任务顺序排列，与完成顺序无关
+    manifest = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'numpy': np.__version__, 'sklearn': __import__('sklearn').__version__,
+                        'matplotlib': __import__('matplotlib').__version__},
+        'settings': {'stages': list(stages), 'formats': list(formats), 'quick': quick, 'dpi': dpi,
+                     'n_jobs': n_jobs, 'tree_svg': tree_svg},
+        'n_assets': len(assets),
+        'n_files': sum(len(asset['files']) for asset in assets),
+        'seconds': time.perf_counter() - start,
+        'assets': assets,
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+def compare(manifest, baseline):
+    """
+    按文件路径比较两份清单的 sha256，返回 (内容变化的文件, 基线中有而本次没有的文件, 新增的文件)
+    PNG 分辨率不同时同名文件的内容必然不同，无法比较，抛出 ValueError
+    """
+    dpi, baseline_dpi = manifest['settings']['dpi'], baseline['settings']['dpi']
+    if dpi != baseline_dpi:
+        raise ValueError(f"本次导出的 dpi={dpi} 与基线的 dpi={baseline_dpi} 不同")
+
+    def hashes(m):
+        return {record['path']: record['sha256'] for asset in m['assets'] for record in asset['files'].values()}
+    current, previous = hashes(manifest), hashes(baseline)
+    changed = sorted(path for path in current.keys() & previous.keys() if current[path] != previous[path])
+    return changed, sorted(previous.keys() - current.keys()), sorted(current.keys() - previous.keys())
+
+def same_grid(manifest, baseline):
+    """两次导出是否覆盖同一个网格 (阶段、格式、是否快速导出都相同)；不同时缺少 / 新增文件是预期之内的"""
+    def grid(m):
+        settings = m['settings']
+        return (set(settings['stages']), set(settings['formats']), settings['quick'], settings['tree_svg'])
+    return grid(manifest) == grid(baseline)
+
+def _name_list(text, allowed):
+    names = tuple(v.strip() for v in text.split(',') if v.strip())
+    unknown = [v for v in names if v not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"未知的取值: {', '.join(unknown)}（可选: {', '.join(allowed)}）")
+    return names
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量导出决策树教程各阶段的图像和结构图")
+    parser.add_argument('--output', default='exported', help="输出目录 (默认 exported)")
+    parser.add_argument('--stages', type=lambda text: _name_list(text, STAGES), default=STAGES,
+                        help="逗号分隔的阶段编号 (默认 1,4,5,6)")
+    parser.add_argument('--formats', type=lambda text: _name_list(text, FORMATS), default=FORMATS,
+                        help="逗号分隔的文件格式 (默认 png,svg,dot)")
+    parser.add_argument('--jobs', type=int, default=None, help="进程数 (默认使用全部 CPU，1 表示在当前进程中串行)")
+    parser.add_argument('--quick', action='store_true', help="只导出每个网格的一小部分 (深度 1–3，min_samples_leaf 1–2)")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI, help="PNG 的分辨率")
+    parser.add_argument('--baseline', help="与此前导出的 manifest.json 比较，有文件内容变化 (网格相同时还包括缺少文件) "
+                                           "时以状态码 1 退出")
+    args = parser.parse_args(argv)
+
+    manifest = export(args.output, stages=args.stages, formats=args.formats, n_jobs=args.jobs, quick=args.quick,
+                      dpi=args.dpi)
+    print(f"导出 {manifest['n_assets']} 项、{manifest['n_files']} 个文件到 {args.output}，"
+          f"耗时 {manifest['seconds']:.1f} 秒 ({manifest['settings']['n_jobs']} 个进程)")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            changed, missing, added = compare(manifest, baseline)
+        except ValueError as e:
+            print(f"无法与基线 {args.baseline} 比较: {e}", file=sys.stderr)
+            return 2
+        print(f"与基线 {args.baseline} 比较: {len(changed)} 个文件内容变化、{len(missing)} 个缺少、{len(added)} 个新增")
+        if same_grid(manifest, baseline):
+            listed = (("变化", changed), ("缺少", missing), ("新增", added))
+        else:
+            # 快速导出 / 部分阶段与完整导出比较：只有两边都有的文件才有可比性
+            print("  两次导出的网格不同 (阶段、格式或 --quick)，只比较两边都有的文件，缺少 / 新增的文件不计入结果")
+            listed, missing = (("变化", changed),), []
+        for label, paths in listed:
+            for path in paths:
+                print(f"  {label}: {path}")
+        if changed or missing:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
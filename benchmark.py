@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+教程计算核心的基准测试 (不依赖 Streamlit，可在无界面的服务器 / CI 上运行)
+按 X_simple 的方式生成不同规模的合成数据，对每个计算核心计时并记录峰值内存，
+结果写成 JSON，可以与之前保存的基线结果比较，发现性能退化。
+--startup 另外在全新的 Python 进程中以启动测量模式运行一次 app.py，把冷启动耗时也作为指标记录下来。
+
+    python benchmark.py --quick
+    python benchmark.py --output results.json
+    python benchmark.py --baseline baseline.json --tolerance 1.3
+    python benchmark.py --kernels "" --startup
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import sklearn
+from sklearn.tree import DecisionTreeClassifier, export_graphviz
+
+from tree_core import (CompiledTree, TreeTruncator, calculate_gini, calculate_weighted_gini, find_best_split,
+                       impurity_from_counts, leaf_rectangles)
+
+DEFAULT_ROWS = (100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_FEATURES = (2, 10, 100)
+QUICK_ROWS = (100, 1_000, 10_000)
+QUICK_FEATURES = (2, 10)
+MAX_CELLS = 10_000_000 # 行数 × 特征数超过此值的组合默认跳过 (float64 约 80 MB)
+MESH_STEP = 0.02 # 与教程原来的网格预测使用相同的步长
+EXPORT_MAX_DEPTH = 10 # 导出结构图的树限制深度，否则噪声数据上的树会随行数无限增长
+TRUNCATE_DEPTH = 3 # 阶段 5 深度滑块的默认值
+MEMORY_SLACK = 64 * 1024 # 峰值内存比较时允许的绝对误差，避免几百字节的小波动被判为退化
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+STARTUP_TIMEOUT = 600 # 冷启动测量中一次整页运行的超时 (秒)
+STARTUP_FIRST_STAGE = '阶段 1'
+
+
+# --- Synthetic Data ---
+def make_data(n_rows, n_features, noise=0.1, seed=42):
+    """与 X_simple 相同的配方：取值在 [0, 5) 的均匀分布，按 X1 > 2.5 分类，再随机翻转一部分标签"""
+    rng = np.random.default_rng(seed)
+    X = rng.random((n_rows, n_features)) * 5
+    y = (X[:, 0] > 2.5).astype(int)
+    flip = rng.choice(n_rows, size=int(n_rows * noise), replace=False)
+    y[flip] = 1 - y[flip]
+    return X, y
+
+
+# --- Kernels ---
+# 每个核心: setup(X, y) 准备好输入 (不计时)，返回一个无参数的函数供计时
+# per_feature 为 False 的核心只与行数有关，每个行数只测一次 (使用最少特征的数据)
+def _gini_setup(X, y):
+    return lambda: calculate_gini(y)
+
+def _weighted_gini_setup(X, y):
+    mask = X[:, 0] <= 2.5
+    y_left, y_right = y[mask], y[~mask]
+    return lambda: calculate_weighted_gini(y_left, y_right)
+
+def _batched_impurity_setup(X, y):
+    # 按第一个特征排序后的类别前缀计数：每一行是一个候选分割的左子集计数，一次调用算完所有候选的熵
+    order = np.argsort(X[:, 0], kind='stable')
+    counts = np.cumsum(np.eye(2, dtype=np.int64)[y[order]], axis=0)
+    return lambda: impurity_from_counts(counts, 'entropy')
+
+def _best_split_setup(X, y):
+    return lambda: find_best_split(X, y)
+
+_boundary_models = {} # 两个决策边界核心共用同一棵二维树，每份数据只训练一次 (百万行时训练很慢)
+
+def _boundary_model(X, y):
+    key = id(X)
+    if key not in _boundary_models:
+        _boundary_models[key] = DecisionTreeClassifier(random_state=42).fit(X[:, :2], y)
+    return _boundary_models[key]
+
+def _mesh_ranges(X):
+    return (X[:, 0].min() - 0.5, X[:, 0].max() + 0.5), (X[:, 1].min() - 0.5, X[:, 1].max() + 0.5)
+
+def _boundary_mesh_setup(X, y):
+    """教程原来的画法：在步长 0.02 的网格上逐点预测"""
+    compiled = CompiledTree(_boundary_model(X, y))
+    x_range, y_range = _mesh_ranges(X)
+    def run():
+        xx, yy = np.meshgrid(np.arange(*x_range, MESH_STEP), np.arange(*y_range, MESH_STEP))
+        return compiled.predict(np.c_[xx.ravel(), yy.ravel()]).reshape(xx.shape)
+    return run
+
+def _boundary_leaves_setup(X, y):
+    """当前的画法：直接由树结构推导每个叶子的矩形区域"""
+    tree = _boundary_model(X, y).tree_
+    x_range, y_range = _mesh_ranges(X)
+    return lambda: leaf_rectangles(tree, x_range, y_range)
+
+def _truncate_depth_setup(X, y):
+    """阶段 5 拖动深度滑块的代价：由完全生长的树截断出限制深度的树及其在训练集上的预测"""
+    model = _boundary_model(X, y)
+    leaves = CompiledTree(model).apply(X[:, :2]) # 训练集的叶子编号在截断器中只计算一次，不计时
+    def run():
+        truncator = TreeTruncator(model)
+        return truncator.truncate(TRUNCATE_DEPTH), truncator.predict(TRUNCATE_DEPTH, leaves)
+    return run
+
+def _refit_depth_setup(X, y):
+    """对照：按限制深度重新训练"""
+    X_2d = X[:, :2]
+    return lambda: DecisionTreeClassifier(max_depth=TRUNCATE_DEPTH, random_state=42).fit(X_2d, y)
+
+def _export_graphviz_setup(X, y):
+    model = DecisionTreeClassifier(max_depth=EXPORT_MAX_DEPTH, random_state=42).fit(X, y)
+    feature_names = [f"X{i + 1}" for i in range(X.shape[1])]
+    return lambda: export_graphviz(model, out_file=None, feature_names=feature_names, class_names=['0', '1'],
+                                   filled=True, rounded=True, special_characters=True)
+
+KERNELS = {
+    # 名称: (setup, per_feature)
+    'calculate_gini': (_gini_setup, False),
+    'calculate_weighted_gini': (_weighted_gini_setup, False),
+    'batched_impurity': (_batched_impurity_setup, False),
+    'find_best_split': (_best_split_setup, True),
+    'boundary_mesh': (_boundary_mesh_setup, False),
+    'boundary_leaves': (_boundary_leaves_setup, False),
+    'truncate_depth': (_truncate_depth_setup, False),
+    'refit_depth': (_refit_depth_setup, False),
+    'export_graphviz': (_export_graphviz_setup, True),
+}
+
+
+# --- Measurement ---
+def measure(func, repeat=3, min_time=0.2):
+    """
+    计时：每轮循环调用直到累计超过 min_time，取每次调用的平均耗时，共 repeat 轮；
+    峰值内存单独在 tracemalloc 下调用一次测得 (tracemalloc 会拖慢执行，不与计时混在一起)
+    """
+    func() # 预热
+    timings = []
+    for _ in range(repeat):
+        calls, start = 0, time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        timings.append(elapsed / calls)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds_min': min(timings), 'seconds_median': statistics.median(timings), 'repeat': repeat,
+            'peak_bytes': peak}
+
+def run_suite(kernels, rows, features, repeat=3, min_time=0.2, max_cells=MAX_CELLS, log=None):
+    """对每个 (核心, 行数, 特征数) 组合计时，返回结果列表"""
+    results = []
+    for n_rows in rows:
+        for n_features in features:
+            if n_rows * n_features > max_cells:
+                continue
+            X, y = make_data(n_rows, n_features)
+            for name in kernels:
+                setup, per_feature = KERNELS[name]
+                if not per_feature and n_features != min(features):
+                    continue
+                record = {'kernel': name, 'rows': n_rows, 'features': n_features if per_feature else None}
+                record.update(measure(setup(X, y), repeat=repeat, min_time=min_time))
+                results.append(record)
+                if log is not None:
+                    log(format_record(record))
+            _boundary_models.clear()
+    return results
+
+# --- Cold Start ---
+# 子进程中运行的脚本：用 Streamlit AppTest 在全新的解释器里跑一次整页 (不需要启动服务器和浏览器)
+_STARTUP_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[2], default_timeout=float(sys.argv[3])).run()
+sys.exit(1 if at.exception else 0)
+"""
+
+def _startup_once(app_path, timeout):
+    """在全新的进程中以启动测量模式运行一次 app_path，返回应用写出的冷启动报告 (instrumentation.startup_report)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'startup.jsonl')
+        env = dict(os.environ, DECISION_TREE_STARTUP_PROFILE='1', DECISION_TREE_STARTUP_LOG=log_path,
+                   DECISION_TREE_PROFILE_LOG='')
+        app_dir = os.path.dirname(os.path.abspath(app_path))
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, app_dir, app_path, str(timeout)],
+                              cwd=app_dir, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0 or not os.path.exists(log_path):
+            raise RuntimeError(f"冷启动测量失败 (状态码 {proc.returncode}):\n{proc.stderr[-2000:]}")
+        with open(log_path, encoding='utf-8') as f:
+            report = json.loads(f.readline())
+    report['process_seconds'] = elapsed # 从启动解释器 (包括导入 Streamlit) 到整页运行结束
+    return report
+
+def run_startup(app_path=APP_PATH, repeat=3, timeout=STARTUP_TIMEOUT, log=None):
+    """
+    冷启动测量：每轮在全新的进程中运行一次页面，返回与 run_suite() 相同格式的结果列表
+    (kernel 为 startup_*，rows/features 为 None，峰值内存不测)，可以和计算核心一起与基线比较
+    """
+    reports = [_startup_once(app_path, timeout) for _ in range(repeat)]
+    metrics = {
+        'startup_header': [r['marks']['header'] for r in reports], # 页面标题发送出去的时刻
+        'startup_first_stage': [r['stages'][STARTUP_FIRST_STAGE] for r in reports],
+        'startup_page': [r['seconds'] for r in reports],
+        'startup_imports': [r['import_seconds'] for r in reports], # 页面运行中导入重型依赖的总耗时
+        'startup_process': [r['process_seconds'] for r in reports],
+    }
+    results = []
+    for name, values in metrics.items():
+        record = {'kernel': name, 'rows': None, 'features': None, 'seconds_min': min(values),
+                  'seconds_median': statistics.median(values), 'repeat': repeat, 'peak_bytes': 0}
+        results.append(record)
+        if log is not None:
+            log(format_record(record))
+    if log is not None:
+        imports = sorted(reports[-1]['imports'], key=lambda i: -i['seconds'])
+        log("  最后一轮的依赖导入: " + ", ".join(
+            f"{i['package']} {i['seconds'] * 1e3:.0f} ms ({i['stage'] or i['thread']})" for i in imports))
+    return results
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+# --- Baseline Comparison ---
+def _case_key(record):
+    return record['kernel'], record['rows'], record['features']
+
+def compare(results, baseline, tolerance=1.25, memory_tolerance=1.25):
+    """
+    与基线逐项比较，返回 (比较结果列表, 退化项列表)
+    耗时 (seconds_min) 或峰值内存 (另加 MEMORY_SLACK) 超过基线 × tolerance 的项视为退化；基线中没有的组合不参与比较
+    """
+    base = {_case_key(r): r for r in baseline['results']}
+    rows, regressions = [], []
+    for record in results:
+        old = base.get(_case_key(record))
+        if old is None:
+            continue
+        time_ratio = record['seconds_min'] / old['seconds_min'] if old['seconds_min'] > 0 else float('inf')
+        memory_ratio = record['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] > 0 else 1.0
+        memory_regressed = record['peak_bytes'] > old['peak_bytes'] * memory_tolerance + MEMORY_SLACK
+        row = dict(record, time_ratio=time_ratio, memory_ratio=memory_ratio,
+                   regressed=time_ratio > tolerance or memory_regressed)
+        rows.append(row)
+        if row['regressed']:
+            regressions.append(row)
+    return rows, regressions
+
+
+# --- Command Line ---
+def _format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.3f} µs"
+
+def format_record(record):
+    features = '-' if record['features'] is None else record['features']
+    rows = '-' if record['rows'] is None else f"{record['rows']:,}"
+    line = (f"{record['kernel']:<24} rows={rows:>9} features={features!s:>4} "
+            f"{_format_seconds(record['seconds_min'])}  peak={record['peak_bytes'] / 1024 ** 2:9.2f} MB")
+    if 'time_ratio' in record:
+        line += f"  time×{record['time_ratio']:.2f} mem×{record['memory_ratio']:.2f}"
+        if record['regressed']:
+            line += "  <-- 退化"
+    return line
+
+def _int_list(text):
+    return tuple(int(float(v)) for v in text.split(','))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="决策树教程计算核心的基准测试")
+    parser.add_argument('--rows', type=_int_list, default=None, help="逗号分隔的行数 (默认 1e2..1e6)")
+    parser.add_argument('--features', type=_int_list, default=None, help="逗号分隔的特征数 (默认 2,10,100)")
+    parser.add_argument('--kernels', default=','.join(KERNELS), help="逗号分隔的核心名称 (为空时不测计算核心)")
+    parser.add_argument('--quick', action='store_true', help="只跑小规模数据 (1e2..1e4 行，2/10 个特征)")
+    parser.add_argument('--repeat', type=int, default=3, help="每个组合计时的轮数")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每轮至少累计运行的秒数")
+    parser.add_argument('--max-cells', type=float, default=MAX_CELLS, help="跳过 行数 × 特征数 超过此值的组合")
+    parser.add_argument('--startup', action='store_true',
+                        help="另外在全新的进程中测量 app.py 的冷启动 (依赖导入、标题和阶段 1 出现的时刻)，轮数同 --repeat")
+    parser.add_argument('--output', help="把结果写入此 JSON 文件 (可作为以后的基线)")
+    parser.add_argument('--baseline', help="与此 JSON 基线比较，有退化时以状态码 1 退出")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="耗时超过基线的倍数视为退化")
+    parser.add_argument('--memory-tolerance', type=float, default=1.25, help="峰值内存超过基线的倍数视为退化")
+    args = parser.parse_args(argv)
+
+    kernels = [k.strip() for k in args.kernels.split(',') if k.strip()]
+    unknown = [k for k in kernels if k not in KERNELS]
+    if unknown:
+        parser.error(f"未知的核心: {', '.join(unknown)}（可选: {', '.join(KERNELS)}）")
+    rows = args.rows or (QUICK_ROWS if args.quick else DEFAULT_ROWS)
+    features = args.features or (QUICK_FEATURES if args.quick else DEFAULT_FEATURES)
+
+    results = []
+    if kernels:
+        results += run_suite(kernels, rows, features, repeat=args.repeat, min_time=args.min_time,
+                             max_cells=args.max_cells, log=print)
+    if args.startup:
+        results += run_startup(repeat=args.repeat, log=print)
+    report = {
+        'environment': environment(),
+        'settings': {'rows': list(rows), 'features': list(features), 'kernels': kernels,
+                     'repeat': args.repeat, 'min_time': args.min_time, 'max_cells': args.max_cells,
+                     'startup': args.startup},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        compared, regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        print(f"\n与基线 {args.baseline} 比较 ({len(compared)} 项):")
+        for row in compared:
+            print(format_record(row))
+        if regressions:
+            print(f"{len(regressions)} 项性能退化")
+            return 1
+        print("没有发现性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+k 折交叉验证的 "max_depth × min_samples_leaf" 验证网格，不依赖 Streamlit
+每个 (折, min_samples_leaf) 只训练一棵树 (深度限制为网格中最大的 max_depth)，所有 max_depth 的准确率
+都由截断这棵树一次算出 (见 tree_core.TreeTruncator)；各个任务可以分给进程池并行，数据通过共享内存传给 worker。
+"""
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tree_core import TreeTruncator, attach_shared_arrays, share_array
+
+N_FOLDS = 5
+CV_MAX_ROWS = 20_000 # 行数超过此值时先分层抽样到这个规模再做交叉验证 (每棵树的训练时间与行数成正比)
+POOL_MIN_WORK = 200_000 # 任务数 × 行数少于此值时不启动进程池 (进程启动和导入 sklearn 约需 1–2 秒)
+
+ValidationGrid = namedtuple('ValidationGrid', [
+    'max_depths', 'min_samples_leafs', # 网格的两个轴
+    'train_scores', 'test_scores', # 形状 (n_folds, len(max_depths), len(min_samples_leafs)) 的每折准确率
+    'n_rows', 'n_folds', 'n_jobs', 'seconds',
+])
+
+
+def stratified_folds(y, n_folds=N_FOLDS, seed=42):
+    """分层 k 折：每个类别的样本随机打乱后轮流分到各折，返回每个样本所在的折编号"""
+    rng = np.random.default_rng(seed)
+    fold_ids = np.empty(len(y), dtype=np.intp)
+    for class_value in np.unique(y):
+        idx = np.flatnonzero(y == class_value)
+        fold_ids[rng.permutation(idx)] = np.arange(len(idx)) % n_folds
+    return fold_ids
+
+def _fold_scores(X, y, fold_ids, fold, criterion, min_samples_leaf, max_depths, random_state):
+    """
+    在第 fold 折以外的数据上训练一棵深度为 max(max_depths) 的树，返回截断到每个 max_depth 时的 (训练集, 测试集) 准确率
+    (截断到更浅的深度与完全生长后再截断相同，不必让树长满)
+    """
+    from sklearn.tree import DecisionTreeClassifier # worker 进程第一次执行任务时才导入
+
+    train, test = fold_ids != fold, fold_ids == fold
+    model = DecisionTreeClassifier(criterion=criterion, max_depth=int(max_depths.max()),
+                                   min_samples_leaf=min_samples_leaf, random_state=random_state).fit(X[train], y[train])
+    truncator = TreeTruncator(model)
+    depth_index = np.minimum(max_depths, truncator.max_depth) # 比树本身更深的限制等于不限制
+    return (truncator.accuracy_by_depth(X[train], y[train])[depth_index],
+            truncator.accuracy_by_depth(X[test], y[test])[depth_index])
+
+# 进程池 worker 中的只读数据：通过共享内存挂载，任务只携带 (折, min_samples_leaf)
+_worker_data = None
+_worker_shared_memory = []
+
+def _init_cv_worker(shared_specs, criterion, max_depths, random_state):
+    global _worker_data
+    arrays = attach_shared_arrays(shared_specs, _worker_shared_memory)
+    _worker_data = (arrays['X'], arrays['y'], arrays['fold_ids'], criterion, max_depths, random_state)
+
+def _worker_fold_scores(fold, min_samples_leaf):
+    X, y, fold_ids, criterion, max_depths, random_state = _worker_data
+    return _fold_scores(X, y, fold_ids, fold, criterion, min_samples_leaf, max_depths, random_state)
+
+
+def validation_grid(X, y, max_depths, min_samples_leafs, criterion='gini', n_folds=N_FOLDS, n_jobs=None,
+                    max_rows=CV_MAX_ROWS, random_state=42):
+    """
+    计算 max_depths × min_samples_leafs 网格上每一折的训练/测试准确率
+    共训练 n_folds × len(min_samples_leafs) 棵树 (而不是再乘以 len(max_depths))，超过 max_rows 行时先分层抽样；
+    n_jobs 为 None 时使用全部 CPU，为 1 或工作量很小时在当前进程中串行计算。结果与串行计算完全相同。
+    """
+    start = time.perf_counter()
+    max_depths = np.asarray(max_depths, dtype=np.intp)
+    min_samples_leafs = [int(leaf) for leaf in min_samples_leafs]
+    if len(X) > max_rows: # 大数据集分层抽样：网格的形状只取决于相对的超参数大小，不需要全部数据
+        keep = np.sort(np.flatnonzero(stratified_folds(y, int(np.ceil(len(X) / max_rows)), random_state) == 0))
+        X, y = X[keep], y[keep]
+    fold_ids = stratified_folds(y, n_folds, random_state)
+    tasks = [(fold, leaf) for leaf in min_samples_leafs for fold in range(n_folds)]
+    n_jobs = min(os.cpu_count() or 1, len(tasks)) if n_jobs is None else max(1, int(n_jobs))
+    if len(tasks) * len(X) < POOL_MIN_WORK:
+        n_jobs = 1
+
+    if n_jobs == 1:
+        results = [_fold_scores(X, y, fold_ids, fold, criterion, leaf, max_depths, random_state)
+                   for fold, leaf in tasks]
+    else:
+        blocks = []
+        try:
+            shared_specs = {'X': share_array(np.ascontiguousarray(X), blocks),
+                            'y': share_array(np.ascontiguousarray(y), blocks),
+                            'fold_ids': share_array(fold_ids, blocks)}
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_cv_worker,
+                                     initargs=(shared_specs, criterion, max_depths, random_state)) as executor:
+                results = list(executor.map(_worker_fold_scores, *zip(*tasks)))
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    # results 按 (min_samples_leaf, 折) 的顺序排列，每项是两条长度为 len(max_depths) 的曲线
+    scores = np.array(results).reshape(len(min_samples_leafs), n_folds, 2, len(max_depths))
+    scores = scores.transpose(2, 1, 3, 0) # -> (训练/测试, 折, max_depth, min_samples_leaf)
+    return ValidationGrid(max_depths, np.array(min_samples_leafs), scores[0], scores[1], len(X), n_folds, n_jobs,
+                          time.perf_counter() - start)
+
+def nearest_cell(grid, max_depth, min_samples_leaf):
+    """网格中与给定超参数最接近的格子 (max_depth 的下标, min_samples_leaf 的下标)"""
+    return (int(np.argmin(np.abs(grid.max_depths - max_depth))),
+            int(np.argmin(np.abs(grid.min_samples_leafs - min_samples_leaf))))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+内置示例数据集 (简单二维数据、Iris)，以及外部数据集接入：分块读取 CSV / Parquet，转换成紧凑的 float32 特征 + int32 标签
+写入磁盘上的 .npy 缓存，之后按文件内容哈希直接内存映射 (mmap) 缓存，重跑时不再解析原文件、也不会把整个数据读进内存
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+DATA_CACHE_DIR = os.environ.get('DECISION_TREE_DATA_CACHE',
+                                os.path.join(tempfile.gettempdir(), 'decision-tree-tutorial-data'))
+CHUNK_ROWS = 262_144 # 每次从原文件读取的行数，解析时的内存占用与之成正比
+HASH_BLOCK_SIZE = 1 << 20
+
+# name: 显示名；X: (n, n_features) float32 内存映射；y: (n,) int32 类别编码；fingerprint: 文件哈希 + 标签列
+Dataset = namedtuple('Dataset', ['name', 'X', 'y', 'feature_names', 'class_names', 'fingerprint', 'n_dropped'])
+
+_path_hashes = {} # (绝对路径, 大小, 修改时间) -> 内容哈希，同一个未修改的文件只哈希一次
+
+
+def _source_name(source):
+    return source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', 'uploaded')
+
+def _source_format(source):
+    name = str(_source_name(source)).lower()
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if name.endswith(('.csv', '.txt', '.csv.gz')):
+        return 'csv'
+    raise ValueError(f"不支持的文件类型: {name}（只支持 CSV 和 Parquet）")
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def file_hash(source):
+    """按块计算文件 (本地路径或上传的文件对象) 内容的哈希；本地文件按大小和修改时间记住结果"""
+    stat_key = None
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        stat_key = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+        if stat_key in _path_hashes:
+            return _path_hashes[stat_key]
+
+    digest = hashlib.blake2b(digest_size=16)
+    handle = open(source, 'rb') if stat_key is not None else _rewind(source)
+    try:
+        for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    finally:
+        if stat_key is not None:
+            handle.close()
+        else:
+            _rewind(source)
+    if stat_key is not None:
+        _path_hashes[stat_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+def read_columns(source):
+    """只读取表头，返回列名列表 (供选择标签列)"""
+    if _source_format(source) == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(_rewind(source)).schema_arrow.names)
+    import pandas as pd # 只有读取外部表格时才需要 pandas
+    columns = list(pd.read_csv(_rewind(source), nrows=0).columns)
+    _rewind(source)
+    return columns
+
+def _iter_chunks(source, chunk_rows):
+    if _source_format(source) == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(_rewind(source)).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(_rewind(source), chunksize=chunk_rows)
+
+def _sorted_labels(labels):
+    """类别按取值排序 (可比较时)，保证同一份数据每次得到相同的编码"""
+    try:
+        return sorted(labels)
+    except TypeError:
+        return list(labels)
+
+def _convert(source, target_column, out_dir, chunk_rows):
+    """分块读取原文件，把特征/标签追加写入原始二进制文件，最后整理成 .npy；返回元数据字典"""
+    import pandas as pd
+
+    feature_names = None
+    label_codes = {} # 标签取值 -> 首次出现顺序的编码
+    n_rows = n_dropped = 0
+    raw_X, raw_y = os.path.join(out_dir, 'X.raw'), os.path.join(out_dir, 'y.raw')
+    with open(raw_X, 'wb') as fx, open(raw_y, 'wb') as fy:
+        for chunk in _iter_chunks(source, chunk_rows):
+            if target_column not in chunk.columns:
+                raise ValueError(f"找不到标签列: {target_column!r}")
+            if feature_names is None: # 特征列以第一块中的数值列为准
+                feature_names = [c for c in chunk.select_dtypes('number').columns if c != target_column]
+                if not feature_names:
+                    raise ValueError("除标签列外没有数值型特征列")
+            features = chunk[feature_names].apply(pd.to_numeric, errors='coerce').to_numpy(np.float32)
+            target = chunk[target_column]
+            keep = ~(np.isnan(features).any(axis=1) | target.isna().to_numpy())
+            n_dropped += int(len(keep) - keep.sum())
+            features, target = features[keep], target[keep]
+            for label in pd.unique(target):
+                label_codes.setdefault(label, len(label_codes))
+            fx.write(np.ascontiguousarray(features).tobytes())
+            fy.write(target.map(label_codes).to_numpy(np.int32).tobytes())
+            n_rows += len(features)
+    if n_rows == 0:
+        raise ValueError("数据中没有可用的行")
+
+    # 类别编码改为按类别取值排序；原始二进制文件逐块复制进 .npy，整个过程只占用一块的内存
+    class_names = _sorted_labels(label_codes)
+    remap = np.empty(len(label_codes), dtype=np.int32)
+    for code, label in enumerate(class_names):
+        remap[label_codes[label]] = code
+    n_features = len(feature_names)
+    src_X = np.memmap(raw_X, dtype=np.float32, mode='r', shape=(n_rows, n_features))
+    src_y = np.memmap(raw_y, dtype=np.int32, mode='r', shape=(n_rows,))
+    dst_X = np.lib.format.open_memmap(os.path.join(out_dir, 'X.npy'), mode='w+', dtype=np.float32,
+                                      shape=(n_rows, n_features))
+    dst_y = np.lib.format.open_memmap(os.path.join(out_dir, 'y.npy'), mode='w+', dtype=np.int32, shape=(n_rows,))
+    for start in range(0, n_rows, chunk_rows):
+        dst_X[start:start + chunk_rows] = src_X[start:start + chunk_rows]
+        dst_y[start:start + chunk_rows] = remap[src_y[start:start + chunk_rows]]
+    dst_X.flush()
+    dst_y.flush()
+    del src_X, src_y, dst_X, dst_y
+    os.remove(raw_X)
+    os.remove(raw_y)
+    return {
+        'feature_names': [str(c) for c in feature_names],
+        'class_names': [str(c) for c in class_names],
+        'n_rows': n_rows,
+        'n_dropped': n_dropped,
+    }
+
+def load_table(source, target_column=None, cache_dir=DATA_CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """
+    加载 CSV / Parquet 表格 (本地路径或上传的文件对象)，返回特征为只读内存映射的 Dataset
+    target_column 为 None 时使用最后一列作为标签；其余数值列作为特征，含缺失值的行会被丢弃。
+    同一份文件内容 + 标签列只转换一次，之后直接映射磁盘上的 .npy 缓存。
+    """
+    if target_column is None:
+        target_column = read_columns(source)[-1]
+    fingerprint = hashlib.blake2b(f"{file_hash(source)}:{target_column}".encode('utf-8'),
+                                  digest_size=16).hexdigest()
+    entry_dir = os.path.join(cache_dir, fingerprint)
+    meta_path = os.path.join(entry_dir, 'meta.json')
+
+    if not os.path.exists(meta_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写进临时目录再整体改名，转换中途失败或并发转换都不会留下半成品
+        tmp_dir = tempfile.mkdtemp(prefix=f"{fingerprint}-", dir=cache_dir)
+        try:
+            meta = _convert(source, target_column, tmp_dir, chunk_rows)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError: # 另一个会话已经转换好了同一份数据
+                pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    return Dataset(
+        name=os.path.basename(str(_source_name(source))),
+        X=np.load(os.path.join(entry_dir, 'X.npy'), mmap_mode='r'),
+        y=np.load(os.path.join(entry_dir, 'y.npy'), mmap_mode='r'),
+        feature_names=meta['feature_names'],
+        class_names=meta['class_names'],
+        fingerprint=fingerprint,
+        n_dropped=meta['n_dropped'],
+    )
+
+
+# --- Built-in Datasets ---
+def make_simple_data():
+    """阶段 1–5 使用的 50 点简单二维数据集 (X1 > 2.5 为类别 1，5 个噪音点)，返回 (X_simple, y_simple)"""
+    # 独立的随机数生成器：与 np.random.seed(42) 之后的序列相同，但不改动全局随机状态
+    rng = np.random.RandomState(42) # for reproducibility
+    X_simple = rng.rand(50, 2) * 5
+    # 简单的线性规则: 如果 X1 > 2.5，则为类别 1 (蓝色)，否则为类别 0 (红色)
+    y_simple = (X_simple[:, 0] > 2.5).astype(int)
+    # 加入一些噪音
+    noise_indices = rng.choice(len(X_simple), size=5, replace=False)
+    y_simple[noise_indices] = 1 - y_simple[noise_indices]
+    return X_simple, y_simple
+
+def load_iris_data():
+    """阶段 6 默认使用的 Iris 数据，返回 (X, y, 中文特征名, 类别名, DataFrame)"""
+    import pandas as pd
+    from sklearn.datasets import load_iris # 用到 Iris 时才导入 sklearn
+
+    iris = load_iris()
+    X_iris = iris.data
+    y_iris = iris.target
+    feature_names_iris = ['花萼长(cm)', '花萼宽(cm)', '花瓣长(cm)', '花瓣宽(cm)'] # 使用中文特征名
+    target_names_iris = iris.target_names # 保持英文类别名 'setosa', 'versicolor', 'virginica'
+    df_iris = pd.DataFrame(data=X_iris, columns=feature_names_iris)
+    # 添加类别名称列（可选，用于显示）
+    df_iris['类别名称'] = pd.Categorical.from_codes(y_iris, target_names_iris)
+    return X_iris, y_iris, feature_names_iris, target_names_iris, df_iris
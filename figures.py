@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""图像生命周期管理：每个绘图位置复用一张 Agg 画布，重跑时原地更新图元，并确定性地释放图像"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# 进程内所有存活的 FigureManager (每个会话一个)，会话结束被回收后自动从这里消失
+_managers = weakref.WeakSet()
+_managers_lock = threading.Lock()
+
+
+class FigureSlot:
+    """
+    一个绘图位置 (slot) 上复用的图像
+    artists: 绘图函数保存下来、下次重跑时可以原地更新的图元 (散点、分割线、标题等)
+    key: 当前图像所对应的数据/模型；绘图函数据此判断能否原地更新，不能时调用 reset() 重画
+    """
+    def __init__(self, name, figsize):
+        self.name = name
+        self.figsize = tuple(figsize)
+        # 直接构造 Figure + Agg 画布，不经过 pyplot，图像不会登记到 pyplot 的全局注册表
+        self.fig, self.ax = new_figure(figsize)
+        self.artists = {}
+        self.key = None
+        self.last_used = 0
+
+    def reset(self, key=None):
+        """清空坐标轴和保存的图元，画布本身保留下来继续复用"""
+        self.ax.cla()
+        self.artists.clear()
+        self.key = key
+
+    def nbytes(self):
+        """图像占用的字节数：图元中的坐标数据 + 画布渲染缓冲区 (RGBA，尚未释放时)"""
+        return _figure_nbytes(self.fig)
+
+    def release(self):
+        self.artists.clear()
+        self.key = None
+        self.fig.clear()
+        drop_render_buffer(self.fig)
+
+
+def _figure_nbytes(fig):
+    total = 0
+    for ax in fig.axes:
+        for collection in ax.collections:
+            total += np.asarray(collection.get_offsets()).nbytes
+            total += sum(path.vertices.nbytes for path in collection.get_paths())
+        for line in ax.lines:
+            total += line.get_xydata().nbytes
+    renderer = getattr(fig.canvas, 'renderer', None)
+    if renderer is not None:
+        total += int(renderer.width) * int(renderer.height) * 4
+    return total
+
+
+def drop_render_buffer(fig):
+    """
+    丢掉 Agg 画布缓存的渲染缓冲区，不必等垃圾回收。
+    get_renderer() 只在 (宽, 高, dpi) 变化时重建渲染器，所以要同时清掉这个键，下次绘制或保存时才会重新分配。
+    """
+    canvas = fig.canvas
+    if hasattr(canvas, 'renderer'):
+        del canvas.renderer
+        canvas._lastKey = None
+
+
+def _release_slots(slots):
+    for slot in slots.values():
+        slot.release()
+    slots.clear()
+
+
+class FigureManager:
+    """
+    按名称管理一个会话中的所有绘图位置
+    每次脚本重跑开始时调用 begin_run()：上一次重跑中没有用到的位置 (例如条件分支里的图) 会被立即释放，
+    因此存活的图像数量不会超过页面上的绘图位置数。会话对象被回收时剩余的图像也会一并释放。
+    """
+    def __init__(self):
+        self._slots = OrderedDict()
+        self._run = 0
+        self._finalizer = weakref.finalize(self, _release_slots, self._slots)
+        with _managers_lock:
+            _managers.add(self)
+
+    def begin_run(self):
+        """开始新一次重跑：释放上一次重跑中没有被请求过的位置"""
+        for name in [name for name, slot in self._slots.items() if slot.last_used < self._run]:
+            self.release(name)
+        self._run += 1
+
+    def slot(self, name, figsize=(6, 5)):
+        """返回名为 name 的绘图位置；尺寸变化时换一张新图"""
+        slot = self._slots.get(name)
+        if slot is not None and slot.figsize != tuple(figsize):
+            self.release(name)
+            slot = None
+        if slot is None:
+            slot = self._slots[name] = FigureSlot(name, figsize)
+        slot.last_used = self._run
+        return slot
+
+    def release(self, name):
+        slot = self._slots.pop(name, None)
+        if slot is not None:
+            slot.release()
+
+    def release_all(self):
+        _release_slots(self._slots)
+
+    def stats(self):
+        """本会话存活的图像数量和渲染缓冲区字节数"""
+        slots = list(self._slots.values())
+        return {'figures': len(slots), 'bytes': sum(slot.nbytes() for slot in slots)}
+
+
+def global_stats():
+    """整个进程 (所有会话) 存活的图像数量和渲染缓冲区字节数"""
+    with _managers_lock:
+        managers = list(_managers)
+    per_session = [manager.stats() for manager in managers]
+    return {
+        'sessions': len(per_session),
+        'figures': sum(s['figures'] for s in per_session),
+        'bytes': sum(s['bytes'] for s in per_session),
+    }
+
+
+def new_figure(figsize=(6, 5)):
+    """新建一张不登记到 pyplot 的独立图像，返回 (fig, ax)，不再引用时随垃圾回收释放"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg # 第一次建图时才导入 matplotlib，页面开头不必等它
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""决策树结构图的渲染缓存：按 DOT 源码的哈希缓存 graphviz 排版好的 SVG，相同的树只排版一次"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class DotRenderCache:
+    """
+    线程安全、按字节数限制容量的 LRU 缓存：sha256(DOT 源码) -> SVG 文本
+    服务器上没有 graphviz 的 dot 可执行文件时 render() 返回 None，调用方退回到浏览器端排版 (st.graphviz_chart)。
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, engine='dot'):
+        self.max_bytes = max_bytes
+        self.engine = engine
+        self.available = True # 第一次找不到 dot 可执行文件后置为 False，之后不再尝试
+        self._svgs = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._svgs)
+
+    @staticmethod
+    def key(dot_source):
+        return hashlib.sha256(str(dot_source).encode('utf-8')).hexdigest()
+
+    def render(self, dot_source):
+        """返回 DOT 源码对应的 SVG 文本；无法在服务器端排版时返回 None"""
+        if not self.available:
+            return None
+        key = self.key(dot_source)
+        with self._lock:
+            svg = self._svgs.get(key)
+            if svg is not None:
+                self._svgs.move_to_end(key)
+                self.hits += 1
+                return svg
+            self.misses += 1
+
+        import graphviz # 缓存未命中、真正需要排版时才导入
+
+        try:
+            svg = graphviz.Source(str(dot_source), engine=self.engine).pipe(format='svg', encoding='utf-8')
+        except graphviz.ExecutableNotFound:
+            self.available = False
+            return None
+
+        size = len(svg.encode('utf-8'))
+        if size > self.max_bytes: # 单张图超过整个缓存的容量，直接返回不缓存
+            return svg
+        with self._lock:
+            if key not in self._svgs:
+                self._svgs[key] = svg
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._svgs.popitem(last=False)
+                self._bytes -= len(evicted.encode('utf-8'))
+                self.evictions += 1
+        return svg
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available,
+                'size': len(self._svgs),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
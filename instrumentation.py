@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+重跑性能分析：把每个阶段和每次耗时调用 (训练、预测、绘图、DOT 导出) 记录为带耗时和峰值内存的 span，
+保留最近若干次重跑的历史，并把每次重跑的结果追加写入 JSON Lines 日志，便于离线分析多个会话的延迟
+
+启动测量模式 (环境变量 DECISION_TREE_STARTUP_PROFILE=1)：记录重型依赖第一次导入的耗时，
+并在进程的第一次整页重跑结束后把冷启动报告 (各依赖的导入耗时、页面标题和各阶段出现的时刻) 写入另一个日志
+"""
+import importlib.abc
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque, namedtuple
+from functools import wraps
+
+PROFILE_LOG_PATH = os.environ.get('DECISION_TREE_PROFILE_LOG',
+                                  os.path.join(tempfile.gettempdir(), 'decision-tree-tutorial-profile.jsonl'))
+PROFILE_LOG_MAX_BYTES = 16 * 1024 * 1024 # 日志超过此大小时轮转为 .1，只保留一份旧日志
+HISTORY_SIZE = 50 # 每个会话保留的最近重跑数
+
+STARTUP_PROFILE = os.environ.get('DECISION_TREE_STARTUP_PROFILE', '') not in ('', '0')
+STARTUP_LOG_PATH = os.environ.get('DECISION_TREE_STARTUP_LOG',
+                                  os.path.join(tempfile.gettempdir(), 'decision-tree-tutorial-startup.jsonl'))
+# 启动测量模式下记录第一次导入耗时的顶层包
+STARTUP_PACKAGES = ('numpy', 'pandas', 'matplotlib', 'scipy', 'sklearn', 'graphviz', 'pyarrow')
+
+# kind: 'stage' / 'fit' / 'predict' / 'plot' / 'dot' / 'render'；depth: 嵌套层数 (阶段为 0)
+# start: 相对重跑开始的秒数；peak_bytes: span 内 tracemalloc 峰值比开始时多出的字节数 (未开启内存跟踪时为 None)
+Span = namedtuple('Span', ['name', 'kind', 'depth', 'start', 'seconds', 'peak_bytes'])
+
+_local = threading.local() # 当前线程 (即当前会话的脚本线程) 正在记录的 Profiler
+_log_lock = threading.Lock()
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _acquire_tracing():
+    """tracemalloc 是进程级的：按引用计数开启，最后一个使用者释放后才关闭"""
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+def _release_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users = max(_tracing_users - 1, 0)
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Profiler:
+    """
+    一个会话的性能记录器。每次重跑开始时调用 begin_run()，结束时调用 end_run()；
+    stage(name) 结束上一个阶段并开始新的阶段，span() / traced() 记录阶段内的单次调用。
+    开启内存跟踪时，多个会话同时重跑会互相计入对方的分配，峰值内存只能作为参考。
+    """
+    def __init__(self, log_path=PROFILE_LOG_PATH, history_size=HISTORY_SIZE):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.log_path = log_path
+        self.history = deque(maxlen=history_size) # 已完成重跑的摘要 (dict)，最新的在最后
+        self._run = 0
+        self._spans = None # 当前重跑的 Span 列表 (按开始顺序)；None 表示没有正在记录的重跑
+        self._stack = [] # 未结束的 span: [在 _spans 中的位置, 名称, 类型, 开始时刻, 开始时的内存, 子 span 的最高峰值]
+        self._started = 0.0
+        self._wall_started = 0.0
+        self._scope = 'page'
+        self._marks = {}
+        self.trace_memory = False
+
+    # --- Runs ---
+    def begin_run(self, trace_memory=False, scope='page'):
+        """
+        开始记录新一次重跑；上一次重跑被 st.stop() 等中断而没有结束时，先把它作为中断的重跑收尾
+        scope: 'page' 表示整页重跑，只重跑某个片段时为片段 (阶段) 名
+        """
+        if self._spans is not None:
+            self.end_run(interrupted=True)
+        self._run += 1
+        self._scope = scope
+        self._spans = []
+        self._stack = []
+        self._marks = {}
+        self.trace_memory = trace_memory
+        if trace_memory:
+            _acquire_tracing()
+        self._wall_started = time.time()
+        self._started = time.perf_counter()
+        _local.profiler = self
+
+    def end_run(self, interrupted=False):
+        """结束当前重跑：关闭所有未结束的 span，写入历史和日志，返回本次重跑的摘要"""
+        if self._spans is None:
+            return None
+        while self._stack:
+            self._close()
+        total = time.perf_counter() - self._started
+        if self.trace_memory:
+            _release_tracing()
+        if getattr(_local, 'profiler', None) is self:
+            _local.profiler = None
+        record = {
+            'session': self.session_id,
+            'run': self._run,
+            'scope': self._scope,
+            'timestamp': self._wall_started,
+            'seconds': total,
+            'interrupted': interrupted,
+            'trace_memory': self.trace_memory,
+            'spans': [span._asdict() for span in self._spans],
+            'marks': self._marks,
+        }
+        self._spans = None
+        self.history.append(record)
+        self._write_log(record)
+        return record
+
+    @property
+    def last_run(self):
+        return self.history[-1] if self.history else None
+
+    # --- Spans ---
+    def _open(self, name, kind):
+        now = time.perf_counter()
+        memory = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack: # 父 span 到目前为止的峰值先记下来，再重置峰值给子 span 单独计量
+                self._stack[-1][-1] = max(self._stack[-1][-1], peak)
+            tracemalloc.reset_peak()
+            memory = current
+        self._spans.append(None) # 先占位，保证列表按开始顺序排列
+        self._stack.append([len(self._spans) - 1, name, kind, now, memory, 0])
+
+    def _close(self):
+        index, name, kind, started, memory, child_peak = self._stack.pop()
+        seconds = time.perf_counter() - started
+        peak_bytes = None
+        if memory is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            absolute_peak = max(peak, child_peak)
+            peak_bytes = max(absolute_peak - memory, 0)
+            if self._stack:
+                self._stack[-1][-1] = max(self._stack[-1][-1], absolute_peak)
+        self._spans[index] = Span(name, kind, len(self._stack), started - self._started, seconds, peak_bytes)
+
+    def span(self, name, kind):
+        """上下文管理器：记录一次调用；没有正在记录的重跑时什么也不做"""
+        return _SpanContext(self if self._spans is not None else None, name, kind)
+
+    def mark(self, name):
+        """记录一个时刻 (相对重跑开始的秒数)，例如页面标题已经发送给浏览器；同名的时刻只记第一次"""
+        if self._spans is not None:
+            self._marks.setdefault(name, time.perf_counter() - self._started)
+
+    def stage(self, name):
+        """结束上一个阶段 (以及其中未结束的 span)，开始记录名为 name 的新阶段"""
+        if self._spans is None:
+            return
+        while self._stack:
+            self._close()
+        self._open(name, 'stage')
+
+    # --- Log ---
+    def _write_log(self, record):
+        _append_log(self.log_path, record)
+
+
+def _append_log(path, record):
+    """把一条记录追加写入 JSON Lines 日志，超过 PROFILE_LOG_MAX_BYTES 时轮转"""
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    try:
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) > PROFILE_LOG_MAX_BYTES:
+                os.replace(path, path + '.1')
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError: # 日志只是辅助信息，写不进去不影响页面
+        pass
+
+
+class _SpanContext:
+    def __init__(self, profiler, name, kind):
+        self.profiler = profiler
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler._open(self.name, self.kind)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None and self.profiler._stack:
+            self.profiler._close()
+        return False
+
+
+def current_profiler():
+    """当前线程正在记录的 Profiler (没有时为 None)"""
+    return getattr(_local, 'profiler', None)
+
+def span(name, kind):
+    """在当前线程的 Profiler 中记录一个 span；没有正在记录的重跑时什么也不做"""
+    profiler = current_profiler()
+    return profiler.span(name, kind) if profiler is not None else _SpanContext(None, name, kind)
+
+def traced(kind, name=None):
+    """装饰器：把函数的每次调用记录为一个 span (名称默认为函数名)"""
+    def decorator(func):
+        label = name or getattr(func, '__name__', repr(func))
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Startup ---
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    放在 sys.meta_path 最前面，记录所关注的顶层包第一次导入的耗时 (包含它导入的子模块和其他依赖)，
+    以及导入发生在哪个阶段。只在这些包还没有导入时介入，对其他模块的导入只多一次集合查找。
+    """
+    def __init__(self, packages=STARTUP_PACKAGES):
+        self.packages = frozenset(packages)
+        self.installed = time.time()
+        self.imports = [] # 按导入完成的顺序: {'package', 'seconds', 'stage', 'thread', 'parent'}
+        self._finding = set()
+        self._active = threading.local() # 每个线程正在导入的关注包 (栈)，用来标出嵌套的导入
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in self.packages or fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            spec = importlib.util.find_spec(fullname) # 交给后面的查找器，找到后只替换 loader
+        finally:
+            self._finding.discard(fullname)
+        if spec is None or spec.loader is None:
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def _begin(self, name):
+        if not hasattr(self._active, 'stack'):
+            self._active.stack = []
+        self._active.stack.append(name)
+        return time.perf_counter()
+
+    def _end(self, name, started):
+        seconds = time.perf_counter() - started
+        stack = self._active.stack
+        stack.pop()
+        profiler = current_profiler()
+        stage = profiler._stack[0][1] if profiler is not None and profiler._stack else None
+        self.imports.append({'package': name, 'seconds': seconds, 'stage': stage,
+                             'thread': threading.current_thread().name, 'parent': stack[-1] if stack else None})
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """包装原来的 loader，给模块的创建和执行计时；执行完后把模块上的 loader 换回原来的"""
+    def __init__(self, loader, timer, name):
+        self.loader = loader
+        self.timer = timer
+        self.name = name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        started = self.timer._begin(self.name)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            module.__loader__ = module.__spec__.loader = self.loader
+            self.timer._end(self.name, started)
+
+    def __getattr__(self, name): # is_package / get_resource_reader 等交给原来的 loader
+        return getattr(self.loader, name)
+
+
+_import_timer = None
+_startup_report = None
+_startup_lock = threading.Lock()
+
+def install_import_timer():
+    """启动测量模式下安装 ImportTimer (只安装一次)；应在导入任何重型依赖之前调用"""
+    global _import_timer
+    if STARTUP_PROFILE and _import_timer is None:
+        _import_timer = ImportTimer()
+        sys.meta_path.insert(0, _import_timer)
+    return _import_timer
+
+def startup_report(record):
+    """
+    启动测量模式下，用进程的第一次完整的整页重跑 (end_run() 返回的摘要) 生成冷启动报告并写入 STARTUP_LOG_PATH，
+    之后的调用返回同一份报告；没有开启启动测量模式时返回 None。报告中的时刻都是相对 ImportTimer 安装时刻的秒数。
+    """
+    global _startup_report
+    if _import_timer is None:
+        return None
+    with _startup_lock:
+        if _startup_report is None and record is not None and record['scope'] == 'page' and not record['interrupted']:
+            run_offset = record['timestamp'] - _import_timer.installed
+            imports = list(_import_timer.imports)
+            _startup_report = {
+                'pid': os.getpid(),
+                'timestamp': record['timestamp'],
+                'run_offset': run_offset, # 安装 ImportTimer 到重跑开始之间 (模块顶层的导入)
+                'marks': {name: run_offset + t for name, t in record['marks'].items()},
+                'stages': {s['name']: run_offset + s['start'] + s['seconds']
+                           for s in record['spans'] if s['kind'] == 'stage'}, # 各阶段渲染完成的时刻
+                'seconds': run_offset + record['seconds'],
+                'import_seconds': sum(i['seconds'] for i in imports if i['parent'] is None),
+                'imports': imports,
+            }
+            _append_log(STARTUP_LOG_PATH, _startup_report)
+        return _startup_report
+
+install_import_timer()
+
+
+def read_log(path=PROFILE_LOG_PATH):
+    """读取 JSON Lines 日志，返回每次重跑的摘要列表 (跳过损坏的行)，供离线分析"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
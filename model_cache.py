@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""训练好的决策树模型缓存：按超参数做 LRU 缓存，并可在后台线程中预先训练整个滑块网格"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def dataset_fingerprint(X, y):
+    """根据特征矩阵 (NumPy 数组或 DataFrame) 和标签的内容计算数据集指纹"""
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(X, 'columns'): # DataFrame: 列名也会影响训练出的模型 (feature_names_in_)
+        digest.update(repr(list(X.columns)).encode('utf-8'))
+        X = X.to_numpy()
+    for array in (np.ascontiguousarray(X), np.ascontiguousarray(y)):
+        digest.update(repr((array.shape, array.dtype.str)).encode('utf-8'))
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """
+    线程安全、容量有上限的 LRU 模型缓存
+    键: (数据集指纹, criterion, max_depth, min_samples_leaf, 特征组合)，特征组合为 None 表示使用全部特征。
+    同一个键同时被多次请求时只训练一次，其余请求等待结果。
+    """
+    def __init__(self, max_entries=4096, random_state=42):
+        self.max_entries = max_entries
+        self.random_state = random_state
+        self._models = OrderedDict()
+        self._inflight = {} # 正在训练的键 -> threading.Event
+        self._lock = threading.Lock()
+        self._prewarm_jobs = {} # 预热任务名 -> {'done': 已完成数, 'total': 总数}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._models)
+
+    def _fit(self, X, y, criterion, max_depth, min_samples_leaf, features):
+        from sklearn.tree import DecisionTreeClassifier # 第一次训练时才导入 sklearn (冷启动时约 1 秒)
+
+        if features is not None:
+            X = X.iloc[:, list(features)] if hasattr(X, 'iloc') else X[:, list(features)]
+        clf = DecisionTreeClassifier(criterion=criterion, max_depth=max_depth,
+                                     min_samples_leaf=min_samples_leaf, random_state=self.random_state)
+        return clf.fit(X, y)
+
+    def get_or_fit(self, X, y, criterion='gini', max_depth=None, min_samples_leaf=1, features=None,
+                   fingerprint=None):
+        """返回缓存中的模型；没有时训练一个并放入缓存。返回的模型是共享的，只能用于预测/导出，不要再 fit。"""
+        fingerprint = fingerprint or dataset_fingerprint(X, y)
+        features = None if features is None else tuple(int(f) for f in features)
+        key = (fingerprint, criterion, max_depth, min_samples_leaf, features)
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key]
+                event = self._inflight.get(key)
+                if event is None:
+                    self.misses += 1
+                    self._inflight[key] = event = threading.Event()
+                    break
+            event.wait() # 另一个线程正在训练同一个模型，等它完成后重新查找
+
+        try:
+            model = self._fit(X, y, criterion, max_depth, min_samples_leaf, features)
+            with self._lock:
+                self._models[key] = model
+                self._models.move_to_end(key)
+                while len(self._models) > self.max_entries:
+                    self._models.popitem(last=False)
+                    self.evictions += 1
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+        return model
+
+    def prewarm(self, name, X, y, max_depths, min_samples_leafs, criteria=('gini',), features=None,
+                fingerprint=None):
+        """
+        在后台守护线程中把 (criteria × max_depths × min_samples_leafs) 网格上的模型都训练好放入缓存
+        同名任务只会启动一次；返回是否新启动了任务。
+        """
+        fingerprint = fingerprint or dataset_fingerprint(X, y)
+        grid = [(criterion, max_depth, min_samples_leaf)
+                for criterion in criteria for max_depth in max_depths for min_samples_leaf in min_samples_leafs]
+        job_name = (name, fingerprint)
+        with self._lock:
+            if job_name in self._prewarm_jobs:
+                return False
+            progress = self._prewarm_jobs[job_name] = {'done': 0, 'total': len(grid)}
+
+        def run():
+            for criterion, max_depth, min_samples_leaf in grid:
+                self.get_or_fit(X, y, criterion, max_depth, min_samples_leaf, features, fingerprint)
+                progress['done'] += 1
+
+        threading.Thread(target=run, name=f"prewarm-{name}", daemon=True).start()
+        return True
+
+    def stats(self):
+        """返回缓存命中情况和各预热任务的进度"""
+        with self._lock:
+            return {
+                'size': len(self._models),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'prewarm': {name: dict(progress) for (name, _), progress in self._prewarm_jobs.items()},
+            }
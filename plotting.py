@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""教程中的 matplotlib 绘图函数 (数据散点/密度图、分割线、增益曲线、剪枝曲线、验证热力图、决策边界、森林边界)，不依赖 Streamlit"""
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import ListedColormap, to_rgba_array
+
+from cross_validation import nearest_cell
+from figures import new_figure
+from instrumentation import traced
+from model_cache import dataset_fingerprint
+from tree_core import leaf_rectangles, node_class_values
+
+# --- 设置 Matplotlib 支持中文 (适配 Streamlit Cloud) ---
+# 各阶段第一次绘图时才导入本模块 (连同 matplotlib)，字体也在那时设置
+try:
+    # 指定使用通过 packages.txt 安装的 WenQuanYi Micro Hei 字体
+    plt.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei']
+    plt.rcParams['axes.unicode_minus'] = False # 解决保存图像是负号'-'显示为方块的问题
+    print("成功设置字体为 WenQuanYi Micro Hei") # 在后台日志中打印，便于调试
+except Exception as e:
+    # 如果设置失败，图表标签可能显示为方框；请确保 packages.txt 文件包含 'fonts-wqy-microhei' 并已成功安装
+    print(f"字体设置失败: {e}") # 在后台日志中打印错误
+
+
+def _figure_axes(ax, slot, figsize):
+    """按优先级返回 (fig, ax)：调用方给定的坐标轴 > 复用的绘图位置 > 新建的独立图像"""
+    if ax is not None:
+        return ax.figure, ax
+    if slot is not None:
+        return slot.fig, slot.ax
+    return new_figure(figsize)
+
+# 类别 0/1 保持原来的红圈/蓝方块，更多类别 (外部数据集) 依次使用后面的颜色和标记
+CLASS_COLORS = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'magenta', 'gray', 'olive', 'cyan']
+CLASS_MARKERS = ['o', 's', '^', 'D', 'v', 'P', 'X', '*', '<', '>']
+
+def class_style(class_value):
+    """返回某个类别编码的 (颜色, 标记)"""
+    return CLASS_COLORS[class_value % len(CLASS_COLORS)], CLASS_MARKERS[class_value % len(CLASS_MARKERS)]
+
+# 点数超过此阈值时 plot_data / plot_decision_boundary 改为按类别分箱的密度图，只叠加少量抽样点
+DENSITY_MIN_POINTS = 50_000
+DENSITY_BINS = 300 # 密度图每个方向的格子数
+DENSITY_OVERLAY_POINTS = 1_000 # 密度图上按类别分层抽样叠加的点数，0 表示不叠加
+FOREST_MESH_RESOLUTION = 200 # 森林决策边界网格每个方向的点数
+
+def stratified_sample(y, n_samples, seed=0):
+    """按类别分层抽样 n_samples 个下标：各类别按比例分配，每个类别至少保留少量点，返回排序后的下标"""
+    rng = np.random.default_rng(seed)
+    class_counts = np.bincount(y)
+    picked = []
+    for class_value in np.flatnonzero(class_counts):
+        idx = np.flatnonzero(y == class_value)
+        k = min(len(idx), max(10, int(round(n_samples * len(idx) / len(y)))))
+        picked.append(rng.choice(idx, size=k, replace=False))
+    return np.sort(np.concatenate(picked)) if picked else np.empty(0, dtype=np.intp)
+
+def class_density_image(X, y, extent, bins=DENSITY_BINS):
+    """
+    用一次 np.bincount 统计每个格子里各类别的点数，混合成一张 RGBA 图像 (类似 datashader)：
+    颜色是各类别颜色按点数的加权平均，不透明度随格子总点数按对数增长，空格子完全透明
+    """
+    x0, x1, y0, y1 = extent
+    n_classes = int(y.max()) + 1
+    ix = np.clip(((X[:, 0] - x0) / (x1 - x0) * bins).astype(np.intp), 0, bins - 1)
+    iy = np.clip(((X[:, 1] - y0) / (y1 - y0) * bins).astype(np.intp), 0, bins - 1)
+    counts = np.bincount((y.astype(np.intp) * bins + iy) * bins + ix,
+                         minlength=n_classes * bins * bins).reshape(n_classes, bins, bins)
+    total = counts.sum(axis=0)
+    palette = to_rgba_array([class_style(c)[0] for c in range(n_classes)])[:, :3]
+    rgb = np.tensordot(counts, palette, axes=(0, 0)) / np.maximum(total, 1)[..., None]
+    alpha = np.log1p(total) / np.log1p(max(total.max(), 1))
+    return np.dstack([rgb, alpha])
+
+def draw_points(ax, X, y, class_names=None, density=None, overlay_points=DENSITY_OVERLAY_POINTS):
+    """
+    按类别绘制数据点。density 为 None 时按点数自动选择：
+    少量点逐点画散点；大量点画成一张按类别混合的密度图，再叠加分层抽样的小标记 (也用来生成图例)
+    """
+    if density is None:
+        density = len(X) > DENSITY_MIN_POINTS
+    classes = np.flatnonzero(np.bincount(y))
+    if not density:
+        for class_value in classes:
+            subset = X[y == class_value]
+            color, marker = class_style(class_value)
+            label = f'类别 {class_value}' if class_names is None else class_names[class_value]
+            ax.scatter(subset[:, 0], subset[:, 1],
+                       c=color,
+                       label=label,
+                       marker=marker,
+                       edgecolor='k', s=50)
+        return False
+
+    lo, hi = X.min(axis=0).astype(float), X.max(axis=0).astype(float)
+    hi = np.where(hi > lo, hi, lo + 1.0) # 某个特征只有一个取值时给出单位宽度
+    extent = (lo[0], hi[0], lo[1], hi[1])
+    ax.imshow(class_density_image(X, y, extent), extent=extent, origin='lower', interpolation='nearest',
+              aspect='auto', zorder=0.5)
+    sample = stratified_sample(y, overlay_points) if overlay_points else np.empty(0, dtype=np.intp)
+    for class_value in classes:
+        idx = sample[y[sample] == class_value]
+        color, marker = class_style(class_value)
+        label = f'类别 {class_value}' if class_names is None else class_names[class_value]
+        ax.scatter(X[idx, 0], X[idx, 1], c=color, marker=marker, edgecolor='k', linewidths=0.3, s=12, label=label)
+    pad = 0.05 * (hi - lo) # 与散点图自动缩放的边距一致
+    ax.set_xlim(lo[0] - pad[0], hi[0] + pad[0])
+    ax.set_ylim(lo[1] - pad[1], hi[1] + pad[1])
+    return True
+
+@traced('plot')
+def plot_data(X, y, split_feature=None, split_value=None, ax=None, title="数据分布", slot=None,
+              feature_names=('X1', 'X2'), class_names=None, density=None):
+    """
+    绘制二维数据点及可选的分割线，支持任意数量的类别；点数很多时自动改为密度图 (见 draw_points)
+    传入 slot 时复用该绘图位置：数据不变时只原地移动分割线、更新标题，不重画散点
+    """
+    artists = {}
+    if ax is None and slot is not None:
+        data_key = ('data', dataset_fingerprint(X, y), tuple(feature_names))
+        if slot.key != data_key:
+            slot.reset(data_key)
+        artists = slot.artists
+    fig, ax = _figure_axes(ax, slot, (6, 5))
+
+    if 'limits' not in artists:
+        as_density = draw_points(ax, X, y, class_names, density=density)
+
+        ax.set_xlabel(f"特征 {feature_names[0]}")
+        ax.set_ylabel(f"特征 {feature_names[1]}")
+        ax.legend(title=f"{len(X):,} 个点 (密度图)" if as_density else None) # 图例也会使用设置的中文字体
+        ax.grid(True, linestyle='--', alpha=0.6)
+        artists['limits'] = (ax.get_xlim(), ax.get_ylim()) # 分割线按只有散点时的范围绘制
+    ax.set_title(title) # 标题会使用设置的中文字体
+
+    # 绘制分割线：第一次创建线段和文字，之后只更新它们的位置
+    xlim, ylim = artists['limits']
+    line, text = artists.get('split_line'), artists.get('split_text')
+    if split_feature in (0, 1) and split_value is not None:
+        if split_feature == 0: # Split on X1 (vertical line)
+            segment = [(split_value, ylim[0]), (split_value, ylim[1])]
+            text_xy = (split_value + 0.05 * (xlim[1]-xlim[0]), ylim[0] + 0.9 * (ylim[1]-ylim[0]))
+            text_va = 'baseline'
+        else: # Split on X2 (horizontal line)
+            segment = [(xlim[0], split_value), (xlim[1], split_value)]
+            text_xy = (xlim[0] + 0.05 * (xlim[1]-xlim[0]), split_value + 0.05 * (ylim[1]-ylim[0]))
+            text_va = 'bottom'
+        if line is None:
+            line = artists['split_line'] = ax.vlines(0, 0, 1, color='green', lw=3, linestyle='--')
+            text = artists['split_text'] = ax.text(0, 0, '', color='green', ha='left')
+        line.set_segments([segment])
+        text.set_position(text_xy)
+        text.set_text(f'{feature_names[split_feature]} = {split_value:.2f}')
+        text.set_va(text_va)
+        line.set_visible(True)
+        text.set_visible(True)
+    elif line is not None:
+        line.set_visible(False)
+        text.set_visible(False)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+
+    return fig, ax
+
+@traced('plot')
+def plot_gain_curves(split_index, feature_names, selected_feature=None, split_value=None, ax=None,
+                     title="信息增益-阈值曲线", slot=None):
+    """
+    绘制分割索引中每个特征的 "信息增益-阈值" 曲线，并标出当前阈值和最大增益
+    传入 slot 时曲线只画一次，之后只更新当前阈值线和所选特征的高亮
+    """
+    artists = {}
+    if ax is None and slot is not None:
+        curve_key = ('gain', id(split_index))
+        if slot.key != curve_key:
+            slot.reset(curve_key)
+            slot.artists['split_index'] = split_index # 保持引用，避免 id 被其他对象复用
+        artists = slot.artists
+    fig, ax = _figure_axes(ax, slot, (6, 3))
+
+    if 'curves' not in artists:
+        artists['curves'] = {}
+        for feature_idx, name in enumerate(feature_names):
+            thresholds, gains = split_index.gain_curve(feature_idx)
+            if len(thresholds) == 0:
+                continue
+            artists['curves'][feature_idx], = ax.step(thresholds, gains, where='mid', label=f'按 {name} 分割')
+
+        best_feature_idx, best_threshold, max_info_gain = split_index.best_split()
+        if best_feature_idx is not None:
+            ax.scatter([best_threshold], [max_info_gain], marker='*', s=200, c='gold', edgecolor='k', zorder=3,
+                       label=f'最大增益: {feature_names[best_feature_idx]} = {best_threshold:.2f}')
+        artists['split_line'] = ax.axvline(0, color='green', lw=2, linestyle='--', visible=False)
+
+        ax.set_xlabel("分割阈值")
+        ax.set_ylabel("信息增益")
+        ax.set_title(title)
+        ax.grid(True, linestyle='--', alpha=0.6)
+
+    for feature_idx, curve in artists['curves'].items():
+        is_selected = feature_idx == selected_feature
+        curve.set_linewidth(2 if is_selected else 1)
+        curve.set_alpha(1.0 if is_selected else 0.4)
+    if split_value is not None:
+        artists['split_line'].set_xdata([split_value, split_value])
+    artists['split_line'].set_visible(split_value is not None)
+    ax.legend(fontsize='small') # 图例中的线宽随高亮变化，每次重建
+    return fig, ax
+
+@traced('plot')
+def plot_pruning_curve(ccp_alphas, train_accuracy, validation_accuracy, ccp_alpha=None, ax=None,
+                       title="准确率随 ccp_alpha 的变化", slot=None):
+    """
+    绘制剪枝路径上训练集/验证集准确率随 ccp_alpha 变化的阶梯曲线，并标出当前的 ccp_alpha
+    传入 slot 时曲线只画一次 (同一组数组)，之后只移动当前 alpha 的竖线
+    """
+    artists = {}
+    if ax is None and slot is not None:
+        curve_key = ('pruning', id(ccp_alphas))
+        if slot.key != curve_key:
+            slot.reset(curve_key)
+            slot.artists['ccp_alphas'] = ccp_alphas # 保持引用，避免 id 被其他数组复用
+        artists = slot.artists
+    fig, ax = _figure_axes(ax, slot, (6, 3))
+
+    if 'alpha_line' not in artists:
+        # 第 s 步的子树在 [ccp_alphas[s], ccp_alphas[s + 1]) 上有效，阶梯在每个 alpha 之后跳变
+        ax.step(ccp_alphas, train_accuracy, where='post', label='训练集')
+        ax.step(ccp_alphas, validation_accuracy, where='post', label='验证集')
+        best = int(np.argmax(validation_accuracy))
+        ax.scatter([ccp_alphas[best]], [validation_accuracy[best]], marker='*', s=200, c='gold', edgecolor='k',
+                   zorder=3, label=f'验证集最高: alpha = {ccp_alphas[best]:.3g}')
+        artists['alpha_line'] = ax.axvline(0, color='green', lw=2, linestyle='--', visible=False)
+
+        ax.set_xlabel("ccp_alpha")
+        ax.set_ylabel("准确率")
+        ax.set_title(title)
+        ax.grid(True, linestyle='--', alpha=0.6)
+        ax.legend(fontsize='small')
+
+    if ccp_alpha is not None:
+        artists['alpha_line'].set_xdata([ccp_alpha, ccp_alpha])
+    artists['alpha_line'].set_visible(ccp_alpha is not None)
+    return fig, ax
+
+@traced('plot')
+def plot_validation_heatmap(grid, max_depth=None, min_samples_leaf=None, ax=None,
+                            title="k 折交叉验证的平均测试准确率", slot=None):
+    """
+    把 cross_validation.validation_grid 的结果画成 "max_depth × min_samples_leaf" 热力图，
+    每格标注平均测试准确率，星号是最高的组合，方框是当前滑块对应的格子 (min_samples_leaf 取网格中最接近的值)
+    传入 slot 时热力图只画一次 (同一个结果)，之后只移动方框
+    """
+    artists = {}
+    if ax is None and slot is not None:
+        heatmap_key = ('validation', id(grid))
+        if slot.key != heatmap_key:
+            slot.reset(heatmap_key)
+            slot.artists['grid'] = grid # 保持引用，避免 id 被其他对象复用
+        artists = slot.artists
+    fig, ax = _figure_axes(ax, slot, (6, 4.5))
+
+    if 'current' not in artists:
+        mean_test = grid.test_scores.mean(axis=0)
+        ax.imshow(mean_test, cmap='viridis', aspect='auto', origin='lower')
+        for (i, j), score in np.ndenumerate(mean_test):
+            ax.text(j, i, f"{score:.0%}", ha='center', va='center', fontsize=6,
+                    color='k' if score >= mean_test.min() + 0.6 * np.ptp(mean_test) else 'w')
+        best_i, best_j = np.unravel_index(np.argmax(mean_test), mean_test.shape)
+        ax.scatter([best_j], [best_i], marker='*', s=250, c='gold', edgecolor='k', zorder=3,
+                   label=f"最高: depth={grid.max_depths[best_i]}, min_leaf={grid.min_samples_leafs[best_j]}")
+        artists['current'] = ax.scatter([0], [0], marker='s', s=260, facecolors='none', edgecolors='red',
+                                        linewidths=2, zorder=4, label="当前滑块")
+        ax.set_xticks(range(len(grid.min_samples_leafs)), [str(leaf) for leaf in grid.min_samples_leafs])
+        ax.set_yticks(range(len(grid.max_depths)), [str(depth) for depth in grid.max_depths])
+        ax.set_xlabel("min_samples_leaf")
+        ax.set_ylabel("max_depth")
+        ax.set_title(title)
+        ax.legend(fontsize='small', loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=2)
+
+    visible = max_depth is not None and min_samples_leaf is not None
+    if visible:
+        row, col = nearest_cell(grid, max_depth, min_samples_leaf)
+        artists['current'].set_offsets([[col, row]])
+    artists['current'].set_visible(visible)
+    return fig, ax
+
+@traced('plot')
+def draw_leaf_regions(ax, model, x_range, y_range, cmap=plt.cm.RdYlBu, alpha=0.6):
+    """
+    把二维决策树 (sklearn 模型或 ArrayTree) 的每个叶节点区域画成一个矩形色块
+    区域直接从树结构推导，开销只与叶子数有关，与分辨率无关，任意缩放下边界都是精确的
+    """
+    tree = getattr(model, 'tree_', model)
+    _, boxes, leaf_classes = leaf_rectangles(tree, x_range, y_range)
+    n_classes = node_class_values(tree).shape[1]
+    colors = cmap(leaf_classes / max(n_classes - 1, 1))
+    # 直接用顶点数组构造 PolyCollection，不为每个叶子创建 Rectangle 对象 (数十万个叶子时快一个数量级)
+    x0, x1, y0, y1 = boxes.T
+    vertices = np.stack([np.column_stack(corner) for corner in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))], axis=1)
+    regions = PolyCollection(vertices, facecolors=colors, edgecolors='none', alpha=alpha, zorder=0)
+    ax.add_collection(regions)
+    ax.set_xlim(x_range)
+    ax.set_ylim(y_range)
+    return regions
+
+@traced('plot')
+def plot_decision_boundary(model, X, y, ax=None, title="决策边界", slot=None, feature_names=('X1', 'X2'),
+                           class_names=None):
+    """
+    绘制二维决策树的决策区域，并叠加数据点 (两个类别时为红/蓝，更多类别时与散点使用相同的配色)
+    传入 slot 时，同一个模型和数据只画一次，之后的重跑只更新标题
+    """
+    redraw = True
+    if ax is None and slot is not None:
+        boundary_key = ('boundary', id(model), dataset_fingerprint(X, y), tuple(feature_names))
+        redraw = slot.key != boundary_key
+        if redraw:
+            slot.reset(boundary_key)
+            slot.artists['model'] = model # 保持引用，避免 id 被其他模型复用
+    fig, ax = _figure_axes(ax, slot, (7, 6))
+
+    if redraw:
+        x_range = (X[:, 0].min() - 0.5, X[:, 0].max() + 0.5)
+        y_range = (X[:, 1].min() - 0.5, X[:, 1].max() + 0.5)
+        n_classes = node_class_values(getattr(model, 'tree_', model)).shape[1]
+        region_cmap = plt.cm.RdYlBu if n_classes <= 2 else ListedColormap(CLASS_COLORS[:n_classes])
+        draw_leaf_regions(ax, model, x_range, y_range, cmap=region_cmap)
+
+        as_density = draw_points(ax, X, y, class_names)
+        ax.set_xlim(x_range) # 决策区域按叶子矩形的范围显示
+        ax.set_ylim(y_range)
+
+        ax.set_xlabel(f"特征 {feature_names[0]}")
+        ax.set_ylabel(f"特征 {feature_names[1]}")
+        ax.legend(title=f"{len(X):,} 个点 (密度图)" if as_density else None)
+        ax.grid(True, linestyle='--', alpha=0.6)
+    ax.set_title(title)
+    return fig, ax
+
+@traced('plot')
+def plot_forest_boundary(forest, X, y, voting='soft', ax=None, title="随机森林的决策边界", slot=None,
+                         feature_names=('X1', 'X2'), class_names=None, resolution=FOREST_MESH_RESOLUTION):
+    """
+    绘制二维森林 (tree_core.CompiledForest) 的决策区域：在 resolution × resolution 的网格上一次算出所有树的
+    类别概率 (soft) 或得票比例 (hard)，颜色按比例混合各类别的颜色，边界附近 "意见不一" 的区域颜色介于两者之间
+    返回 (fig, ax, mesh_seconds)：mesh_seconds 是网格预测的耗时；传入 slot 时同一个森林只预测一次，之后沿用
+    """
+    redraw = True
+    artists = {}
+    if ax is None and slot is not None:
+        boundary_key = ('forest', id(forest), voting, dataset_fingerprint(X, y), tuple(feature_names), resolution)
+        redraw = slot.key != boundary_key
+        if redraw:
+            slot.reset(boundary_key)
+            slot.artists['forest'] = forest # 保持引用，避免 id 被其他对象复用
+        artists = slot.artists
+    fig, ax = _figure_axes(ax, slot, (7, 6))
+
+    if redraw:
+        x_range = (X[:, 0].min() - 0.5, X[:, 0].max() + 0.5)
+        y_range = (X[:, 1].min() - 0.5, X[:, 1].max() + 0.5)
+        xx, yy = np.meshgrid(np.linspace(*x_range, resolution), np.linspace(*y_range, resolution))
+        start = time.perf_counter()
+        proba = forest.predict_proba(np.column_stack([xx.ravel(), yy.ravel()]), voting=voting)
+        artists['mesh_seconds'] = time.perf_counter() - start
+        palette = to_rgba_array([class_style(int(c))[0] for c in range(proba.shape[1])])[:, :3]
+        ax.imshow((proba @ palette).reshape(resolution, resolution, 3), extent=(*x_range, *y_range), origin='lower',
+                  interpolation='bilinear', aspect='auto', alpha=0.45, zorder=0)
+
+        as_density = draw_points(ax, X, y, class_names)
+        ax.set_xlim(x_range)
+        ax.set_ylim(y_range)
+        ax.set_xlabel(f"特征 {feature_names[0]}")
+        ax.set_ylabel(f"特征 {feature_names[1]}")
+        ax.legend(title=f"{len(X):,} 个点 (密度图)" if as_density else None)
+        ax.grid(True, linestyle='--', alpha=0.6)
+    ax.set_title(title)
+    return fig, ax, artists.get('mesh_seconds')
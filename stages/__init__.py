@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+教程的各个阶段：每个阶段一个模块，render() 是一个 st.fragment，
+阶段内的控件变化时只重跑该阶段；共用的辅助函数在 stages.common 中
+"""
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""各阶段共用的 Streamlit 辅助函数：阶段片段、跨会话共享数据、图像和结构图的显示、模型缓存"""
+import time
+from collections import namedtuple
+from functools import wraps
+
+import numpy as np
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from artifact_store import ArtifactStore
+from cross_validation import nearest_cell, validation_grid
+from datasets import load_iris_data, make_simple_data
+from figures import drop_render_buffer
+from graph_render import DotRenderCache
+from instrumentation import traced
+from model_cache import ModelCache
+from tree_core import CompiledForest, CompiledTree, PruningPath, TreeTruncator, build_tree, tree_to_dot
+
+PREWARM_MAX_ROWS = 5_000 # 数据行数超过此值时不在后台预热整个滑块网格
+GRAPH_FULL_MAX_NODES = 63 # 节点数不超过此值 (深度 5 的满二叉树) 的树完整显示，更大的树折叠显示
+GRAPH_COLLAPSE_DEPTH = 4 # 侧边栏 "大树折叠深度" 的默认值
+GRAPH_COLLAPSE_SAMPLES = 5 # 侧边栏 "折叠样本数阈值" 的默认值
+VALIDATION_FRACTION = 0.3 # 剪枝演示中留作验证集的样本比例
+CV_GRID_LEAFS = 10 # 交叉验证热力图中 min_samples_leaf 最多取的值的个数
+
+
+# --- Stage Fragments ---
+def is_fragment_rerun():
+    """当前是否只是重跑某个片段 (某个阶段内的控件变化)，而不是整页重跑"""
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
+
+def stage_fragment(name):
+    """
+    把阶段的 render 函数包装成 st.fragment：阶段内的控件变化时只重跑这个阶段，其他阶段保持原样
+    整页重跑时记录为本次重跑中的一个阶段；只重跑这个片段时单独记录为一次重跑 (scope 为阶段名)
+    """
+    def decorator(render):
+        @wraps(render)
+        def run_stage(*args, **kwargs):
+            profiler = st.session_state.profiler
+            if not is_fragment_rerun():
+                profiler.stage(name)
+                return render(*args, **kwargs)
+            profiler.begin_run(trace_memory=st.session_state.get("profile_trace_memory", False), scope=name)
+            profiler.stage(name)
+            try:
+                result = render(*args, **kwargs)
+            except BaseException: # st.stop() / st.rerun() 等也会以异常结束片段
+                profiler.end_run(interrupted=True)
+                raise
+            profiler.end_run()
+            return result
+        return st.fragment(run_stage)
+    return decorator
+
+
+# --- Shared Data ---
+@st.cache_resource
+def get_artifact_store():
+    return ArtifactStore(max_bytes=256 * 1024 * 1024)
+
+def shared_artifact(key, compute):
+    """所有会话共享的确定性结果：整个进程只调用一次 compute()，之后直接返回同一个只读对象"""
+    return get_artifact_store().get_or_compute(key, compute)
+
+def simple_data():
+    """阶段 1–5 使用的 50 点简单二维数据集，返回 (X_simple, y_simple)，所有会话共享 (只读)"""
+    return shared_artifact('simple_data', make_simple_data)
+
+def iris_data():
+    """Iris 数据和 DataFrame，整个进程只加载一次，所有会话共享 (只读)"""
+    return shared_artifact('iris_data', load_iris_data)
+
+@st.cache_resource(max_entries=16) # 从内存映射中取出的两列特征，按数据集指纹跨会话共享
+def dataset_columns(fingerprint, _X, columns):
+    return np.ascontiguousarray(_X[:, list(columns)])
+
+
+# --- Figures ---
+def figure_slot(name, figsize=(6, 5)):
+    """本会话图像管理器中名为 name 的绘图位置"""
+    return st.session_state.figure_manager.slot(name, figsize)
+
+@traced('render')
+def show_figure(fig):
+    """显示图像后立即释放 Agg 渲染缓冲区 (st.pyplot 以 200 dpi 渲染，一张图约数 MB)，复用的只是图元"""
+    st.pyplot(fig)
+    drop_render_buffer(fig)
+
+
+# --- Tree Graph Rendering ---
+# 进程级共享的 SVG 渲染缓存：同一棵树 (相同的 DOT 源码) 只在服务器端排版一次，浏览器无需再次排版
+@st.cache_resource
+def get_render_cache():
+    return DotRenderCache()
+
+@traced('render')
+def show_tree_graph(dot_source):
+    """优先显示服务器端缓存的 SVG；没有 graphviz 可执行文件时退回浏览器端排版"""
+    svg = get_render_cache().render(dot_source)
+    if svg is None:
+        st.graphviz_chart(dot_source)
+    else:
+        st.image(svg, use_container_width=True)
+
+@traced('dot')
+def tree_graph_dot(model, feature_names, class_names):
+    """
+    返回决策树 (sklearn 模型或 ArrayTree) 的 DOT 源码：小树完整显示，
+    大树按侧边栏的折叠深度/样本数阈值折叠，图中的节点数不会随树的大小无限增长
+    """
+    tree = getattr(model, 'tree_', model)
+    if tree.node_count > GRAPH_FULL_MAX_NODES:
+        collapse_depth = st.session_state.get("graph_collapse_depth", GRAPH_COLLAPSE_DEPTH)
+        collapse_samples = st.session_state.get("graph_collapse_samples", GRAPH_COLLAPSE_SAMPLES)
+        st.caption(f"这棵树共有 {tree.node_count} 个节点，深于第 {collapse_depth} 层或样本数少于 "
+                   f"{collapse_samples} 的子树已折叠（虚线框）。")
+        return tree_to_dot(model, feature_names, class_names, max_depth=collapse_depth,
+                           min_samples=collapse_samples)
+    if hasattr(model, 'tree_'):
+        from sklearn.tree import export_graphviz # 训练出 sklearn 模型时 sklearn 已经导入
+        return export_graphviz(model, out_file=None, feature_names=feature_names, class_names=class_names,
+                               filled=True, rounded=True, special_characters=True)
+    return tree_to_dot(model, feature_names, class_names)
+
+
+# --- Models ---
+# 进程级共享的模型缓存：所有会话、所有重跑共用，只有超参数真正变化时才重新训练
+@st.cache_resource
+def get_model_cache():
+    return ModelCache(max_entries=4096)
+
+@traced('fit')
+def fit_model(X, y, **params):
+    """从模型缓存中取出模型，未命中时训练"""
+    return get_model_cache().get_or_fit(X, y, **params)
+
+@traced('fit')
+def get_custom_tree(fingerprint, X, y, max_depth, min_samples_leaf=1, splitter='exact', criterion='gini'):
+    """自建树 (ArrayTree，只读)：按数据集指纹和超参数放在进程级共享缓存中，阶段 4 的第一次分割所有会话只计算一次"""
+    return shared_artifact(('custom-tree', fingerprint, max_depth, min_samples_leaf, splitter, criterion),
+                           lambda: build_tree(X, y, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                              splitter=splitter, criterion=criterion))
+
+@traced('predict')
+def model_accuracy(model, X, y):
+    """模型 (sklearn 模型或 ArrayTree) 在给定数据上的准确率，编译后的树直接在 NumPy 数组上分块预测"""
+    return float(np.mean(CompiledTree(model).predict(X) == y)) # 与 accuracy_score 相同，但不必为此导入 sklearn.metrics
+
+# 完全生长的树的截断器：按数据集指纹和其余超参数跨会话共享，训练集在完全树中的叶子编号也只计算一次
+@traced('fit')
+@st.cache_resource(max_entries=32)
+def _tree_truncator(fingerprint, criterion, min_samples_leaf, _model, _X):
+    return TreeTruncator(_model, _X)
+
+def tree_truncator(X, y, fingerprint, criterion='gini', min_samples_leaf=1):
+    """
+    返回完全生长的树 (取自模型缓存) 的截断器：任意 max_depth 的树和它在 X 上的预测
+    都由这棵树截断得到 (truncate / predict)，拖动深度滑块时不再重新训练
+    """
+    model = fit_model(X, y, criterion=criterion, max_depth=None, min_samples_leaf=min_samples_leaf,
+                      fingerprint=fingerprint)
+    return _tree_truncator(fingerprint, criterion, min_samples_leaf, model, X)
+
+# 剪枝路径和整条路径上的准确率曲线：按数据集指纹和分裂标准跨会话共享，拖动 ccp_alpha 滑块时不再训练
+PruningData = namedtuple('PruningData', ['path', 'ccp_alphas', 'train_accuracy', 'validation_accuracy',
+                                         'n_train', 'n_validation'])
+
+@traced('fit')
+@st.cache_resource(max_entries=16)
+def _pruning_data(fingerprint, criterion, _X, _y):
+    order = np.random.default_rng(42).permutation(len(_X)) # 固定的随机划分，每次得到相同的验证集
+    n_validation = int(len(_X) * VALIDATION_FRACTION)
+    train, validation = np.sort(order[n_validation:]), np.sort(order[:n_validation])
+    X_train, y_train = _X[train], _y[train]
+    model = fit_model(X_train, y_train, criterion=criterion, max_depth=None, min_samples_leaf=1,
+                      fingerprint=f"{fingerprint}:train")
+    path = PruningPath(model, X_train)
+    return PruningData(path, np.maximum.accumulate(path.ccp_alphas), path.accuracy_path(None, y_train),
+                       path.accuracy_path(_X[validation], _y[validation]), len(train), n_validation)
+
+def pruning_data(X, y, fingerprint, criterion='gini'):
+    """
+    在固定划分的训练集上训练完全生长的树，一次算出整条代价复杂度剪枝路径，
+    以及每一步的子树在训练集/验证集上的准确率 (见 PruningPath)
+    """
+    return _pruning_data(fingerprint, criterion, X, y)
+
+# k 折交叉验证网格：按数据集指纹、分裂标准和特征组合跨会话共享，只在第一次用到时计算
+def validation_leaf_grid(max_leaf, n_values=CV_GRID_LEAFS):
+    """热力图的 min_samples_leaf 取值：范围较小时逐个取，否则在 [1, max_leaf] 上按几何级数取 n_values 个"""
+    if max_leaf <= n_values:
+        return tuple(range(1, max_leaf + 1))
+    return tuple(int(leaf) for leaf in np.unique(np.geomspace(1, max_leaf, n_values).round()))
+
+@traced('fit')
+@st.cache_resource(max_entries=16)
+def _cross_validation_grid(fingerprint, criterion, max_depths, min_samples_leafs, features, _X, _y):
+    X = _X if features is None else _X[:, list(features)]
+    return validation_grid(X, _y, max_depths, min_samples_leafs, criterion)
+
+def cross_validation_grid(X, y, fingerprint, max_depths, min_samples_leafs, criterion='gini', features=None):
+    """
+    max_depths × min_samples_leafs 网格上 k 折交叉验证的训练/测试准确率 (见 cross_validation.validation_grid)
+    features 为 None 表示使用全部特征
+    """
+    features = None if features is None else tuple(int(f) for f in features)
+    return _cross_validation_grid(fingerprint, criterion, tuple(max_depths), tuple(min_samples_leafs), features, X, y)
+
+# 随机森林：按数据集指纹和超参数跨会话共享，同时保存编译后的森林和首次训练的耗时
+ForestFit = namedtuple('ForestFit', ['model', 'compiled', 'fit_seconds'])
+
+@traced('fit')
+@st.cache_resource(max_entries=64)
+def _fit_forest(fingerprint, n_estimators, max_depth, min_samples_leaf, criterion, max_features, bootstrap, _X, _y):
+    from sklearn.ensemble import RandomForestClassifier
+
+    start = time.perf_counter()
+    # n_jobs=-1: 各棵树在所有 CPU 核心上并行训练 (sklearn 的树在训练时释放 GIL)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                   criterion=criterion, max_features=max_features, bootstrap=bootstrap,
+                                   n_jobs=-1, random_state=42).fit(_X, _y)
+    return ForestFit(model, CompiledForest(model), time.perf_counter() - start)
+
+def fit_forest(X, y, fingerprint, n_estimators=100, max_depth=None, min_samples_leaf=1, criterion='gini',
+               max_features='sqrt', bootstrap=True):
+    """
+    返回缓存中的随机森林 (ForestFit)；没有时训练一个。
+    n_estimators=1, max_features=None, bootstrap=False 就是一棵普通的决策树，用同样的方式计时，便于对比
+    """
+    return _fit_forest(fingerprint, n_estimators, max_depth, min_samples_leaf, criterion, max_features, bootstrap,
+                       X, y)
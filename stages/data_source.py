@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""阶段 3–6 的数据源：侧边栏中选择内置示例数据或外部 CSV / Parquet 表格"""
+from collections import namedtuple
+
+import numpy as np
+import streamlit as st
+
+from datasets import load_table, read_columns
+from instrumentation import span
+from model_cache import dataset_fingerprint
+from stages.common import dataset_columns, iris_data
+
+# 阶段 3–5 使用的二维数据；legend_names 为 None 时图例沿用 "类别 0 / 类别 1"
+PipelineData = namedtuple('PipelineData', ['X', 'y', 'feature_names', 'class_names', 'legend_names', 'fingerprint'])
+# 阶段 6 使用的完整数据；preview 是显示用的前几行 DataFrame，builtin 表示内置的 Iris 数据
+TableData = namedtuple('TableData', ['X', 'y', 'feature_names', 'class_names', 'preview', 'name', 'fingerprint',
+                                     'builtin'])
+
+
+def render(X_simple, y_simple):
+    """
+    在侧边栏中选择数据源，返回 (PipelineData, TableData)
+    阶段 3–5 默认使用 50 点简单数据集，阶段 6 默认使用 Iris；也可以换成自己的 CSV / Parquet 表格
+    TableData 为 None 表示阶段 6 使用内置的 Iris 数据，由阶段 6 调用 iris_table() 自己加载
+    """
+    user_dataset = None
+    with st.sidebar.expander("数据源 (阶段 3–6)", expanded=False):
+        data_source_kind = st.radio("数据来源", ["内置示例数据", "上传 CSV / Parquet", "服务器本地文件"], key="data_source_kind")
+        data_source = None
+        if data_source_kind == "上传 CSV / Parquet":
+            data_source = st.file_uploader("选择文件", type=['csv', 'parquet'], key="data_source_upload")
+        elif data_source_kind == "服务器本地文件":
+            data_source = st.text_input("文件路径", key="data_source_path").strip() or None
+
+        if data_source is not None:
+            try:
+                data_columns = read_columns(data_source)
+                target_column = st.selectbox("标签列", data_columns, index=len(data_columns) - 1, key="data_source_target")
+                with st.spinner("正在读取数据 (首次读取会分块转换并写入磁盘缓存)..."), span("load_table", 'load'):
+                    user_dataset = load_table(data_source, target_column)
+                if len(user_dataset.feature_names) < 2:
+                    raise ValueError("至少需要两个数值型特征列")
+                dropped_note = f" · 丢弃 {user_dataset.n_dropped:,} 行缺失值" if user_dataset.n_dropped else ""
+                st.caption(f"{len(user_dataset.y):,} 行 · {len(user_dataset.feature_names)} 个特征 · "
+                           f"{len(user_dataset.class_names)} 个类别{dropped_note}")
+                pair_x_idx = st.selectbox("阶段 3–5 的横轴特征", range(len(user_dataset.feature_names)), index=0,
+                                          format_func=lambda i: user_dataset.feature_names[i], key="data_source_x")
+                pair_y_idx = st.selectbox("阶段 3–5 的纵轴特征", range(len(user_dataset.feature_names)), index=1,
+                                          format_func=lambda i: user_dataset.feature_names[i], key="data_source_y")
+                if pair_x_idx == pair_y_idx:
+                    st.warning("请选择两个不同的特征，暂时仍使用内置数据。")
+                    user_dataset = None
+            except Exception as e:
+                st.error(f"无法读取数据: {e}")
+                user_dataset = None
+
+    if user_dataset is None:
+        X_pipe, y_pipe = X_simple, y_simple
+        feature_names_pipe = ['X1', 'X2']
+        class_names_pipe = ["红🔵", "蓝🟥"]
+        legend_names_pipe = None # 图例沿用 "类别 0 / 类别 1"（matplotlib 字体中没有 emoji）
+        fingerprint_pipe = dataset_fingerprint(X_simple, y_simple)
+    else:
+        fingerprint_pipe = f"{user_dataset.fingerprint}:{pair_x_idx},{pair_y_idx}"
+        X_pipe = dataset_columns(fingerprint_pipe, user_dataset.X, (pair_x_idx, pair_y_idx))
+        y_pipe = user_dataset.y
+        feature_names_pipe = [user_dataset.feature_names[pair_x_idx], user_dataset.feature_names[pair_y_idx]]
+        class_names_pipe = legend_names_pipe = user_dataset.class_names
+        st.info(f"阶段 3–6 当前使用数据集 **{user_dataset.name}**（{len(y_pipe):,} 行），"
+                f"阶段 3–5 使用特征 {feature_names_pipe[0]} 和 {feature_names_pipe[1]}。下面的讲解文字仍以内置数据为例。")
+
+    # 侧边栏选择了外部数据集时，阶段 6 改用它的全部特征 (内存映射，不会整体读入内存)
+    table = None
+    if user_dataset is not None:
+        import pandas as pd
+        preview = pd.DataFrame(np.asarray(user_dataset.X[:5]), columns=user_dataset.feature_names)
+        preview['类别名称'] = [user_dataset.class_names[code] for code in user_dataset.y[:5]]
+        table = TableData(user_dataset.X, user_dataset.y, user_dataset.feature_names, user_dataset.class_names,
+                          preview, user_dataset.name, user_dataset.fingerprint, False)
+
+    pipe = PipelineData(X_pipe, y_pipe, feature_names_pipe, class_names_pipe, legend_names_pipe, fingerprint_pipe)
+    return pipe, table
+
+def iris_table():
+    """阶段 6 默认使用的内置 Iris 数据 (加载 Iris 要导入 sklearn，所以留到阶段 6 才调用)"""
+    X_iris, y_iris, feature_names_iris, target_names_iris, df_iris = iris_data()
+    return TableData(X_iris, y_iris, feature_names_iris, target_names_iris, df_iris, "Iris 数据集",
+                     dataset_fingerprint(X_iris, y_iris), True)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""阶段 1: 分类的直觉 - 用规则区分"""
+import streamlit as st
+
+from stages.common import figure_slot, show_figure, stage_fragment
+
+
+@stage_fragment("阶段 1")
+def render(X_simple, y_simple):
+    from plotting import plot_data # matplotlib 在这里才第一次导入，页面标题不必等它
+
+    st.header("阶段 1: 分类的直觉 - 用规则区分")
+    st.markdown("""
+    想象一下我们有一些数据点，每个点属于两个类别（红色圆圈🔵 或 蓝色方块🟥）中的一个。
+    我们的目标是找到一些简单的“规则”来区分它们。
+
+    **任务:** 尝试调整下面的滑块，画出一条**垂直**或**水平**的分割线，看看是否能很好地把红点和蓝点分开。
+    """)
+
+    # 1.2 互动控件
+    col1_1, col1_2 = st.columns([1, 2])
+
+    with col1_1:
+        st.subheader("选择分割规则")
+        feature_map = {"特征 X1 (画垂直线)": 0, "特征 X2 (画水平线)": 1}
+        selected_feature_name = st.radio("选择要依据的特征:", list(feature_map.keys()))
+        selected_feature_idx = feature_map[selected_feature_name]
+
+        # 根据所选特征设置滑块范围
+        min_val = X_simple[:, selected_feature_idx].min()
+        max_val = X_simple[:, selected_feature_idx].max()
+        step = (max_val - min_val) / 50
+        default_val = (min_val + max_val) / 2
+
+        split_value = st.slider(f"设置 '{selected_feature_name.split(' ')[1]}' 的分割阈值:",
+                                min_value=min_val, max_value=max_val, value=default_val, step=step)
+
+    with col1_2:
+        st.subheader("数据和你的分割线")
+        fig1, ax1 = plot_data(X_simple, y_simple,
+                              split_feature=selected_feature_idx,
+                              split_value=split_value,
+                              title="简单数据集与你的分割尝试", # 标题是中文
+                              slot=figure_slot("阶段1-分割"))
+        show_figure(fig1)
+
+    st.markdown("""
+    **思考:**
+    *   你画的这条线能完美分开两种颜色的点吗？
+    *   只用一条线够吗？如果不够，可能需要怎么做？
+    *   选择哪个特征（X1 或 X2）和哪个阈值似乎分得更好？
+    """)
+    st.markdown("---")
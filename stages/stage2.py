@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""阶段 2: 决策树的样子 - 像流程图一样思考"""
+import time
+
+import numpy as np
+import streamlit as st
+
+from model_cache import dataset_fingerprint
+from stages.common import (figure_slot, fit_model, get_custom_tree, shared_artifact, show_figure, show_tree_graph,
+                           stage_fragment)
+from tree_core import PathTracer, StreamingSplitStats, decision_stump
+
+STREAM_BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000] # 数据流每批生成的点数
+STREAM_MAX_POINTS = 10_000_000 # 数据流最多累计的点数
+STREAM_NOISE = 0.1 # 数据流中翻转标签的比例 (与阶段 4 的大数据集相同)
+STREAM_RANGE = (0.0, 5.0) # 数据流统计在每个特征上划分格子的取值范围
+EXAMPLE_FEATURE, EXAMPLE_THRESHOLD = 0, 2.61 # 示例树的规则: X1 <= 2.61
+CLASS_LABELS = {0: "红色 🔵", 1: "蓝色 🟥"}
+PATH_QUERY_SIZES = [1_000, 10_000, 100_000] # 批量路径追踪中随机生成的查询点数
+PATH_TABLE_MAX_NODES = 200 # 节点经过次数表最多显示的行数
+PATH_TOP_PATHS = 10
+
+
+def _example_tree_dot():
+    import graphviz # 只在第一次生成示例 DOT 时导入，不拖慢页面标题的显示
+
+    # 这个树对应 X1 <= 2.5 的分割规则
+    dot_simple_tree = graphviz.Digraph(comment='简单决策树示例')
+    dot_simple_tree.node('0', 'X1 <= 2.61 ?\n(根节点)')
+    dot_simple_tree.node('1', '预测: 红色 🔵\n(叶节点)')
+    dot_simple_tree.node('2', '预测: 蓝色 🟥\n(叶节点)')
+    dot_simple_tree.edge('0', '1', label='是 (True)')
+    dot_simple_tree.edge('0', '2', label='否 (False)')
+    return dot_simple_tree.source
+
+def _path_tracer(kind, X_simple, y_simple, max_depth):
+    """路径追踪用的树：示例规则、自建树或 sklearn 决策树 (后两者在简单数据集上训练)，所有会话共享"""
+    fingerprint = dataset_fingerprint(X_simple, y_simple)
+    if kind == 'example':
+        return shared_artifact(('path-tracer', 'example'), lambda: PathTracer(
+            decision_stump(X_simple, y_simple, EXAMPLE_FEATURE, EXAMPLE_THRESHOLD)))
+    if kind == 'custom':
+        tree = get_custom_tree(fingerprint, X_simple, y_simple, max_depth=max_depth)
+    else:
+        tree = fit_model(X_simple, y_simple, max_depth=max_depth, fingerprint=fingerprint)
+    return shared_artifact(('path-tracer', kind, fingerprint, max_depth), lambda: PathTracer(tree))
+
+def _node_rule(tracer, node_id, feature_names=('X1', 'X2')):
+    if tracer.is_leaf[node_id]:
+        return f"叶节点: 预测 {CLASS_LABELS.get(int(tracer.classes[tracer.leaf_class[node_id]]), '?')}"
+    return f"{feature_names[tracer.feature[node_id]]} <= {tracer.threshold[node_id]:.2f}"
+
+def _path_text(tracer, path):
+    """把一条路径写成 "X1 <= 2.61 是 → ... → 预测 红色" 的形式"""
+    parts = []
+    for node_id, next_id in zip(path[:-1], path[1:]):
+        answer = "是" if next_id == tracer.children_left[node_id] else "否"
+        parts.append(f"{_node_rule(tracer, node_id)} {answer}")
+    parts.append(_node_rule(tracer, path[-1]).replace("叶节点: ", ""))
+    return " → ".join(parts)
+
+def _read_query_points(uploaded):
+    """上传的 CSV 中的查询点：优先使用名为 X1、X2 的列，否则取前两个数值列"""
+    import pandas as pd
+
+    df = pd.read_csv(uploaded)
+    columns = ['X1', 'X2'] if {'X1', 'X2'} <= set(df.columns) else list(df.select_dtypes('number').columns[:2])
+    if len(columns) < 2:
+        raise ValueError("文件中至少需要两个数值列 (最好命名为 X1、X2)")
+    return df[columns].dropna().to_numpy(dtype=np.float64)
+
+def _stream_batch(rng, n_points):
+    """按简单数据集的规则生成一批新点：取值在 STREAM_RANGE 内均匀分布，X1 > 2.5 为类别 1，再翻转一部分标签"""
+    low, high = STREAM_RANGE
+    X = low + rng.random((n_points, 2)) * (high - low)
+    y = (X[:, 0] > 2.5).astype(int)
+    y[rng.random(n_points) < STREAM_NOISE] ^= 1
+    return X, y
+
+def _reset_stream(X_simple, y_simple):
+    """数据流从阶段 1 的 50 个点开始；统计结构只有约 30 KB，放在各自的会话里"""
+    stats = StreamingSplitStats([STREAM_RANGE, STREAM_RANGE], n_classes=2)
+    stats.add(X_simple, y_simple)
+    st.session_state.stream_stats = stats
+    st.session_state.stream_rng = np.random.default_rng(42)
+    st.session_state.stream_last = None # 最近一批: (点数, 更新耗时)
+    st.session_state.stream_rejected = None # 最近一次因超出 STREAM_RANGE 而没有加入的点
+
+# 以下按钮回调在重跑之前执行，按钮的可用状态和统计结果在同一次重跑中就是最新的
+def _add_to_stream(X_new, y_new):
+    stats = st.session_state.stream_stats
+    n_new = min(len(X_new), STREAM_MAX_POINTS - stats.n_samples)
+    if n_new <= 0:
+        return
+    start = time.perf_counter()
+    if n_new == 1:
+        stats.add(X_new[0], y_new[0])
+    else:
+        stats.add(X_new[:n_new], y_new[:n_new])
+    st.session_state.stream_last = (n_new, time.perf_counter() - start)
+
+def _add_stream_point(x1, x2, label):
+    """超出 STREAM_RANGE 的点会被统计结构归到最边上的格子里，不加入，只记下来给出提示"""
+    low, high = STREAM_RANGE
+    if low <= x1 <= high and low <= x2 <= high:
+        st.session_state.stream_rejected = None
+        _add_to_stream(np.array([[x1, x2]]), np.array([label]))
+    else:
+        st.session_state.stream_rejected = (x1, x2)
+
+def _add_stream_batch(batch_size):
+    st.session_state.stream_rejected = None
+    n_points = min(batch_size, STREAM_MAX_POINTS - st.session_state.stream_stats.n_samples)
+    if n_points > 0:
+        _add_to_stream(*_stream_batch(st.session_state.stream_rng, n_points))
+
+
+@stage_fragment("阶段 2")
+def render(X_simple, y_simple):
+    from plotting import plot_data, plot_gain_curves
+
+    st.header("阶段 2: 决策树的样子 - 像流程图一样思考")
+    st.markdown("""
+    决策树就像一个流程图，它把我们在阶段 1 中尝试的“规则”（提问）串联起来。
+
+    下面是一个针对上面简单数据集构建的**示例决策树**:
+    """)
+
+    # 2.1 预设一个简单的决策树 (DOT 语言)，DOT 源码所有会话共享，只生成一次
+    show_tree_graph(shared_artifact('stage2-example-dot', _example_tree_dot))
+
+    st.markdown("""
+    **解读:**
+    1.  从 **根节点** 开始提问：“特征 X1 是否小于等于 2.61？”
+    2.  如果答案是 **是 (True)**，则沿着标有“是”的 **分支** 向左走，到达 **叶节点**，预测该点为 **红色 🔵**。
+    3.  如果答案是 **否 (False)**，则沿着标有“否”的 **分支** 向右走，到达另一个 **叶节点**，预测该点为 **蓝色 🟥**。
+
+    **互动演示:** 输入一个新数据点的坐标，看看它会沿着树的哪个路径走。
+    """)
+
+    col2_1, col2_2 = st.columns(2)
+
+    with col2_1:
+        st.subheader("输入新数据点坐标")
+        new_x1 = st.number_input("输入 特征 X1 的值:", value=1.5, step=0.1)
+        new_x2 = st.number_input("输入 特征 X2 的值:", value=3.0, step=0.1)
+
+    with col2_2:
+        st.subheader("决策路径分析")
+        # 沿示例树追踪这个点的路径 (与下面的批量追踪使用同一个 PathTracer)
+        example_tracer = _path_tracer('example', X_simple, y_simple, None)
+        new_point = np.array([[new_x1, new_x2]])
+        new_path = example_tracer.trace(new_point).indicator.indices
+        steps = example_tracer.explain(new_point[0], new_path)
+        for step_no, (_, feature, threshold, value, go_left) in enumerate(steps[:-1], 1):
+            st.success(f"{step_no}. **问题:** X{feature + 1} ({value:.2f}) <= {threshold:.2f} ?  "
+                       f"**回答: {'是 (True)' if go_left else '否 (False)'}**")
+            st.info(f"   -> 沿着 '{'是' if go_left else '否'}' 分支走...")
+        leaf_s2 = steps[-1][0]
+        final_prediction = CLASS_LABELS[int(example_tracer.classes[example_tracer.leaf_class[leaf_s2]])]
+        st.markdown(f"{len(steps)}. **到达叶节点:** 预测为 **{final_prediction}**")
+
+        # 可视化这个新点
+        slot2 = figure_slot("阶段2-新点")
+        fig2, ax2 = plot_data(X_simple, y_simple, title="数据点与新输入的点", slot=slot2) # 中文标题
+        label_new_point = f'新点 ({new_x1:.1f}, {new_x2:.1f})\n预测: {final_prediction}'
+        if 'new_point' not in slot2.artists:
+            slot2.artists['new_point'] = ax2.scatter(new_x1, new_x2, c='lime', marker='*', s=200, edgecolor='black')
+        slot2.artists['new_point'].set_offsets([[new_x1, new_x2]]) # 新点只移动位置，不重画散点
+        slot2.artists['new_point'].set_label(label_new_point)
+        ax2.legend() # 图例
+        show_figure(fig2)
+
+    # --- 2.2 Batch Decision Paths ---
+    st.subheader("一次追踪一大批点的决策路径")
+    st.markdown("""
+    如果有成千上万个点要分类呢？下面一次性算出所有点从根节点到叶节点的路径，统计每个节点被多少个点经过、
+    哪些路径最常见，也可以挑出某一个点查看它的每一步。树可以是上面的示例树，也可以是在简单数据集上训练的树。
+    """)
+    tree_kinds_s2 = {'example': "示例树 (X1 <= 2.61)", 'custom': "自建树 (build_tree)", 'sklearn': "Scikit-learn 决策树"}
+    col2_path_ctrl, col2_path_vis = st.columns([1, 2])
+    with col2_path_ctrl:
+        tree_kind_s2 = st.radio("要追踪的树", list(tree_kinds_s2), format_func=tree_kinds_s2.get, key="s2_path_tree")
+        path_depth_s2 = st.slider("树的最大深度", min_value=1, max_value=10, value=3, key="s2_path_depth",
+                                  disabled=tree_kind_s2 == 'example')
+        query_source_s2 = st.radio("查询点", ("随机生成", "上传 CSV"), horizontal=True, key="s2_path_source")
+        if query_source_s2 == "随机生成":
+            n_queries_s2 = st.select_slider("点数", options=PATH_QUERY_SIZES, value=PATH_QUERY_SIZES[-1],
+                                            key="s2_path_n")
+            X_query_s2 = _stream_batch(np.random.default_rng(7), n_queries_s2)[0]
+        else:
+            uploaded_s2 = st.file_uploader("包含 X1、X2 两列的 CSV", type=['csv'], key="s2_path_upload")
+            X_query_s2 = None
+            if uploaded_s2 is not None:
+                try:
+                    X_query_s2 = _read_query_points(uploaded_s2)
+                except Exception as e:
+                    st.error(f"无法读取查询点。错误: {e}")
+
+    with col2_path_vis:
+        if X_query_s2 is None or len(X_query_s2) == 0:
+            st.info("请先上传查询点。")
+        else:
+            tracer_s2 = _path_tracer(tree_kind_s2, X_simple, y_simple, path_depth_s2)
+            start = time.perf_counter()
+            paths_s2 = tracer_s2.trace(X_query_s2)
+            trace_seconds_s2 = time.perf_counter() - start
+            visits_s2 = tracer_s2.node_visits(paths_s2)
+            n_queries = len(X_query_s2)
+            col_q, col_nodes, col_time = st.columns(3)
+            col_q.metric("查询点数", f"{n_queries:,}")
+            col_nodes.metric("树的节点数", f"{tracer_s2.n_nodes:,}")
+            col_time.metric("追踪全部路径", f"{trace_seconds_s2 * 1e3:.1f} ms")
+            st.caption(f"路径以 (点数 × 节点数) 的稀疏矩阵保存，共 {paths_s2.indicator.nnz:,} 个非零元素 "
+                       f"(平均每条路径 {paths_s2.indicator.nnz / n_queries:.1f} 个节点)。")
+
+            tab_nodes, tab_paths, tab_point = st.tabs(["节点经过次数", "最常见的路径", "单个点的路径"])
+            with tab_nodes:
+                visited = np.flatnonzero(visits_s2)[:PATH_TABLE_MAX_NODES]
+                st.dataframe([{"节点": int(node_id), "深度": int(tracer_s2.depth[node_id]),
+                               "规则": _node_rule(tracer_s2, node_id), "经过的点数": int(visits_s2[node_id]),
+                               "占比": 100 * visits_s2[node_id] / n_queries} for node_id in visited],
+                             hide_index=True, use_container_width=True,
+                             column_config={"占比": st.column_config.ProgressColumn(format="%.1f%%", min_value=0,
+                                                                                   max_value=100)})
+            with tab_paths:
+                st.dataframe([{"路径": _path_text(tracer_s2, path), "点数": count, "占比": f"{count / n_queries:.2%}"}
+                              for _, count, path in tracer_s2.common_paths(paths_s2, PATH_TOP_PATHS)],
+                             hide_index=True, use_container_width=True)
+            with tab_point:
+                point_s2 = st.number_input("查询点的序号", min_value=0, max_value=n_queries - 1, value=0, step=1,
+                                           key="s2_path_point")
+                indicator = paths_s2.indicator
+                point_path = indicator.indices[indicator.indptr[point_s2]:indicator.indptr[point_s2 + 1]]
+                x_point = X_query_s2[point_s2]
+                st.markdown(f"**查询点 {point_s2}:** X1 = {x_point[0]:.3f}, X2 = {x_point[1]:.3f}")
+                point_steps = tracer_s2.explain(x_point, point_path)
+                st.markdown("\n".join(
+                    f"{step_no}. 节点 {node_id}: X{feature + 1} ({value:.2f}) <= {threshold:.2f} ? "
+                    f"**{'是' if go_left else '否'}**"
+                    for step_no, (node_id, feature, threshold, value, go_left) in enumerate(point_steps[:-1], 1)
+                ) + f"\n{len(point_steps)}. 到达节点 {point_steps[-1][0]}，{_node_rule(tracer_s2, point_steps[-1][0])}")
+
+    # --- 2.3 Streaming Split Statistics ---
+    st.subheader("数据源源不断地到来时，最佳分割会怎样变化？")
+    st.markdown("""
+    真实世界里，数据往往是**一个一个**（或一小批一小批）到来的。每来一个点就把所有数据重新排序、重新寻找最佳分割，
+    数据一多就太慢了。这里每个特征都在 0 到 5 之间划分出 1024 个小格子，只记录**每个格子里各类别有多少个点**：
+    新点到来时只需把它所在格子的计数加一，最佳分割在格子边界中查找，耗时都与已有的点数无关。
+    """)
+    if "stream_stats" not in st.session_state:
+        _reset_stream(X_simple, y_simple)
+    stream_stats = st.session_state.stream_stats
+
+    col2_stream_ctrl, col2_stream_vis = st.columns([1, 2])
+    with col2_stream_ctrl:
+        new_label_s2 = st.radio("上面输入的新点的真实类别", (0, 1), horizontal=True, key="s2_stream_label",
+                                format_func=lambda label: "红色 🔵" if label == 0 else "蓝色 🟥")
+        stream_full = stream_stats.n_samples >= STREAM_MAX_POINTS
+        st.button("把这个点加入数据流", key="s2_stream_add_point", disabled=stream_full,
+                  on_click=_add_stream_point, args=(new_x1, new_x2, new_label_s2))
+        batch_size_s2 = st.select_slider("每批随机生成的点数", options=STREAM_BATCH_SIZES, value=100,
+                                         key="s2_stream_batch")
+        st.button("生成一批新点", key="s2_stream_add_batch", disabled=stream_full,
+                  on_click=_add_stream_batch, args=(batch_size_s2,))
+        st.button("重新开始 (回到 50 个点)", key="s2_stream_reset", on_click=_reset_stream, args=(X_simple, y_simple))
+
+        if st.session_state.stream_rejected is not None:
+            low, high = STREAM_RANGE
+            rejected_x1, rejected_x2 = st.session_state.stream_rejected
+            st.warning(f"新点 ({rejected_x1:.1f}, {rejected_x2:.1f}) 不在数据流统计的范围内 "
+                       f"(X1、X2 都须在 {low:g} 到 {high:g} 之间)，没有加入。")
+        if stream_full:
+            st.caption(f"已达到上限 {STREAM_MAX_POINTS:,} 个点，请重新开始。")
+
+    with col2_stream_vis:
+        start = time.perf_counter()
+        best_feature_s2, best_threshold_s2, best_gain_s2 = stream_stats.best_split()
+        query_seconds_s2 = time.perf_counter() - start
+        col_n, col_split, col_gini = st.columns(3)
+        col_n.metric("已到达的点数", f"{stream_stats.n_samples:,}")
+        if best_feature_s2 is None:
+            col_split.metric("当前最佳分割", "无")
+            col_gini.metric("Gini 不纯度", f"{stream_stats.root_impurity:.4f}")
+        else:
+            best_stats_s2 = stream_stats.evaluate(best_feature_s2, best_threshold_s2)
+            col_split.metric("当前最佳分割", f"X{best_feature_s2 + 1} <= {best_threshold_s2:.3f}")
+            col_gini.metric("分割后的加权 Gini", f"{best_stats_s2.weighted_impurity:.4f}",
+                            delta=f"{-best_gain_s2:.4f}", delta_color="inverse",
+                            help=f"分割前的 Gini 为 {stream_stats.root_impurity:.4f}，信息增益 {best_gain_s2:.4f}")
+
+        stream_last = st.session_state.stream_last
+        if stream_last is not None and stream_last[0] > 0:
+            n_last, seconds_last = stream_last
+            st.caption(f"最近一批 {n_last:,} 个点的统计更新耗时 {seconds_last * 1e3:.2f} ms "
+                       f"(每个点 {seconds_last / n_last * 1e6:.1f} µs)；查找最佳分割耗时 {query_seconds_s2 * 1e3:.2f} ms。")
+
+        # 统计随数据流原地变化，按点数判断是否需要重画增益曲线
+        slot2_stream = figure_slot("阶段2-数据流增益", figsize=(6, 3))
+        stream_key = ('stream', id(stream_stats), stream_stats.n_samples)
+        if slot2_stream.key != stream_key:
+            slot2_stream.reset(stream_key)
+            plot_gain_curves(stream_stats, ['X1', 'X2'], selected_feature=best_feature_s2, ax=slot2_stream.ax,
+                             title=f"{stream_stats.n_samples:,} 个点上的信息增益-阈值曲线")
+            slot2_stream.artists['stats'] = stream_stats # 保持引用，避免 id 被其他对象复用
+        show_figure(slot2_stream.fig)
+
+
+    st.markdown("""
+    **小结:** 决策树提供了一种结构化的方式来应用一系列规则，对数据进行分类。每个内部节点代表一个问题（基于某个特征的测试），每个分支代表一个答案，每个叶节点代表一个最终的分类预测。
+    """)
+    st.markdown("---")
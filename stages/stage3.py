@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""阶段 3: 决策的核心 - 如何选择“最好的”问题？"""
+import numpy as np
+import streamlit as st
+
+from instrumentation import traced
+from stages.common import figure_slot, show_figure, stage_fragment
+from tree_core import IMPURITY_NAMES, SplitIndex
+
+
+# 分割索引只在数据集变化时构建一次；之后拖动滑块只是二分查找 + 读取前缀计数
+# 以数据集指纹为缓存键 (数组参数带下划线不参与哈希)，百万行的数据也不必在每次重跑时哈希整个数组
+@traced('fit')
+# 索引只读，跨重跑共享同一个对象，无需每次复制；每个数据集都保留一份排序副本和前缀计数，按条目数限制
+@st.cache_resource(max_entries=16)
+def get_split_index(fingerprint, _X, _y, criterion='gini'):
+    return SplitIndex(_X, _y, criterion)
+
+
+@stage_fragment("阶段 3")
+def render(pipe):
+    from plotting import plot_data, plot_gain_curves
+
+    X_pipe, y_pipe, feature_names_pipe, class_names_pipe, legend_names_pipe, fingerprint_pipe = pipe
+    st.header("阶段 3: 决策的核心 - 如何选择“最好的”问题？")
+    st.markdown(r"""
+    在阶段 1，我们凭直觉尝试分割数据。但机器如何**自动**找到“最好”的分割线呢？
+    决策树通过衡量数据的“**纯度**”或“**不纯度**”来做到这一点。一个好的分割应该让分割后的两个区域都尽可能“纯”（即包含的类别尽量单一）。
+
+    我们使用 **基尼不纯度 (Gini Impurity)** 来衡量这种混乱程度：
+    *   公式: $Gini = 1 - \sum_{k} (p_k)^2$，其中 $p_k$ 是类别 $k$ 的样本比例。
+    *   Gini = 0 表示完全纯净（所有样本属于同一类）。
+    *   Gini = 0.5 表示最混乱（二分类情况下，两类样本各占一半）。
+
+    另一个常用的指标是 **信息熵 (Entropy)**：$Entropy = -\sum_{k} p_k \log_2 p_k$，纯净时为 0，二分类时最大为 1
+    （Scikit-learn 中的 `log_loss` 与它相同）。下面可以切换指标，比较它们给出的分割。
+
+    **目标:** 找到一个分割（一个特征 + 一个阈值），使得分割后的**加权平均 Gini 不纯度最小**，也就是**信息增益最大**。
+
+    **信息增益 = (分割前的 Gini) - (分割后的加权平均 Gini)**
+
+    **任务:** 再次尝试选择特征和分割阈值，观察分割如何影响 Gini 不纯度，并找到使**信息增益**最大的分割。
+    """)
+
+    # --- Stage 3 Interactive Elements ---
+
+    # 3.1 计算初始不纯度
+    criterion_s3 = st.radio("不纯度指标 (criterion)", list(IMPURITY_NAMES), format_func=IMPURITY_NAMES.get,
+                            horizontal=True, key="s3_criterion")
+    impurity_name_s3 = IMPURITY_NAMES[criterion_s3]
+    split_index_s3 = get_split_index(fingerprint_pipe, X_pipe, y_pipe, criterion_s3)
+    initial_impurity = split_index_s3.root_impurity
+    st.subheader(f"初始状态 (未分割)")
+    st.metric(label=f"整体 {impurity_name_s3} 不纯度", value=f"{initial_impurity:.4f}")
+    st.markdown("这个值衡量了开始时数据混合的程度。")
+
+
+    # 3.2 互动控件和结果展示
+    col3_1, col3_2 = st.columns([1, 2])
+
+    with col3_1:
+        st.subheader("再次选择分割规则")
+        # 重用阶段1的控件变量名，但这里的操作是独立的
+        feature_map_s3 = {f"特征 {feature_names_pipe[0]} (垂直线)": 0, f"特征 {feature_names_pipe[1]} (水平线)": 1}
+        selected_feature_name_s3 = st.radio("选择要依据的特征:", list(feature_map_s3.keys()), key="s3_feature") # key 避免和 stage 1 冲突
+        selected_feature_idx_s3 = feature_map_s3[selected_feature_name_s3]
+
+        sorted_values_s3 = split_index_s3.sorted_values[selected_feature_idx_s3]
+        min_val_s3 = float(sorted_values_s3[0]) # 外部数据集为 float32，滑块只接受 Python float
+        max_val_s3 = float(sorted_values_s3[-1])
+        step_s3 = (max_val_s3 - min_val_s3) / 50
+        # 使用一个稍微不同的默认值或让用户选择
+        default_val_s3 = float(np.median(sorted_values_s3)) # 用中位数作为默认值
+
+        split_value_s3 = st.slider(f"设置 '{selected_feature_name_s3.split(' ')[1]}' 的分割阈值:",
+                                   min_value=min_val_s3, max_value=max_val_s3, value=default_val_s3, step=step_s3, key="s3_slider")
+
+
+        # 3.3 根据用户的分割进行计算 (查询预先构建的分割索引)
+        split_stats_s3 = split_index_s3.evaluate(selected_feature_idx_s3, split_value_s3)
+        counts_left, counts_right = split_stats_s3.left_counts, split_stats_s3.right_counts
+        n_left_s3, n_right_s3 = counts_left.sum(), counts_right.sum()
+        impurity_left = split_stats_s3.impurity_left
+        impurity_right = split_stats_s3.impurity_right
+        weighted_impurity_after_split = split_stats_s3.weighted_impurity
+        information_gain = split_stats_s3.info_gain
+
+        st.subheader(f"分割后的 {impurity_name_s3} 不纯度")
+        st.markdown(f"**左侧子集 (<= {split_value_s3:.2f})**")
+        st.metric(label=f"样本数: {n_left_s3}", value=f"{impurity_name_s3}: {impurity_left:.4f}")
+        if n_left_s3 > 0:
+            st.caption(", ".join(f"{name}: {count}" for name, count in zip(class_names_pipe, counts_left)))
+
+        st.markdown(f"**右侧子集 (> {split_value_s3:.2f})**")
+        st.metric(label=f"样本数: {n_right_s3}", value=f"{impurity_name_s3}: {impurity_right:.4f}")
+        if n_right_s3 > 0:
+            st.caption(", ".join(f"{name}: {count}" for name, count in zip(class_names_pipe, counts_right)))
+
+        st.subheader("总体评估")
+        st.metric(label=f"分割后的加权平均 {impurity_name_s3}", value=f"{weighted_impurity_after_split:.4f}")
+        st.metric(label=f"信息增益 ({impurity_name_s3} 减少量)", value=f"{information_gain:.4f}",
+                  delta=f"{information_gain - 0:.4f}", # 显示增益值本身作为 delta
+                  help="值越大，表示这次分割带来的“纯度提升”越多。决策树会选择信息增益最大的分割。")
+
+
+    with col3_2:
+        st.subheader("数据与当前分割线")
+        fig3, ax3 = plot_data(X_pipe, y_pipe,
+                              split_feature=selected_feature_idx_s3,
+                              split_value=split_value_s3,
+                              title=f"当前分割 (信息增益: {information_gain:.3f})", # 中文标题
+                              feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                              slot=figure_slot("阶段3-分割"))
+        show_figure(fig3)
+
+        st.subheader("信息增益随阈值的变化")
+        fig3_curve, ax3_curve = plot_gain_curves(split_index_s3, feature_names_pipe,
+                                                 selected_feature=selected_feature_idx_s3,
+                                                 split_value=split_value_s3,
+                                                 slot=figure_slot("阶段3-增益曲线", figsize=(6, 3)))
+        show_figure(fig3_curve)
+        st.caption("曲线上的每个点对应一个候选阈值（相邻样本值的中点）；虚线是你当前的阈值，星号是所有特征中的最大增益。")
+
+    st.markdown("""
+    **动手试试:**
+    *   拖动滑块，改变分割阈值。观察左右子集的 Gini 值、加权平均 Gini 和信息增益如何变化。
+    *   切换选择的特征（X1 或 X2）。
+    *   你能找到哪个特征和哪个阈值组合，能让**信息增益**达到最大吗？这个组合就是决策树（在第一步）会选择的最佳分割！
+    """)
+    st.markdown("---")
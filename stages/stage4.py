@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""阶段 4: 递归构建 - 分而治之 (自建树的第一次分割、子集分割、完整构建、精确搜索 vs 分箱近似)"""
+import os
+import time
+
+import numpy as np
+import streamlit as st
+
+from instrumentation import traced
+from stages.common import (figure_slot, get_custom_tree, model_accuracy, show_figure, show_tree_graph,
+                           stage_fragment, tree_graph_dot)
+from tree_core import IMPURITY_NAMES, build_tree, tree_to_dot
+
+
+@st.cache_data # 只依赖样本数和随机种子，生成一次即可
+def make_large_simple_data(n_samples, seed=42):
+    """按照阶段 1 简单数据集的规则生成更多样本 (X1 > 2.5 为类别 1，加入 10% 的标签噪音)"""
+    rng = np.random.RandomState(seed)
+    X = rng.rand(n_samples, 2) * 5
+    y = (X[:, 0] > 2.5).astype(int)
+    noise_indices = rng.choice(n_samples, size=n_samples // 10, replace=False)
+    y[noise_indices] = 1 - y[noise_indices]
+    return X, y
+
+@traced('fit')
+def _fit_large_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, n_jobs, criterion):
+    X_large, y_large = make_large_simple_data(n_samples)
+    start = time.perf_counter()
+    tree = build_tree(X_large, y_large, max_depth=max_depth, min_samples_leaf=min_samples_leaf, splitter=splitter,
+                      n_jobs=n_jobs, criterion=criterion)
+    return tree, time.perf_counter() - start
+
+# 树只取决于数据和超参数，与线程数无关：缓存键不含 n_jobs (带下划线的参数不参与哈希)，每组超参数只保留一棵树，
+# 各线程数下的构建耗时记在同一个条目里。百万行上的树占用不小，按条目数限制
+@st.cache_resource(max_entries=8)
+def _timed_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, criterion, _n_jobs):
+    tree, seconds = _fit_large_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, _n_jobs, criterion)
+    return tree, {_n_jobs: seconds}
+
+def fit_timed_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, n_jobs=1, criterion='gini'):
+    """返回 (树, 用 n_jobs 个线程构建的耗时)；换一个线程数时重新构建一次只为计时，不再保留第二棵树"""
+    tree, seconds_by_n_jobs = _timed_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, criterion, n_jobs)
+    if n_jobs not in seconds_by_n_jobs:
+        _, seconds_by_n_jobs[n_jobs] = _fit_large_custom_tree(n_samples, max_depth, min_samples_leaf, splitter, n_jobs,
+                                                              criterion)
+    return tree, seconds_by_n_jobs[n_jobs]
+
+
+@stage_fragment("阶段 4")
+def render(pipe):
+    import pandas as pd # 4.4 的对比表格才用到，前面的阶段不必等 pandas 导入
+    from plotting import plot_data, plot_decision_boundary
+
+    X_pipe, y_pipe, feature_names_pipe, class_names_pipe, legend_names_pipe, fingerprint_pipe = pipe
+    st.header("阶段 4: 递归构建 - 分而治之")
+    st.markdown("""
+    我们已经知道如何评估一次分割的好坏（阶段 3）。决策树的构建过程就是**重复**这个寻找“最佳分割”的步骤。
+
+    1.  对当前数据集，找到**信息增益最大**的那个分割（特征 + 阈值）。
+    2.  根据这个分割，将数据集分成两个（或多个）**子集**。
+    3.  对**每个子集**，**重复步骤 1 和 2**。
+
+    这个重复的过程叫做“**递归**”，就像剥洋葱一样，一层一层地处理数据。
+
+    **这个过程什么时候停止呢？** 当满足以下任一条件时，就不再对一个子集进行分割，该子集成为一个**叶节点**：
+    *   **纯净节点:** 该子集里的所有样本都属于同一个类别。 (Gini = 0)
+    *   **最小样本数:** 该子集的样本数量少于预设的阈值 (例如 `min_samples_leaf`)。
+    *   **最大深度:** 树的层数已经达到预设的最大深度 (例如 `max_depth`)。
+    *   **无法再提升纯度:** 找不到任何分割能进一步降低 Gini 不纯度（信息增益 <= 0）。
+    """)
+
+    # --- 4.1 Apply Best Split to Initial Data ---
+    st.subheader("4.1 算法找到的第一个最佳分割")
+
+    # 4.1 和 4.2 都展示同一棵两层的树：4.1 只展开根节点，4.2 再展开所选子集
+    tree_s4 = get_custom_tree(fingerprint_pipe, X_pipe, y_pipe, max_depth=2)
+    root_is_split_s4 = not tree_s4.is_leaf(0)
+
+    if root_is_split_s4:
+        best_feature_idx_s4 = tree_s4.feature[0]
+        best_threshold_s4 = tree_s4.threshold[0]
+        max_info_gain_s4 = tree_s4.node_info_gain(0)
+        st.success(f"算法找到的最佳初始分割:")
+        st.write(f"- **特征:** {feature_names_pipe[best_feature_idx_s4]}")
+        st.write(f"- **阈值:** {best_threshold_s4:.4f}")
+        st.write(f"- **最大信息增益:** {max_info_gain_s4:.4f}")
+
+        col4_1a, col4_1b = st.columns(2)
+        with col4_1a:
+            fig4a, ax4a = plot_data(X_pipe, y_pipe,
+                                    split_feature=best_feature_idx_s4,
+                                    split_value=best_threshold_s4,
+                                    title="第一个最佳分割线", # 中文标题
+                                    feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                    slot=figure_slot("阶段4.1-根分割"))
+            show_figure(fig4a)
+
+        with col4_1b:
+            # 生成对应的 1 层决策树图 (只展开根节点)
+            show_tree_graph(tree_to_dot(tree_s4, feature_names_pipe, class_names_pipe, expanded_nodes={0}))
+
+    else:
+        st.warning("在此数据集上找不到有效的初始分割。")
+
+
+    # --- 4.2 Explore Splitting a Subset ---
+    st.subheader("4.2 对子集重复寻找最佳分割")
+    st.markdown("""
+    现在数据被分成了两个子集（对应上面树图的两个椭圆）。决策树会对**每个**纯度不为0（Gini > 0）的子集，**重复**寻找最佳分割的过程。
+
+    让我们选择其中一个子集，看看算法会如何继续分割它：
+    """)
+
+    # 让用户选择要进一步分割的子集
+    if root_is_split_s4: # 只有在找到第一个分割后才进行
+        left_indices_s4 = X_pipe[:, best_feature_idx_s4] <= best_threshold_s4
+
+        subset_choice = st.radio("选择要进一步分析的子集:",
+                                 (f"左子集 ({feature_names_pipe[best_feature_idx_s4]} <= {best_threshold_s4:.2f})",
+                                  f"右子集 ({feature_names_pipe[best_feature_idx_s4]} > {best_threshold_s4:.2f})"),
+                                 key="subset_choice")
+
+        if subset_choice.startswith("左子集"):
+            X_subset = X_pipe[left_indices_s4]
+            y_subset = y_pipe[left_indices_s4]
+            parent_node_id = tree_s4.children_left[0] # 对应上面树图的左节点
+            st.markdown(f"当前分析: **左子集** (包含 {len(y_subset)} 个样本)")
+        else:
+            X_subset = X_pipe[~left_indices_s4]
+            y_subset = y_pipe[~left_indices_s4]
+            parent_node_id = tree_s4.children_right[0] # 对应上面树图的右节点
+            st.markdown(f"当前分析: **右子集** (包含 {len(y_subset)} 个样本)")
+
+        # 选定子集的最佳分割就是树中该节点的分割
+        if not tree_s4.is_leaf(parent_node_id):
+            best_feature_idx_sub = tree_s4.feature[parent_node_id]
+            best_threshold_sub = tree_s4.threshold[parent_node_id]
+            max_info_gain_sub = tree_s4.node_info_gain(parent_node_id)
+            st.success(f"算法找到该子集的最佳分割:")
+            st.write(f"- **特征:** {feature_names_pipe[best_feature_idx_sub]}")
+            st.write(f"- **阈值:** {best_threshold_sub:.4f}")
+            st.write(f"- **信息增益 (相对于此子集):** {max_info_gain_sub:.4f}")
+
+            col4_2a, col4_2b = st.columns(2)
+            with col4_2a:
+                # 仅绘制子集数据和其分割线
+                fig4b, ax4b = plot_data(X_subset, y_subset,
+                                        split_feature=best_feature_idx_sub,
+                                        split_value=best_threshold_sub,
+                                        title="子集内的最佳分割线", # 中文标题
+                                        feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                        slot=figure_slot("阶段4.2-子集"))
+                show_figure(fig4b)
+
+            with col4_2b:
+                st.markdown("**决策树生长:**")
+                # 在根节点之外再展开所选子集对应的节点
+                show_tree_graph(tree_to_dot(tree_s4, feature_names_pipe, class_names_pipe,
+                                            expanded_nodes={0, parent_node_id}))
+                st.caption("观察决策树如何在选定的分支下增加了新的节点。")
+
+        else:
+            gini_subset = tree_s4.impurity[parent_node_id]
+            if gini_subset == 0:
+                st.info(f"该子集已经**纯净** (Gini = {gini_subset:.3f})，无需再分割，成为叶节点。")
+                fig4b_pure, ax4b_pure = plot_data(X_subset, y_subset, title="纯净的子集", # 中文标题
+                                                  feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                                  slot=figure_slot("阶段4.2-子集"))
+                show_figure(fig4b_pure)
+            elif len(y_subset) <= 1: # 示例：添加一个最小样本数的停止条件
+                 st.info(f"该子集样本数 ({len(y_subset)}) 过少，停止分割，成为叶节点。")
+                 fig4b_small, ax4b_small = plot_data(X_subset, y_subset, title="样本过少的子集", # 中文标题
+                                                     feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                                     slot=figure_slot("阶段4.2-子集"))
+                 show_figure(fig4b_small)
+            else:
+                st.warning(f"在此子集上找不到信息增益大于 0 的有效分割 (当前 Gini = {gini_subset:.3f})。该子集成为叶节点。")
+                fig4b_nosplit, ax4b_nosplit = plot_data(X_subset, y_subset, title="无法有效分割的子集", # 中文标题
+                                                        feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                                        slot=figure_slot("阶段4.2-子集"))
+                show_figure(fig4b_nosplit)
+
+
+    # --- 4.3 Full Recursive Build ---
+    st.subheader("4.3 完整的递归构建")
+    st.markdown("""
+    把“寻找最佳分割 → 分成子集”一直重复下去，直到满足停止条件，就得到一棵完整的决策树。
+    下面这棵树完全由我们自己的 `build_tree` 构建（不依赖 Scikit-learn），树图、预测和决策边界都来自同一份树结构。
+    """)
+
+    col4_3_params, col4_3_vis = st.columns([1, 2])
+
+    with col4_3_params:
+        max_depth_s4 = st.slider("最大深度 (max_depth)", min_value=1, max_value=10, value=3, step=1, key="s4_max_depth")
+        min_samples_leaf_s4 = st.slider("叶节点最小样本数 (min_samples_leaf)", min_value=1, max_value=10, value=1, step=1,
+                                        key="s4_min_leaf")
+        splitter_map_s4 = {"精确 (尝试每个唯一值)": 'exact', "分箱近似 (至多 255 个分位数箱)": 'binned'}
+        splitter_name_s4 = st.radio("分裂搜索方式 (splitter)", list(splitter_map_s4.keys()), key="s4_splitter",
+                                    help="分箱近似先把每个特征量化为 uint8 编码，节点上只用 np.bincount 直方图在箱边界中找分割，适合大数据。")
+        splitter_s4 = splitter_map_s4[splitter_name_s4]
+        criterion_s4 = st.radio("分裂标准 (criterion)", list(IMPURITY_NAMES), format_func=IMPURITY_NAMES.get,
+                                horizontal=True, key="s4_criterion")
+
+        tree_s4_full = get_custom_tree(fingerprint_pipe, X_pipe, y_pipe, max_depth=max_depth_s4,
+                                       min_samples_leaf=min_samples_leaf_s4,
+                                       splitter=splitter_s4, criterion=criterion_s4)
+        acc_s4 = model_accuracy(tree_s4_full, X_pipe, y_pipe)
+        st.metric(label="节点数", value=tree_s4_full.node_count)
+        st.metric(label="实际深度", value=tree_s4_full.max_depth)
+        st.caption(f"模型在训练集上的准确率: {acc_s4:.2%}")
+
+    with col4_3_vis:
+        col4_3a, col4_3b = st.columns(2)
+        with col4_3a:
+            show_tree_graph(tree_graph_dot(tree_s4_full, feature_names_pipe, class_names_pipe))
+        with col4_3b:
+            fig4c, ax4c = plot_decision_boundary(tree_s4_full, X_pipe, y_pipe,
+                                                 title=f"自建树的决策边界 (depth={max_depth_s4}, min_leaf={min_samples_leaf_s4})",
+                                                 feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                                 slot=figure_slot("阶段4.3-决策边界", figsize=(7, 6)))
+            show_figure(fig4c)
+
+    # --- 4.4 Exact vs Binned on Larger Data ---
+    with st.expander("4.4 大数据上的取舍：精确搜索 vs 分箱近似"):
+        st.markdown("""
+        数据量达到 10⁵ 行以上时，把每个唯一值都当作候选阈值既慢又费内存。**分箱近似**先把每个特征按分位数量化为至多 255 个箱（用 1 字节的 uint8 保存），
+        之后每个节点只需统计各箱的类别直方图，就能在箱边界中挑选分割。代价是阈值只能落在箱边界上，准确率可能略有差别。
+        """)
+        n_samples_s4_cmp = st.select_slider("样本数", options=[1_000, 10_000, 100_000, 1_000_000], value=10_000, key="s4_cmp_n")
+        n_jobs_s4 = st.slider("并行线程数 (n_jobs)", min_value=1, max_value=max(os.cpu_count() or 1, 2), value=1, step=1,
+                              key="s4_cmp_n_jobs",
+                              help="同一层的大节点、以及单个大节点的各个特征会分给多个线程同时计算；小节点仍然串行，避免调度开销。")
+        X_test_s4, y_test_s4 = make_large_simple_data(20_000, seed=7) # 独立生成的测试集
+        rows_s4_cmp = []
+        for label_s4, splitter in splitter_map_s4.items():
+            tree_cmp, seconds_cmp = fit_timed_custom_tree(n_samples_s4_cmp, max_depth_s4, min_samples_leaf_s4, splitter,
+                                                          n_jobs_s4, criterion_s4)
+            X_train_s4, y_train_s4 = make_large_simple_data(n_samples_s4_cmp)
+            rows_s4_cmp.append({
+                "分裂搜索方式": label_s4,
+                "构建耗时 (秒)": round(seconds_cmp, 3),
+                "节点数": tree_cmp.node_count,
+                "训练集准确率": model_accuracy(tree_cmp, X_train_s4, y_train_s4),
+                "测试集准确率": model_accuracy(tree_cmp, X_test_s4, y_test_s4),
+            })
+        st.dataframe(pd.DataFrame(rows_s4_cmp).style.format({"训练集准确率": "{:.2%}", "测试集准确率": "{:.2%}"}))
+        acc_diff_s4 = rows_s4_cmp[1]["测试集准确率"] - rows_s4_cmp[0]["测试集准确率"]
+        st.metric(label="测试集准确率差 (分箱 - 精确)", value=f"{acc_diff_s4:+.2%}")
+        X_bytes_s4 = n_samples_s4_cmp * 2 * 8
+        st.caption(f"原始特征 (float64) 占用 {X_bytes_s4 / 1e6:.1f} MB，分箱编码 (uint8) 只需 {X_bytes_s4 / 8 / 1e6:.1f} MB。"
+                   f"（当前深度/叶节点限制和分裂标准与 4.3 的设置一致）")
+
+    st.markdown("""
+    **理解关键点:**
+    *   决策树构建是一个**递归**过程，不断地对产生的子集应用“寻找最佳分割”的逻辑。
+    *   这个过程会持续下去，直到满足**停止条件**（节点纯净、样本太少、达到最大深度等），这时就形成了树的叶子。
+    *   整个过程的目标是逐步降低不纯度，提高分类的准确性。
+    """)
+    st.markdown("---")
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""阶段 5: 过拟合的陷阱与超参数的缰绳"""
+import numpy as np
+import streamlit as st
+
+from stages.common import (PREWARM_MAX_ROWS, VALIDATION_FRACTION, cross_validation_grid, figure_slot, fit_model,
+                           get_model_cache, model_accuracy, nearest_cell, pruning_data, show_figure, show_tree_graph,
+                           stage_fragment, tree_graph_dot, tree_truncator, validation_leaf_grid)
+
+MAX_ALPHA_OPTIONS = 200 # 剪枝路径很长 (大数据集) 时 ccp_alpha 滑块上最多提供的取值个数
+
+
+@stage_fragment("阶段 5")
+def render(pipe):
+    from plotting import plot_decision_boundary, plot_pruning_curve, plot_validation_heatmap
+
+    X_pipe, y_pipe, feature_names_pipe, class_names_pipe, legend_names_pipe, fingerprint_pipe = pipe
+    st.header("Stage 5: 过拟合的陷阱与超参数的缰绳")
+    st.markdown("""
+    我们已经了解了决策树是如何一步步构建的。现在，让我们看看如果让算法**自由生长**（不加限制），会发生什么。
+    我们会使用 Scikit-learn 库来自动构建树。
+    """)
+
+    # --- 5.1 演示过拟合 ---
+    st.subheader("5.1 “自由生长”的决策树：过拟合演示")
+    st.markdown("""
+    下面的决策树是在我们之前的简单二维数据集上训练的，但是**没有设置最大深度 (`max_depth`) 或叶节点最小样本数 (`min_samples_leaf`) 的限制**。
+    观察它的结构和决策边界：
+    """)
+
+    max_min_leaf_s5 = len(X_pipe)//2 if len(X_pipe)>1 else 1 # min_samples_leaf 最大不超过总样本一半
+
+    # 不同 max_depth 的树都由完全生长的树截断得到，只需在后台预先训练每个 min_samples_leaf 的完全树
+    # (大数据集上不预热)
+    if len(X_pipe) <= PREWARM_MAX_ROWS:
+        model_cache = get_model_cache()
+        model_cache.prewarm("阶段5", X_pipe, y_pipe, max_depths=(None,),
+                            min_samples_leafs=range(1, max_min_leaf_s5 + 1),
+                            fingerprint=fingerprint_pipe)
+
+    col5_1_vis, col5_1_exp = st.columns([2, 1]) # 可视化区域宽，解释区域窄
+
+    with col5_1_vis:
+        # 训练一个“完全生长”的树
+        try:
+            clf_overfit = fit_model(
+                X_pipe, y_pipe, # 在简单数据集上训练
+                criterion='gini', # 可以选择 gini 或 entropy
+                max_depth=None, # 不限制深度
+                min_samples_leaf=1, # 允许叶子只有1个样本
+                fingerprint=fingerprint_pipe
+            )
+
+            # 显示树结构
+            st.markdown("**决策树结构图 (可能非常复杂)**")
+            dot_data_overfit = tree_graph_dot(clf_overfit, feature_names_pipe, class_names_pipe) # 节点太多时自动折叠
+            show_tree_graph(dot_data_overfit)
+            acc_overfit = model_accuracy(clf_overfit, X_pipe, y_pipe)
+            st.caption(f"模型在训练集上的准确率: {acc_overfit:.2%}")
+
+
+            # 绘制决策边界
+            st.markdown("**决策边界图 (可能非常曲折)**")
+            fig5_overfit, ax5_overfit = plot_decision_boundary(clf_overfit, X_pipe, y_pipe,
+                                                               title="自由生长树的决策边界", # 中文标题
+                                                               feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                                                               slot=figure_slot("阶段5-自由生长", figsize=(7, 6)))
+            show_figure(fig5_overfit)
+
+        except Exception as e:
+            st.error(f"构建或可视化自由生长树时出错: {e}")
+
+
+    with col5_1_exp:
+        st.warning("**观察到了吗？**")
+        st.markdown("""
+        *   树的结构可能变得非常深、非常复杂，有很多层和很多叶子节点。
+        *   决策边界变得非常**弯曲和不规则**，它试图完美地包围训练数据中的每一个点，甚至是那些看起来像“噪音”的点（比如混在对方颜色区域里的点）。
+        *   虽然它在训练数据上的准确率可能很高（甚至100%），但这种过于复杂的模型很可能无法很好地适应**新的、未见过的数据**。我们称这种现象为“**过拟合 (Overfitting)**”。
+        """)
+
+
+    # --- 5.2 引入超参数控制 ---
+    st.subheader("5.2 使用超参数控制复杂度")
+    st.markdown("""
+    为了防止过拟合，我们需要给决策树的生长加上限制。就像给马套上缰绳，我们可以使用**超参数 (Hyperparameters)** 来控制模型的复杂度。
+
+    **尝试调整下面的超参数，观察决策树结构和决策边界如何变化：**
+    """)
+
+    col5_2_params, col5_2_vis = st.columns([1, 2]) # 参数栏窄，可视化区域宽
+
+    with col5_2_params:
+        st.markdown("**限制条件:**")
+        # 超参数控件
+        max_depth_s5_ctrl = st.slider(
+            "最大深度 (max_depth): 限制树的最大层数",
+            min_value=1, max_value=15, value=3, step=1, key="s5_ctrl_max_depth",
+            help="较小的值使树更简单，防止过拟合。None表示不限制。"
+        )
+        min_samples_leaf_s5_ctrl = st.slider(
+            "叶节点最小样本数 (min_samples_leaf): 叶子节点最少包含的样本数",
+            min_value=1, max_value=max_min_leaf_s5, value=1, step=1, key="s5_ctrl_min_leaf",
+            help="较大的值防止树分得过细，使模型更稳定。"
+        )
+        # 可选: 增加 criterion 控制
+        # criterion_s5_ctrl = st.radio("分裂标准 (criterion)", ('gini', 'entropy'), key="s5_ctrl_criterion")
+
+
+    with col5_2_vis:
+        # 限制深度的树就是完全生长的树去掉深于 max_depth 的部分：只有 min_samples_leaf 变化时才训练，
+        # 拖动深度滑块只是截断同一棵树 (O(节点数))，训练集上的预测也由完全树中的叶子编号直接映射
+        try:
+            truncator_s5 = tree_truncator(
+                X_pipe, y_pipe, fingerprint_pipe,
+                criterion='gini', # 使用上面选的 criterion_s5_ctrl 如果添加了该控件
+                min_samples_leaf=min_samples_leaf_s5_ctrl,
+            )
+            clf_controlled = truncator_s5.truncate(max_depth_s5_ctrl)
+
+            # 显示受控树的结构
+            st.markdown("**受控决策树结构图**")
+            dot_data_ctrl = tree_graph_dot(clf_controlled, feature_names_pipe, class_names_pipe)
+            show_tree_graph(dot_data_ctrl)
+            acc_controlled = float(np.mean(truncator_s5.predict(max_depth_s5_ctrl) == y_pipe))
+            st.caption(f"当前模型在训练集上的准确率: {acc_controlled:.2%}")
+            st.caption(f"这棵树由 min_samples_leaf={min_samples_leaf_s5_ctrl} 的完全生长树 "
+                       f"(深度 {truncator_s5.max_depth}) 截断到第 {clf_controlled.max_depth} 层得到，没有重新训练。")
+
+
+            # 绘制受控树的决策边界
+            st.markdown("**受控决策树边界图**")
+            fig5_ctrl, ax5_ctrl = plot_decision_boundary(
+                clf_controlled, X_pipe, y_pipe,
+                title=f"受控树边界 (depth={max_depth_s5_ctrl}, min_leaf={min_samples_leaf_s5_ctrl})", # 中文标题
+                feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                slot=figure_slot("阶段5-受控", figsize=(7, 6)))
+            show_figure(fig5_ctrl)
+
+        except Exception as e:
+            st.error(f"构建或可视化受控树时出错: {e}")
+
+    # 训练集准确率只会随着树变深而上升，看不出过拟合；k 折交叉验证的测试准确率才能反映模型在新数据上的表现
+    st.markdown("**这些超参数在新数据上表现如何？**")
+    col5_2_cv, col5_2_cv_exp = st.columns([2, 1])
+    try:
+        # 整个滑块网格的交叉验证只在数据集变化时计算一次 (每个 min_samples_leaf 每折训练一棵树，各深度由截断得到)
+        with st.spinner("正在计算交叉验证网格..."):
+            cv_grid_s5 = cross_validation_grid(X_pipe, y_pipe, fingerprint_pipe, max_depths=range(1, 16),
+                                               min_samples_leafs=validation_leaf_grid(max_min_leaf_s5))
+        cv_row_s5, cv_col_s5 = nearest_cell(cv_grid_s5, max_depth_s5_ctrl, min_samples_leaf_s5_ctrl)
+        cv_train_s5 = cv_grid_s5.train_scores[:, cv_row_s5, cv_col_s5].mean()
+        cv_test_s5 = cv_grid_s5.test_scores[:, cv_row_s5, cv_col_s5].mean()
+
+        with col5_2_cv:
+            fig5_cv, ax5_cv = plot_validation_heatmap(cv_grid_s5, max_depth_s5_ctrl, min_samples_leaf_s5_ctrl,
+                                                      slot=figure_slot("阶段5-交叉验证", figsize=(6, 4.5)))
+            show_figure(fig5_cv)
+
+        with col5_2_cv_exp:
+            st.markdown(f"""
+            **{cv_grid_s5.n_folds} 折交叉验证**把数据分成 {cv_grid_s5.n_folds} 份，轮流用其中 1 份测试、其余训练，
+            再对测试准确率取平均。左图是每个超参数组合的平均测试准确率，红框是当前滑块对应的格子。
+            """)
+            st.metric("当前组合的平均训练准确率", f"{cv_train_s5:.2%}")
+            st.metric("当前组合的平均测试准确率", f"{cv_test_s5:.2%}", delta=f"{cv_test_s5 - cv_train_s5:.2%}",
+                      help="delta 是测试准确率与训练准确率之差，差距越大说明过拟合越严重。")
+            st.caption(f"网格共 {cv_grid_s5.test_scores[0].size} 个组合，使用 {cv_grid_s5.n_rows:,} 行数据、"
+                       f"{cv_grid_s5.n_jobs} 个进程，耗时 {cv_grid_s5.seconds:.2f} 秒 (之后直接读取缓存)。")
+    except Exception as e:
+        st.error(f"计算交叉验证网格时出错: {e}")
+
+    st.markdown("""
+    **思考与总结:**
+    *   比较“自由生长”的树和“受控”的树，它们在结构复杂度和决策边界平滑度上有何不同？
+    *   `max_depth` 如何影响树的大小和边界？ 值越小，树越简单，边界越趋向于直线或简单的阶梯状。
+    *   `min_samples_leaf` 如何影响树的大小和边界？ 值越大，树越不容易产生那些只针对少数几个点的细小分支，边界也可能更平滑。
+    *   通过调整这些超参数，我们可以找到一个在“拟合训练数据”（可能导致过拟合）和“保持模型简单以适应新数据”（可能导致欠拟合）之间的**平衡点**。这在机器学习中称为**模型选择**或**超参数调优**。
+    """)
+
+    # --- 5.3 代价复杂度剪枝 ---
+    st.subheader("5.3 先长再剪：代价复杂度剪枝 (ccp_alpha)")
+    st.markdown(f"""
+    另一种思路是先让树完全生长，再把“性价比”最低的分支剪掉。每个分支都可以算出一个**有效 alpha**：
+    剪掉它使叶子不纯度之和增加多少，再除以减少的叶子数。每一步剪掉有效 alpha 最小的分支，直到只剩根节点，
+    就得到一条**剪枝路径**。`ccp_alpha` 越大，剪掉的分支越多，树越简单。
+
+    为了看清剪枝对新数据的影响，这里随机留出 {VALIDATION_FRACTION:.0%} 的样本作为**验证集**，只用其余样本训练。
+    """)
+
+    col5_3_params, col5_3_vis = st.columns([1, 2])
+
+    try:
+        with col5_3_params:
+            criterion_s5_ccp = st.radio("分裂标准 (criterion)", ('gini', 'entropy'), horizontal=True, key="s5_ccp_criterion")
+            # 整条剪枝路径 (以及每一步在训练集/验证集上的准确率) 只在数据集或分裂标准变化时计算一次，
+            # 拖动滑块只是从路径中取出对应的子树
+            pruning_s5 = pruning_data(X_pipe, y_pipe, fingerprint_pipe, criterion_s5_ccp)
+            alpha_options_s5 = np.unique(pruning_s5.ccp_alphas)
+            if len(alpha_options_s5) > MAX_ALPHA_OPTIONS:
+                alpha_options_s5 = alpha_options_s5[np.unique(np.linspace(0, len(alpha_options_s5) - 1,
+                                                                          MAX_ALPHA_OPTIONS).round().astype(int))]
+            best_step_s5 = int(np.argmax(pruning_s5.validation_accuracy))
+            best_alpha_s5 = pruning_s5.ccp_alphas[best_step_s5]
+            alpha_options_s5 = np.union1d(alpha_options_s5, [best_alpha_s5]).tolist()
+            ccp_alpha_s5 = st.select_slider("剪枝强度 (ccp_alpha)", options=alpha_options_s5, value=best_alpha_s5,
+                                            format_func=lambda alpha: f"{alpha:.3g}", key="s5_ccp_alpha",
+                                            help="默认值是验证集准确率最高的 alpha。")
+            step_s5 = pruning_s5.path.step(ccp_alpha_s5)
+            st.metric("叶子数", f"{pruning_s5.path.n_leaves[step_s5]}",
+                      delta=f"{pruning_s5.path.n_leaves[step_s5] - pruning_s5.path.n_leaves[0]}", delta_color="off")
+            st.metric(f"训练集准确率 ({pruning_s5.n_train} 个样本)", f"{pruning_s5.train_accuracy[step_s5]:.2%}")
+            st.metric(f"验证集准确率 ({pruning_s5.n_validation} 个样本)", f"{pruning_s5.validation_accuracy[step_s5]:.2%}")
+            st.caption(f"剪枝路径共 {pruning_s5.path.n_steps} 步，当前是第 {step_s5} 步；子树直接从路径中取出，没有重新训练。")
+
+        with col5_3_vis:
+            fig5_ccp_curve, ax5_ccp_curve = plot_pruning_curve(pruning_s5.ccp_alphas, pruning_s5.train_accuracy,
+                                                               pruning_s5.validation_accuracy, ccp_alpha=ccp_alpha_s5,
+                                                               slot=figure_slot("阶段5-剪枝曲线", figsize=(6, 3)))
+            show_figure(fig5_ccp_curve)
+            fig5_ccp, ax5_ccp = plot_decision_boundary(
+                pruning_s5.path.prune(ccp_alpha_s5), X_pipe, y_pipe,
+                title=f"剪枝后的决策边界 (ccp_alpha={ccp_alpha_s5:.3g})",
+                feature_names=feature_names_pipe, class_names=legend_names_pipe,
+                slot=figure_slot("阶段5-剪枝", figsize=(7, 6)))
+            show_figure(fig5_ccp)
+
+    except Exception as e:
+        st.error(f"计算或可视化剪枝路径时出错: {e}")
+
+    st.markdown("""
+    **动手试试:** 从 `ccp_alpha = 0`（完全生长的树）开始逐渐增大。训练集准确率几乎总是单调下降，
+    而验证集准确率往往先上升后下降：剪掉只拟合噪音的小分支反而让模型在新数据上表现更好。
+    """)
+    st.markdown("---")
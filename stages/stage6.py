@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""阶段 6: 应用于 Iris 数据集 (或侧边栏选择的外部数据集)"""
+import streamlit as st
+
+from stages.common import (PREWARM_MAX_ROWS, cross_validation_grid, dataset_columns, figure_slot, fit_model,
+                           get_model_cache, model_accuracy, nearest_cell, show_figure, show_tree_graph, stage_fragment,
+                           tree_graph_dot, validation_leaf_grid)
+from stages.data_source import iris_table
+
+
+@stage_fragment("阶段 6")
+def render(table):
+    import matplotlib.pyplot as plt
+    from plotting import draw_leaf_regions, plot_validation_heatmap
+
+    if table is None:
+        table = iris_table()
+    X_s6, y_s6, feature_names_s6, class_names_s6, df_s6, dataset_name_s6, fingerprint_s6, builtin_s6 = table
+    st.header("Stage 6: 应用于 Iris 数据集")
+    st.markdown("""
+    现在我们已经理解了过拟合以及如何用超参数控制它。让我们在一个更真实、稍复杂的数据集——**鸢尾花 (Iris)** 上，应用这些知识。
+
+    **任务:** 像刚才一样，调整超参数，观察在 Iris 数据集上生成的决策树结构和二维决策边界。注意 Iris 数据有 3 个类别。
+    """)
+
+    st.subheader("鸢尾花 (Iris) 数据集回顾" if builtin_s6 else f"数据集回顾: {dataset_name_s6}")
+    st.dataframe(df_s6.head(3)) # 显示少量数据，包含中文特征名
+
+    # --- 超参数控制 (针对 Iris) ---
+    st.subheader("调整超参数并观察 Iris 数据结果")
+
+    col6_params, col6_vis = st.columns([1, 3])
+
+    with col6_params:
+        st.markdown("**控制树的复杂度:**")
+        # 使用新的 key 以免冲突
+        max_depth_s6 = st.slider("最大深度 (max_depth)", min_value=1, max_value=10, value=3, step=1, key="s6_max_depth")
+        min_samples_leaf_s6 = st.slider("叶节点最小样本数 (min_samples_leaf)", min_value=1, max_value=20, value=1, step=1, key="s6_min_leaf")
+        criterion_s6 = st.radio("分裂标准 (criterion)", ('gini', 'entropy'), key="s6_criterion")
+
+        st.markdown("**选择2D可视化特征:**")
+        # format_func 使用 feature_names_s6 (已经是中文)
+        many_features_s6 = len(feature_names_s6) >= 4 # Iris 默认展示花瓣长/宽
+        x_feature_idx_s6 = st.selectbox("X轴特征", range(len(feature_names_s6)), format_func=lambda i: feature_names_s6[i], index=2 if many_features_s6 else 0, key="s6_x_feature")
+        y_feature_idx_s6 = st.selectbox("Y轴特征", range(len(feature_names_s6)), format_func=lambda i: feature_names_s6[i], index=3 if many_features_s6 else 1, key="s6_y_feature")
+
+        if x_feature_idx_s6 == y_feature_idx_s6:
+            st.warning("请为X轴和Y轴选择不同的特征。")
+            return
+
+    # --- 训练模型与可视化 (针对 Iris) ---
+    # 后台预热: 完整模型和当前选择的特征组合在整个滑块网格上的模型 (大数据集上不预热)
+    grid_s6 = dict(max_depths=range(1, 11), min_samples_leafs=range(1, 21), criteria=('gini', 'entropy'),
+                   fingerprint=fingerprint_s6)
+    if len(X_s6) <= PREWARM_MAX_ROWS:
+        model_cache = get_model_cache()
+        model_cache.prewarm("阶段6-全部特征", X_s6, y_s6, **grid_s6)
+        model_cache.prewarm(f"阶段6-特征{x_feature_idx_s6}/{y_feature_idx_s6}", X_s6, y_s6,
+                            features=(x_feature_idx_s6, y_feature_idx_s6), **grid_s6)
+
+    with col6_vis:
+        # 1. 训练完整模型 (Iris)
+        try:
+            # 直接用 NumPy 数组 (外部数据集为内存映射) 训练，特征名只在画结构图时传入
+            clf_full_s6 = fit_model(
+                X_s6, y_s6,
+                max_depth=max_depth_s6,
+                min_samples_leaf=min_samples_leaf_s6,
+                criterion=criterion_s6,
+                fingerprint=fingerprint_s6
+            )
+
+            # 2. 生成树结构图 (Iris)
+            st.markdown(f"**决策树结构图 (基于全部{len(feature_names_s6)}个特征)**")
+            dot_data_s6 = tree_graph_dot(clf_full_s6, feature_names_s6, # 传递中文特征名
+                                              class_names_s6) # 类别名保持英文
+            show_tree_graph(dot_data_s6)
+            accuracy_s6 = model_accuracy(clf_full_s6, X_s6, y_s6)
+            st.caption(f"当前模型在训练集上的准确率: {accuracy_s6:.2%}")
+
+        except Exception as e:
+            st.error(f"无法构建或显示 {dataset_name_s6} 的决策树结构图。错误: {e}")
+
+        # 3. 训练 2D 模型 (Iris)
+        try:
+            # 选择对应的两列数据 (仍然是 NumPy 数组，按数据集指纹和特征组合缓存)
+            X_2d_s6 = dataset_columns(f"{fingerprint_s6}:{x_feature_idx_s6},{y_feature_idx_s6}", X_s6,
+                                      (x_feature_idx_s6, y_feature_idx_s6))
+            # 获取选择的特征名（中文）
+            selected_feature_names_2d = [feature_names_s6[x_feature_idx_s6], feature_names_s6[y_feature_idx_s6]]
+
+            # 训练 2D 模型 (用对应的两列训练，缓存按特征组合区分)
+            clf_2d_s6 = fit_model(
+                X_s6, y_s6,
+                max_depth=max_depth_s6,
+                min_samples_leaf=min_samples_leaf_s6,
+                criterion=criterion_s6,
+                features=(x_feature_idx_s6, y_feature_idx_s6),
+                fingerprint=fingerprint_s6
+            )
+
+            # 4. 绘制决策边界 (Iris)
+            st.markdown(f"**决策边界图 (基于 '{selected_feature_names_2d[0]}' 和 '{selected_feature_names_2d[1]}')**")
+            slot6 = figure_slot("阶段6-决策边界", figsize=(8, 6))
+            fig6, ax6 = slot6.fig, slot6.ax
+            boundary_key_s6 = ('iris-boundary', id(clf_2d_s6))
+            if slot6.key != boundary_key_s6: # 模型 (超参数或特征组合) 变化时才重画
+                slot6.reset(boundary_key_s6)
+                slot6.artists['model'] = clf_2d_s6 # 保持引用，避免 id 被其他模型复用
+
+                x_range_i = (X_2d_s6[:, 0].min() - 0.5, X_2d_s6[:, 0].max() + 0.5)
+                y_range_i = (X_2d_s6[:, 1].min() - 0.5, X_2d_s6[:, 1].max() + 0.5)
+                # 每个叶节点对应一个矩形区域，直接从树结构画出，无需在网格上逐点预测
+                draw_leaf_regions(ax6, clf_2d_s6, x_range_i, y_range_i)
+
+                cmap_bold_i = plt.cm.viridis
+                scatter_i = ax6.scatter(X_2d_s6[:, 0], X_2d_s6[:, 1], c=y_s6, cmap=cmap_bold_i,
+                                        edgecolor='k', s=40)
+
+                ax6.set_xlabel(selected_feature_names_2d[0]) # X轴标签是中文
+                ax6.set_ylabel(selected_feature_names_2d[1]) # Y轴标签是中文
+                ax6.set_title(f"{dataset_name_s6} 决策边界") # 中文标题
+                handles_i, _ = scatter_i.legend_elements(prop="colors")
+                ax6.legend(handles_i, class_names_s6, title="类别") # 类别名保持英文
+                ax6.grid(True, linestyle='--', alpha=0.6)
+            show_figure(fig6)
+
+        except Exception as e:
+            st.error(f"无法绘制 {dataset_name_s6} 的决策边界图。错误: {e}")
+
+    # --- 交叉验证 (全部特征，与上面的结构图相同的模型) ---
+    st.subheader("当前超参数在新数据上的表现")
+    col6_cv, col6_cv_exp = st.columns([2, 1])
+    try:
+        with st.spinner("正在计算交叉验证网格..."):
+            cv_grid_s6 = cross_validation_grid(X_s6, y_s6, fingerprint_s6, max_depths=range(1, 11),
+                                               min_samples_leafs=validation_leaf_grid(20), criterion=criterion_s6)
+        cv_row_s6, cv_col_s6 = nearest_cell(cv_grid_s6, max_depth_s6, min_samples_leaf_s6)
+        with col6_cv:
+            fig6_cv, ax6_cv = plot_validation_heatmap(cv_grid_s6, max_depth_s6, min_samples_leaf_s6,
+                                                      title=f"{cv_grid_s6.n_folds} 折交叉验证的平均测试准确率 ({criterion_s6})",
+                                                      slot=figure_slot("阶段6-交叉验证", figsize=(6, 4.5)))
+            show_figure(fig6_cv)
+        with col6_cv_exp:
+            st.metric("当前组合的平均训练准确率", f"{cv_grid_s6.train_scores[:, cv_row_s6, cv_col_s6].mean():.2%}")
+            st.metric("当前组合的平均测试准确率", f"{cv_grid_s6.test_scores[:, cv_row_s6, cv_col_s6].mean():.2%}")
+            st.caption(f"基于全部 {len(feature_names_s6)} 个特征；使用 {cv_grid_s6.n_rows:,} 行数据、"
+                       f"{cv_grid_s6.n_jobs} 个进程，耗时 {cv_grid_s6.seconds:.2f} 秒 (之后直接读取缓存)。")
+    except Exception as e:
+        st.error(f"无法计算 {dataset_name_s6} 的交叉验证网格。错误: {e}")
+
+    st.markdown("---")
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""阶段 7: 集成学习 - 随机森林"""
+import streamlit as st
+
+from model_cache import dataset_fingerprint
+from stages.common import dataset_columns, figure_slot, fit_forest, iris_data, show_figure, stage_fragment
+
+IRIS_FEATURES_S7 = (2, 3) # Iris 上用花瓣长/宽两个特征画决策边界 (与阶段 6 的默认选择相同)
+MAX_DEPTH_OPTIONS_S7 = list(range(1, 16)) + [None]
+
+
+@stage_fragment("阶段 7")
+def render(X_simple, y_simple):
+    from plotting import FOREST_MESH_RESOLUTION, plot_forest_boundary
+
+    st.header("Stage 7: 集成学习 - 随机森林")
+    st.markdown("""
+    单棵决策树很容易过拟合：训练数据稍有变化，树的结构就可能完全不同。**随机森林 (Random Forest)** 的做法是：
+
+    1.  **自助采样 (Bootstrap):** 每棵树从训练集中有放回地抽取同样多的样本来训练，每棵树看到的数据都略有不同。
+    2.  **随机特征:** 每次分裂时只在随机挑选的一部分特征中寻找最佳分割 (`max_features`)，让各棵树更 "不一样"。
+    3.  **集体决策:** 预测时让所有树一起投票 (硬投票)，或者把它们给出的类别概率取平均 (软投票)。
+
+    多棵各有偏差的树平均下来，决策边界会更平滑，对噪音点也不那么敏感。
+    """)
+
+    col7_params, col7_info = st.columns([1, 2])
+    with col7_params:
+        dataset_s7 = st.radio("数据集", ("简单二维数据", "Iris (花瓣长/宽)"), horizontal=True, key="s7_dataset")
+        n_estimators_s7 = st.slider("树的数量 (n_estimators)", min_value=1, max_value=300, value=100, step=1,
+                                    key="s7_n_estimators")
+        max_depth_s7 = st.select_slider("每棵树的最大深度 (max_depth)", options=MAX_DEPTH_OPTIONS_S7, value=None,
+                                        format_func=lambda depth: "不限制" if depth is None else str(depth),
+                                        key="s7_max_depth")
+        max_features_s7 = st.radio("每次分裂考虑的特征 (max_features)", ('sqrt', None), horizontal=True,
+                                   format_func=lambda value: "全部特征" if value is None else "随机 √n 个特征",
+                                   key="s7_max_features")
+        voting_s7 = st.radio("投票方式", ('soft', 'hard'), horizontal=True,
+                             format_func=lambda value: "软投票 (概率平均)" if value == 'soft' else "硬投票 (多数票)",
+                             key="s7_voting")
+
+        # 对照组的超参数放在本阶段：阶段 6 和阶段 7 是各自独立重跑的片段，读取阶段 6 的控件值会停留在旧值上
+        st.markdown("**对照的单棵决策树:**")
+        max_depth_tree_s7 = st.slider("单棵树的最大深度 (max_depth)", min_value=1, max_value=10, value=3, step=1,
+                                      key="s7_tree_max_depth")
+        min_samples_leaf_tree_s7 = st.slider("单棵树的叶节点最小样本数 (min_samples_leaf)", min_value=1, max_value=20,
+                                             value=1, step=1, key="s7_tree_min_leaf")
+        criterion_tree_s7 = st.radio("单棵树的分裂标准 (criterion)", ('gini', 'entropy'), horizontal=True,
+                                     key="s7_tree_criterion")
+
+    if dataset_s7 == "简单二维数据":
+        X_s7, y_s7 = X_simple, y_simple
+        fingerprint_s7 = dataset_fingerprint(X_simple, y_simple)
+        feature_names_s7, class_names_s7 = ('X1', 'X2'), None
+    else:
+        X_iris, y_iris, feature_names_iris, target_names_iris, _ = iris_data()
+        fingerprint_iris = dataset_fingerprint(X_iris, y_iris)
+        # 两列特征单独缓存，指纹中带上列号，不同特征组合的森林互不混淆
+        fingerprint_s7 = f"{fingerprint_iris}:{IRIS_FEATURES_S7[0]},{IRIS_FEATURES_S7[1]}"
+        X_s7, y_s7 = dataset_columns(fingerprint_s7, X_iris, IRIS_FEATURES_S7), y_iris
+        feature_names_s7 = tuple(feature_names_iris[i] for i in IRIS_FEATURES_S7)
+        class_names_s7 = list(target_names_iris)
+
+    with col7_info:
+        st.markdown(f"""
+        左边是一棵单独的决策树 (`max_depth={max_depth_tree_s7}`, `min_samples_leaf={min_samples_leaf_tree_s7}`,
+        `criterion='{criterion_tree_s7}'`，不抽样、考虑全部特征，默认值与阶段 6 相同)，
+        右边是由 **{n_estimators_s7}** 棵树组成的随机森林，两者在同样的两个特征上训练。
+
+        *   森林中的树在所有 CPU 核心上并行训练，同样的超参数只训练一次，之后直接读取缓存。
+        *   画决策边界时，网格上的所有点一次性穿过所有的树 (不是逐棵树循环预测)，再按投票方式汇总。
+        *   背景颜色按类别比例混合：颜色越 "中间"，说明各棵树的意见越不一致。
+        """)
+
+    try:
+        with st.spinner("正在训练随机森林..."):
+            tree_fit_s7 = fit_forest(X_s7, y_s7, fingerprint_s7, n_estimators=1, max_depth=max_depth_tree_s7,
+                                     min_samples_leaf=min_samples_leaf_tree_s7, criterion=criterion_tree_s7,
+                                     max_features=None, bootstrap=False)
+            forest_fit_s7 = fit_forest(X_s7, y_s7, fingerprint_s7, n_estimators=n_estimators_s7,
+                                       max_depth=max_depth_s7, max_features=max_features_s7)
+    except Exception as e:
+        st.error(f"无法训练随机森林。错误: {e}")
+        return
+
+    col7_tree, col7_forest = st.columns(2)
+    for column, fit, voting, title, slot_name in (
+            (col7_tree, tree_fit_s7, 'hard', "单棵决策树", "阶段7-单棵树"),
+            (col7_forest, forest_fit_s7, voting_s7, f"随机森林 ({n_estimators_s7} 棵树)", "阶段7-随机森林")):
+        with column:
+            try:
+                fig, ax, mesh_seconds = plot_forest_boundary(fit.compiled, X_s7, y_s7, voting=voting, title=title,
+                                                             slot=figure_slot(slot_name, figsize=(7, 6)),
+                                                             feature_names=feature_names_s7,
+                                                             class_names=class_names_s7)
+                show_figure(fig)
+                accuracy = (fit.compiled.predict(X_s7) == y_s7).mean()
+                col_fit, col_mesh, col_acc = st.columns(3)
+                col_fit.metric("训练耗时", f"{fit.fit_seconds * 1e3:.0f} ms")
+                col_mesh.metric("边界网格预测", f"{mesh_seconds * 1e3:.0f} ms")
+                col_acc.metric("训练集准确率", f"{accuracy:.2%}")
+            except Exception as e:
+                st.error(f"无法绘制 {title} 的决策边界。错误: {e}")
+
+    st.caption(f"训练耗时是该组超参数第一次训练时的记录 (之后读取缓存)；边界网格预测是在 "
+               f"{FOREST_MESH_RESOLUTION} × {FOREST_MESH_RESOLUTION} 个网格点上一次算出所有树的结果的耗时，"
+               f"同一个森林只计算一次。")
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""阶段 8: 总结与应用"""
+import streamlit as st
+
+from stages.common import stage_fragment
+
+
+@stage_fragment("阶段 8")
+def render():
+    st.header("Stage 8: 总结与应用")
+
+    st.markdown("""
+    恭喜你完成了决策树探秘之旅！让我们回顾一下核心要点：
+
+    1.  **是什么？** 决策树是一种监督学习算法，通过学习一系列基于特征的“是/否”问题（规则），来对数据进行分类或回归。它像一个流程图。
+    2.  **如何构建？**
+        *   **选择最佳分割:** 在每个节点，算法会尝试所有可能的特征和阈值，找到能最大程度“纯化”数据（例如，最大化信息增益或最小化基尼不纯度）的分割。
+        *   **递归分裂:** 对分割产生的子集重复寻找最佳分割的过程，直到满足停止条件。
+        *   **停止条件:** 节点纯净、样本数过少、达到最大深度等，防止树无限生长。
+    3.  **过拟合与控制？**
+        *   **过拟合:** 决策树容易过度学习训练数据的细节和噪声，导致在新数据上表现不佳。
+        *   **超参数控制:** 使用**超参数**（如 `max_depth`, `min_samples_leaf`）来限制树的复杂度，防止过拟合，提高模型的泛化能力。
+    4.  **如何使用？** 可以使用 Scikit-learn 等库自动构建和调整决策树模型。
+
+    **决策树的优点:**
+    *   **可解释性强:** 树的结构清晰，容易理解分类规则。
+    *   **对数据预处理要求低:** 通常不需要特征缩放。
+    *   **可以处理数值型和类别型特征。**
+
+    **决策树的缺点:**
+    *   **容易过拟合:** 特别是当树很深时。
+    *   **对数据微小变动敏感:** 数据的小变化可能导致生成完全不同的树（不稳定）。
+    *   **可能产生有偏树:** 如果某些类别样本量远大于其他类别。
+
+    **应用场景:**
+    决策树本身可用于分类和回归任务。更重要的是，它是许多更强大的**集成学习算法**的基础模块，例如：
+    *   **随机森林 (Random Forest):** 构建多棵不同的决策树并综合它们的预测结果，通常更稳定且不易过拟合（阶段 7 中已经体验过）。
+    *   **梯度提升决策树 (Gradient Boosting Decision Tree - GBDT, XGBoost, LightGBM):** 逐步构建树来纠正之前树的错误，通常精度很高。
+
+    希望这次旅程能帮助你建立对决策树的直观理解！
+    """)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+
+def make_noisy_data(n_samples=600, n_features=2, n_classes=2, noise=0.2, seed=0):
+    """与简单数据集同样的规则 (按 X1 分成几段)，再翻转一部分标签；取值都能用 float32 精确表示，与 sklearn 比较时没有舍入差异"""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 5, size=(n_samples, n_features)).astype(np.float32).astype(np.float64)
+    y = np.minimum((X[:, 0] / 5 * n_classes).astype(int), n_classes - 1)
+    flip = rng.random(n_samples) < noise
+    y[flip] = rng.integers(0, n_classes, size=flip.sum())
+    return X, y
+
+
+@pytest.fixture
+def noisy_data():
+    return make_noisy_data()
+
+
+@pytest.fixture
+def tree_arrays():
+    """树的结构数组 (ArrayTree 或 sklearn 的 tree_)，用于逐节点比较两棵树"""
+    def arrays(tree):
+        tree = getattr(tree, 'tree_', tree)
+        n_nodes = tree.node_count
+        return {name: np.asarray(getattr(tree, name)[:n_nodes]).tolist()
+                for name in ('feature', 'threshold', 'children_left', 'children_right', 'n_node_samples')}
+    return arrays
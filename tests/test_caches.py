@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import shutil
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from artifact_store import ArtifactStore, artifact_nbytes
+from conftest import make_noisy_data
+from graph_render import DotRenderCache
+from model_cache import ModelCache, dataset_fingerprint
+
+
+def run_threads(target, n_threads=8):
+    results = [None] * n_threads
+
+    def run(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# --- ModelCache ---
+def test_model_cache_lru():
+    X, y = make_noisy_data(n_samples=200)
+    cache = ModelCache(max_entries=2)
+    depth1 = cache.get_or_fit(X, y, max_depth=1)
+    assert cache.get_or_fit(X, y, max_depth=1) is depth1
+    depth2 = cache.get_or_fit(X, y, max_depth=2)
+    cache.get_or_fit(X, y, max_depth=1) # depth1 变成最近使用的，下一次淘汰 depth2
+    cache.get_or_fit(X, y, max_depth=3)
+    assert cache.get_or_fit(X, y, max_depth=1) is depth1
+    assert cache.get_or_fit(X, y, max_depth=2) is not depth2
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['evictions']) == (2, 3, 4, 2)
+
+
+def test_model_cache_keys():
+    X, y = make_noisy_data(n_samples=200, n_features=3)
+    cache = ModelCache()
+    gini = cache.get_or_fit(X, y, max_depth=2)
+    assert cache.get_or_fit(X, y, criterion='entropy', max_depth=2) is not gini
+    assert cache.get_or_fit(X, y, max_depth=2, min_samples_leaf=5) is not gini
+    pair = cache.get_or_fit(X, y, max_depth=2, features=[2, 0])
+    assert pair.n_features_in_ == 2
+    assert cache.get_or_fit(X, y, max_depth=2, features=(np.int64(2), 0)) is pair
+    # 同样内容的数据指纹相同，内容不同时不会命中
+    assert cache.get_or_fit(X.copy(), y.copy(), max_depth=2) is gini
+    assert dataset_fingerprint(X, y) != dataset_fingerprint(X, 1 - y)
+    assert len(cache) == 4
+
+
+def test_model_cache_fits_once_under_concurrency():
+    X, y = make_noisy_data(n_samples=2000)
+    cache = ModelCache()
+    models = run_threads(lambda: cache.get_or_fit(X, y, max_depth=6))
+    assert all(model is models[0] for model in models)
+    assert cache.stats()['misses'] == 1
+
+
+def test_model_cache_prewarm():
+    X, y = make_noisy_data(n_samples=200)
+    cache = ModelCache()
+    assert cache.prewarm("网格", X, y, max_depths=[1, 2, 3], min_samples_leafs=[1, 2])
+    assert not cache.prewarm("网格", X, y, max_depths=[1, 2, 3], min_samples_leafs=[1, 2]) # 同名任务只启动一次
+    deadline = time.monotonic() + 30
+    while cache.stats()['prewarm']["网格"]['done'] < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.stats()['prewarm']["网格"] == {'done': 6, 'total': 6}
+    assert len(cache) == 6
+    misses = cache.stats()['misses']
+    cache.get_or_fit(X, y, max_depth=3, min_samples_leaf=2)
+    assert cache.stats()['misses'] == misses
+
+
+# --- ArtifactStore ---
+def test_artifact_store_lru_by_bytes():
+    store = ArtifactStore(max_bytes=3000)
+    calls = []
+
+    def compute(name):
+        def run():
+            calls.append(name)
+            return np.zeros(100) # 800 字节
+        return run
+
+    for name in 'abc':
+        store.get_or_compute(name, compute(name))
+    store.get_or_compute('a', compute('a')) # a 变成最近使用的
+    store.get_or_compute('d', compute('d')) # 超出 3000 字节，淘汰最久未用的 b
+    assert [key in store for key in 'abcd'] == [True, False, True, True]
+    assert calls == ['a', 'b', 'c', 'd']
+    stats = store.stats()
+    assert (stats['size'], stats['bytes'], stats['hits'], stats['misses'], stats['evictions']) == (3, 2400, 1, 4, 1)
+
+    # 单个结果超过整个容量时直接返回，不缓存
+    big = store.get_or_compute('big', lambda: np.zeros(1000))
+    assert len(big) == 1000 and 'big' not in store
+
+
+def test_artifact_store_freezes_and_skips_failures():
+    store = ArtifactStore()
+    X, y = store.get_or_compute('data', lambda: (np.arange(5.0), [np.arange(3)]))
+    with pytest.raises(ValueError):
+        X[0] = 1
+    with pytest.raises(ValueError):
+        y[0][0] = 1
+
+    def fail():
+        raise RuntimeError("计算失败")
+
+    with pytest.raises(RuntimeError):
+        store.get_or_compute('bad', fail)
+    assert 'bad' not in store
+    assert store.get_or_compute('bad', lambda: 'ok') == 'ok'
+
+
+def test_artifact_store_computes_once_under_concurrency():
+    store = ArtifactStore()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05) # 让其他线程在计算期间到达，等待这一次的结果
+        return np.arange(10)
+
+    results = run_threads(lambda: store.get_or_compute('shared', compute))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_artifact_nbytes():
+    array = np.zeros(1000)
+    assert artifact_nbytes(array) == 8000
+    assert artifact_nbytes(array[:10]) == 0 # 视图不额外占内存
+    assert artifact_nbytes("决策树") == len("决策树".encode('utf-8'))
+    assert 8000 < artifact_nbytes((array, array)) < 2 * 8000 # 同一个对象只计一次
+
+
+# --- DotRenderCache ---
+DOT_SOURCES = [f'digraph {{ a -> b{i} }}\n' for i in range(4)] # graphviz.Source 会补上末尾的换行
+
+
+@pytest.fixture
+def fake_layout(monkeypatch):
+    """在没有 dot 可执行文件的环境中也能测试缓存：把排版替换成按源码生成固定长度的 SVG"""
+    import graphviz
+
+    layouts = []
+
+    def pipe(self, format=None, encoding=None, **kwargs):
+        layouts.append(self.source)
+        return f'<svg>{self.source}</svg>'.ljust(1000)
+
+    monkeypatch.setattr(graphviz.Source, 'pipe', pipe)
+    return layouts
+
+
+def test_dot_render_cache_lru(fake_layout):
+    cache = DotRenderCache(max_bytes=2500)
+    for source in DOT_SOURCES[:2]:
+        assert cache.render(source).startswith(f'<svg>{source}')
+    cache.render(DOT_SOURCES[0]) # 命中，DOT_SOURCES[0] 变成最近使用的
+    cache.render(DOT_SOURCES[2]) # 超出 2500 字节，淘汰 DOT_SOURCES[1]
+    assert fake_layout == DOT_SOURCES[:3]
+    cache.render(DOT_SOURCES[0])
+    cache.render(DOT_SOURCES[1])
+    assert fake_layout == DOT_SOURCES[:3] + [DOT_SOURCES[1]]
+    stats = cache.stats()
+    assert (stats['size'], stats['bytes'], stats['hits'], stats['misses']) == (2, 2000, 2, 4)
+    assert cache.key(DOT_SOURCES[0]) != cache.key(DOT_SOURCES[1])
+
+
+def test_dot_render_cache_skips_oversized(fake_layout):
+    cache = DotRenderCache(max_bytes=500)
+    assert cache.render(DOT_SOURCES[0]) is not None
+    assert len(cache) == 0
+
+
+@pytest.mark.skipif(shutil.which('dot') is not None, reason="需要在没有 graphviz 可执行文件的环境中运行")
+def test_dot_render_cache_without_dot_executable():
+    cache = DotRenderCache()
+    assert cache.render(DOT_SOURCES[0]) is None
+    assert cache.available is False
+    assert cache.render(DOT_SOURCES[1]) is None # 之后不再尝试
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+import cross_validation
+from conftest import make_noisy_data
+from cross_validation import nearest_cell, stratified_folds, validation_grid
+
+MAX_DEPTHS = [1, 2, 3, 5, 8, 30] # 30 比树本身更深，等于不限制
+MIN_SAMPLES_LEAFS = [1, 4, 10]
+
+
+def test_stratified_folds():
+    _, y = make_noisy_data(n_samples=503, n_classes=3, seed=20)
+    fold_ids = stratified_folds(y, n_folds=5)
+    for class_value in np.unique(y):
+        per_fold = np.bincount(fold_ids[y == class_value], minlength=5)
+        assert per_fold.max() - per_fold.min() <= 1
+    assert np.array_equal(fold_ids, stratified_folds(y, n_folds=5)) # 同样的种子得到同样的划分
+
+
+def test_validation_grid_matches_refits():
+    # 只有一个特征时限制深度重新训练的树与截断得到的树相同，每个格子都可以直接用 sklearn 重新训练来核对
+    X, y = make_noisy_data(n_samples=400, n_features=1, seed=21)
+    grid = validation_grid(X, y, MAX_DEPTHS, MIN_SAMPLES_LEAFS, criterion='entropy', n_folds=4, n_jobs=1)
+    assert grid.train_scores.shape == grid.test_scores.shape == (4, len(MAX_DEPTHS), len(MIN_SAMPLES_LEAFS))
+    fold_ids = stratified_folds(y, 4)
+    for fold in range(4):
+        train, test = fold_ids != fold, fold_ids == fold
+        for j, min_samples_leaf in enumerate(MIN_SAMPLES_LEAFS):
+            for i, max_depth in enumerate(MAX_DEPTHS):
+                model = DecisionTreeClassifier(criterion='entropy', max_depth=max_depth,
+                                               min_samples_leaf=min_samples_leaf, random_state=42).fit(X[train], y[train])
+                assert grid.train_scores[fold, i, j] == np.mean(model.predict(X[train]) == y[train])
+                assert grid.test_scores[fold, i, j] == np.mean(model.predict(X[test]) == y[test])
+
+
+def test_validation_grid_pool_equals_serial(monkeypatch):
+    monkeypatch.setattr(cross_validation, 'POOL_MIN_WORK', 0)
+    X, y = make_noisy_data(n_samples=600, n_features=3, n_classes=3, seed=22)
+    serial = validation_grid(X, y, MAX_DEPTHS, MIN_SAMPLES_LEAFS, n_jobs=1)
+    pooled = validation_grid(X, y, MAX_DEPTHS, MIN_SAMPLES_LEAFS, n_jobs=2)
+    assert pooled.n_jobs == 2
+    assert np.array_equal(pooled.train_scores, serial.train_scores)
+    assert np.array_equal(pooled.test_scores, serial.test_scores)
+
+
+def test_validation_grid_subsamples_large_data():
+    X, y = make_noisy_data(n_samples=3000, seed=23)
+    grid = validation_grid(X, y, [2, 4], [1], n_jobs=1, max_rows=1000)
+    assert grid.n_rows == 1000
+    assert 0 < grid.test_scores.mean() <= 1
+
+
+@pytest.mark.parametrize('max_depth, min_samples_leaf, expected', [(1, 1, (0, 0)), (7, 6, (4, 1)), (99, 99, (5, 2))])
+def test_nearest_cell(max_depth, min_samples_leaf, expected):
+    X, y = make_noisy_data(n_samples=100, seed=24)
+    grid = validation_grid(X, y, MAX_DEPTHS, MIN_SAMPLES_LEAFS, n_folds=2, n_jobs=1)
+    assert nearest_cell(grid, max_depth, min_samples_leaf) == expected
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import io
+
+from figures import FigureSlot, drop_render_buffer, new_figure
+
+
+def _save_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+
+def test_drop_render_buffer_then_redraw():
+    fig, ax = new_figure(figsize=(4, 3))
+    ax.plot([0, 1], [0, 1])
+    first = _save_png(fig)
+
+    drop_render_buffer(fig)
+    assert not hasattr(fig.canvas, 'renderer')
+
+    # 同样大小再保存、再绘制：渲染器要重新分配，而不是报 AttributeError
+    assert _save_png(fig) == first
+    fig.canvas.draw()
+    assert fig.canvas.renderer is not None
+
+
+def test_drop_render_buffer_twice_is_noop():
+    fig, _ = new_figure()
+    drop_render_buffer(fig)
+    drop_render_buffer(fig)
+    fig.canvas.draw()
+
+
+def test_slot_reused_after_show():
+    # show_figure() 在 st.pyplot 之后丢掉渲染缓冲区，下一次重跑同一个 slot 要能原地更新后再保存
+    slot = FigureSlot('测试', figsize=(4, 3))
+    slot.ax.plot([0, 1], [1, 0])
+    _save_png(slot.fig)
+    drop_render_buffer(slot.fig)
+    slot.reset()
+    slot.ax.plot([0, 1], [0, 1])
+    _save_png(slot.fig)
+    slot.fig.canvas.draw()
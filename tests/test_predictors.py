@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from conftest import make_noisy_data
+from tree_core import CompiledForest, CompiledTree, PathTracer, build_tree
+
+
+def node_summary(tree):
+    """与节点编号顺序无关的树的摘要：每个节点的 (深度, 特征, 阈值, 样本数, 不纯度)，按内容排序
+    (build_tree 按层编号，sklearn 按深度优先编号)"""
+    tree = getattr(tree, 'tree_', tree)
+    depth = np.zeros(tree.node_count, dtype=int)
+    for node_id in range(tree.node_count): # 子节点编号总是大于父节点
+        if tree.children_left[node_id] != -1:
+            depth[tree.children_left[node_id]] = depth[tree.children_right[node_id]] = depth[node_id] + 1
+    return sorted(zip(depth.tolist(), tree.feature[:tree.node_count].tolist(),
+                      tree.threshold[:tree.node_count].tolist(), tree.n_node_samples[:tree.node_count].tolist(),
+                      np.round(tree.impurity[:tree.node_count], 12).tolist()))
+
+
+def walk(tree, row):
+    """逐节点从根走到叶，返回经过的节点编号"""
+    path = [0]
+    while tree.children_left[path[-1]] != -1:
+        node = path[-1]
+        path.append(tree.children_left[node] if row[tree.feature[node]] <= tree.threshold[node]
+                    else tree.children_right[node])
+    return path
+
+
+def grid_points(n=60):
+    xx, yy = np.meshgrid(np.linspace(-0.5, 5.5, n), np.linspace(-0.5, 5.5, n))
+    return np.c_[xx.ravel(), yy.ravel()]
+
+
+@pytest.mark.parametrize('criterion', ['gini', 'entropy'])
+@pytest.mark.parametrize('min_samples_leaf', [1, 5])
+def test_build_tree_matches_sklearn_one_feature(criterion, min_samples_leaf):
+    # 只有一个特征时不存在特征之间的平局，完全生长的树与 sklearn 逐节点相同。
+    # 例外: min_samples_leaf > 1 时 sklearn 也会做增益为 0 的分割 (两个子节点的类别比例与父节点相同)，
+    # 我们与原来的实现一样把这样的节点留作叶子；多出的子节点预测的类别与父节点相同，预测结果不受影响
+    X, y = make_noisy_data(n_samples=400, n_features=1, n_classes=3, seed=7)
+    tree = build_tree(X, y, min_samples_leaf=min_samples_leaf, criterion=criterion)
+    model = DecisionTreeClassifier(criterion=criterion, min_samples_leaf=min_samples_leaf, random_state=0).fit(X, y)
+    if min_samples_leaf == 1:
+        assert node_summary(tree) == node_summary(model)
+        assert tree.max_depth == model.tree_.max_depth
+    else:
+        sklearn_tree = model.tree_
+        internal = sklearn_tree.children_left != -1
+        gains = sklearn_tree.impurity[internal] - (
+            sklearn_tree.n_node_samples[sklearn_tree.children_left[internal]] *
+            sklearn_tree.impurity[sklearn_tree.children_left[internal]] +
+            sklearn_tree.n_node_samples[sklearn_tree.children_right[internal]] *
+            sklearn_tree.impurity[sklearn_tree.children_right[internal]]) / sklearn_tree.n_node_samples[internal]
+        n_zero_gain = np.count_nonzero(gains < 1e-9)
+        assert tree.node_count == sklearn_tree.node_count - 2 * n_zero_gain
+    X_query = np.linspace(-1, 6, 2000)[:, None]
+    assert np.array_equal(tree.predict(X_query), model.predict(X_query))
+
+
+@pytest.mark.parametrize('criterion', ['gini', 'entropy', 'log_loss'])
+def test_build_tree_matches_sklearn_shallow(criterion):
+    # 多个特征时限制深度，节点都很大，增益不会恰好相同，特征的选择与 sklearn 的随机顺序无关
+    X, y = make_noisy_data(n_samples=3000, n_features=3, n_classes=3, seed=8)
+    tree = build_tree(X, y, max_depth=4, criterion=criterion)
+    model = DecisionTreeClassifier(criterion=criterion, max_depth=4, random_state=0).fit(X, y)
+    assert node_summary(tree) == node_summary(model)
+    X_query = np.c_[grid_points(), np.full(3600, 2.5)]
+    assert np.array_equal(tree.predict(X_query), model.predict(X_query))
+
+
+def test_compiled_tree_matches_sklearn(noisy_data):
+    X, y = noisy_data
+    model = DecisionTreeClassifier(random_state=0).fit(X, y)
+    compiled = CompiledTree(model)
+    X_query = np.r_[X, grid_points()]
+    assert np.array_equal(compiled.apply(X_query), model.apply(X_query))
+    assert np.array_equal(compiled.predict(X_query), model.predict(X_query))
+    # 分块处理与一次处理全部行的结果相同
+    assert np.array_equal(compiled.predict(X_query, chunk_size=97), compiled.predict(X_query, chunk_size=None))
+
+
+def test_compiled_tree_matches_array_tree_walk(noisy_data):
+    X, y = noisy_data
+    tree = build_tree(X, y, min_samples_leaf=3, criterion='entropy')
+    X_query = grid_points()
+    expected = [walk(tree, row)[-1] for row in X_query]
+    assert np.array_equal(CompiledTree(tree).apply(X_query, chunk_size=128), expected)
+    assert np.array_equal(tree.predict(X_query), tree.classes[np.argmax(tree.value[expected], axis=1)])
+
+
+@pytest.fixture(scope='module')
+def forest_data():
+    X, y = make_noisy_data(n_samples=500, n_classes=3, seed=9)
+    forest = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    return X, y, forest
+
+
+def test_compiled_forest_soft_voting_matches_sklearn(forest_data):
+    X, _, forest = forest_data
+    compiled = CompiledForest(forest)
+    X_query = np.r_[X, grid_points()]
+    proba = compiled.predict_proba(X_query)
+    np.testing.assert_allclose(proba, forest.predict_proba(X_query), rtol=0, atol=1e-12)
+    # 概率只差舍入误差：最大的两个概率明显不同的行，预测必须相同
+    top2 = np.sort(proba, axis=1)[:, -2:]
+    clear = top2[:, 1] - top2[:, 0] > 1e-9
+    assert np.array_equal(compiled.predict(X_query)[clear], forest.predict(X_query)[clear])
+    assert np.array_equal(compiled.predict_proba(X_query, chunk_size=100), proba)
+
+
+def test_compiled_forest_hard_voting(forest_data):
+    X, _, forest = forest_data
+    X_query = grid_points()
+    votes = np.stack([estimator.predict(X_query).astype(int) for estimator in forest.estimators_], axis=1)
+    expected = np.stack([np.bincount(row, minlength=3) for row in votes]) / len(forest.estimators_)
+    assert np.array_equal(CompiledForest(forest).predict_proba(X_query, voting='hard'), expected)
+    # 每棵树叶子编号 (减去该树的起始偏移) 与 sklearn 的 apply 相同
+    compiled = CompiledForest(forest)
+    assert np.array_equal(compiled.apply(X_query) - compiled.roots, forest.apply(X_query))
+
+
+def test_compiled_forest_of_array_trees(noisy_data):
+    X, y = noisy_data
+    trees = [build_tree(X[i::3], y[i::3], max_depth=5) for i in range(3)]
+    X_query = grid_points()
+    expected = np.mean([np.eye(2)[tree.predict(X_query)] for tree in trees], axis=0)
+    assert np.array_equal(CompiledForest(trees).predict_proba(X_query, voting='hard'), expected)
+    with pytest.raises(ValueError):
+        CompiledForest(trees).predict_proba(X_query, voting='median')
+
+
+@pytest.mark.parametrize('source', ['sklearn', 'array_tree'])
+def test_path_tracer_matches_decision_path(noisy_data, source):
+    X, y = noisy_data
+    model = DecisionTreeClassifier(random_state=0).fit(X, y)
+    X_query = np.r_[X, grid_points()]
+    if source == 'sklearn':
+        tracer, expected = PathTracer(model), model.decision_path(X_query).toarray()
+    else:
+        tree = build_tree(X, y, max_depth=6)
+        tracer = PathTracer(tree)
+        expected = np.zeros((len(X_query), tree.node_count), dtype=np.int8)
+        for i, row in enumerate(X_query):
+            expected[i, walk(tree, row)] = 1
+    paths = tracer.trace(X_query, chunk_size=256)
+    assert np.array_equal(paths.indicator.toarray(), expected)
+    assert np.array_equal(paths.indicator.indptr, np.concatenate([[0], np.cumsum(expected.sum(axis=1))]))
+    assert np.array_equal(tracer.node_visits(paths), np.asarray(paths.indicator.sum(axis=0)).ravel())
+    assert tracer.node_visits(paths)[0] == len(X_query)
+
+    leaf, count, path = tracer.common_paths(paths, top=1)[0]
+    assert count == np.bincount(paths.leaves).max() and path[-1] == leaf and path[0] == 0
+    steps = tracer.explain(X_query[0], paths.indicator[0].indices)
+    assert [step[0] for step in steps] == paths.indicator[0].indices.tolist()
+    assert steps[-1][0] == paths.leaves[0]
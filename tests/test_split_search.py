@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import tree_core
+from conftest import make_noisy_data
+from tree_core import (BinnedFeatures, SplitIndex, StreamingSplitStats, build_tree, calculate_impurity,
+                       calculate_weighted_impurity, find_best_split)
+
+
+def reference_best_split(X, y, min_samples_leaf=1, criterion='gini'):
+    """重写之前的实现：逐个特征、逐个中点阈值用掩码分割，只在增益严格更大时更新"""
+    n_samples, n_features = X.shape
+    if n_samples <= 1:
+        return None, None, -1
+    current_impurity = calculate_impurity(y, criterion)
+    if current_impurity == 0:
+        return None, None, -1
+    max_info_gain, best_feature_idx, best_threshold = -1, None, None
+    for feature_idx in range(n_features):
+        values = np.unique(X[:, feature_idx])
+        for threshold in (values[:-1] + values[1:]) / 2:
+            left = X[:, feature_idx] <= threshold
+            y_left, y_right = y[left], y[~left]
+            if len(y_left) < max(min_samples_leaf, 1) or len(y_right) < max(min_samples_leaf, 1):
+                continue
+            info_gain = current_impurity - calculate_weighted_impurity(y_left, y_right, criterion)
+            if info_gain > max_info_gain:
+                max_info_gain, best_feature_idx, best_threshold = info_gain, feature_idx, threshold
+    if max_info_gain > 1e-9:
+        return best_feature_idx, best_threshold, max_info_gain
+    return None, None, -1
+
+
+def assert_same_split(actual, expected):
+    assert actual[0] == expected[0]
+    assert actual[1] == expected[1]
+    assert actual[2] == pytest.approx(expected[2], rel=1e-12, abs=1e-15)
+
+
+@pytest.mark.parametrize('criterion', ['gini', 'entropy', 'log_loss'])
+@pytest.mark.parametrize('min_samples_leaf', [1, 7])
+def test_find_best_split_matches_reference(criterion, min_samples_leaf):
+    for seed in range(5):
+        X, y = make_noisy_data(n_samples=200, n_features=3, n_classes=3, seed=seed)
+        assert_same_split(find_best_split(X, y, min_samples_leaf, criterion=criterion),
+                          reference_best_split(X, y, min_samples_leaf, criterion))
+
+
+def test_find_best_split_ties():
+    # 两列完全相同：增益相同时取第一个特征；对称的数据：同一特征上取第一个 (最小的) 阈值
+    X = np.array([[0, 0], [1, 1], [2, 2], [3, 3]], dtype=float)
+    y = np.array([0, 1, 1, 0])
+    assert_same_split(find_best_split(X, y), reference_best_split(X, y))
+    assert find_best_split(X, y)[:2] == (0, 0.5)
+
+    # 大量重复取值的整数特征，许多候选阈值的增益相同
+    rng = np.random.default_rng(3)
+    X = rng.integers(0, 4, size=(60, 3)).astype(float)
+    y = rng.integers(0, 2, size=60)
+    assert_same_split(find_best_split(X, y), reference_best_split(X, y))
+
+
+def test_find_best_split_no_split():
+    X = np.ones((5, 2))
+    assert find_best_split(X, np.array([0, 1, 0, 1, 0])) == (None, None, -1) # 所有取值相同
+    assert find_best_split(np.arange(4.0)[:, None], np.zeros(4, int)) == (None, None, -1) # 已经纯净
+    assert find_best_split(np.zeros((1, 2)), np.array([1])) == (None, None, -1)
+
+
+def test_split_index_matches_masks(noisy_data):
+    X, y = noisy_data
+    index = SplitIndex(X, y, criterion='entropy')
+    assert_same_split(index.best_split(), find_best_split(X, y, criterion='entropy'))
+    for feature_idx, threshold in [(0, 2.5), (1, 0.3), (0, -1.0), (1, 10.0)]:
+        left = X[:, feature_idx] <= threshold
+        stats = index.evaluate(feature_idx, threshold)
+        assert stats.left_counts.tolist() == np.bincount(y[left], minlength=2).tolist()
+        assert stats.right_counts.tolist() == np.bincount(y[~left], minlength=2).tolist()
+        assert stats.weighted_impurity == pytest.approx(calculate_weighted_impurity(y[left], y[~left], 'entropy'))
+
+
+def test_binned_equals_exact_with_few_unique_values(tree_arrays):
+    # 每个特征的唯一值不超过 max_bins 个时，箱边界就是相邻唯一值的中点，每个节点选出的划分与精确搜索相同；
+    # 阈值只在根节点上相同 (子节点中缺少某些取值时，精确搜索取节点内相邻取值的中点，分箱取全局的箱边界)
+    rng = np.random.default_rng(1)
+    X = rng.integers(0, 40, size=(3000, 3)) / 8
+    y = ((X[:, 0] + X[:, 1] > 5) ^ (rng.random(3000) < 0.15)).astype(int)
+    for criterion in ('gini', 'entropy'):
+        exact = build_tree(X, y, min_samples_leaf=2, criterion=criterion)
+        binned = build_tree(X, y, min_samples_leaf=2, splitter='binned', criterion=criterion)
+        exact_arrays, binned_arrays = tree_arrays(exact), tree_arrays(binned)
+        assert binned_arrays.pop('threshold')[0] == exact_arrays.pop('threshold')[0]
+        assert binned_arrays == exact_arrays
+        assert np.array_equal(binned.apply(X), exact.apply(X))
+
+
+def test_binned_codes_follow_cut_points():
+    X, _ = make_noisy_data(n_samples=5000, seed=2)
+    binned = BinnedFeatures(X, max_bins=32)
+    for feature_idx, cuts in enumerate(binned.cut_points):
+        assert len(cuts) + 1 <= 32
+        codes = binned.codes[:, feature_idx]
+        for b in (0, len(cuts) // 2, len(cuts) - 1): # 编码 <= b 等价于 取值 <= cut_points[b]
+            assert np.array_equal(codes <= b, X[:, feature_idx] <= cuts[b])
+
+
+@pytest.mark.parametrize('splitter', ['exact', 'binned'])
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_parallel_build_equals_serial(splitter, backend, tree_arrays, monkeypatch):
+    # 降低并行门槛，让根节点和较大的节点都走并行路径 (特征扫描并行和兄弟节点并行都会用到)
+    monkeypatch.setattr(tree_core, 'PARALLEL_MIN_WORK', 500)
+    X, y = make_noisy_data(n_samples=4000, n_features=3, n_classes=3, seed=4)
+    serial = build_tree(X, y, max_depth=6, splitter=splitter)
+    parallel = build_tree(X, y, max_depth=6, splitter=splitter, n_jobs=2, backend=backend)
+    assert tree_arrays(parallel) == tree_arrays(serial)
+    assert np.array_equal(parallel.value, serial.value)
+
+
+def test_parallel_find_best_split_equals_serial(monkeypatch):
+    monkeypatch.setattr(tree_core, 'PARALLEL_MIN_WORK', 100)
+    X, y = make_noisy_data(n_samples=1000, n_features=4, seed=5)
+    assert_same_split(find_best_split(X, y, n_jobs=3), find_best_split(X, y))
+
+
+def test_streaming_stats_match_masks():
+    rng = np.random.default_rng(6)
+    X = rng.uniform(0, 5, size=(5000, 2))
+    y = ((X[:, 0] > 2.5) ^ (rng.random(5000) < 0.1)).astype(int)
+    batched = StreamingSplitStats([(0, 5), (0, 5)], n_classes=2, n_bins=64)
+    batched.add(X[:10], y[:10])
+    for x_row, label in zip(X[10:200], y[10:200]): # 逐点加入与分批加入的计数相同
+        batched.add(x_row, label)
+    batched.add(X[200:], y[200:])
+    assert batched.n_samples == len(y)
+
+    for feature_idx in range(2):
+        thresholds, gains = batched.gain_curve(feature_idx)
+        for b in (0, 20, 31, 62):
+            left = X[:, feature_idx] <= thresholds[b]
+            expected = calculate_impurity(y) - calculate_weighted_impurity(y[left], y[~left])
+            assert gains[b] == pytest.approx(expected, abs=1e-12)
+            stats = batched.evaluate(feature_idx, thresholds[b])
+            assert stats.left_counts.tolist() == np.bincount(y[left], minlength=2).tolist()
+
+    # 最佳分割与在同样的格子边界上逐个用掩码计算的结果相同
+    best_gain, best_split = -1, None
+    for feature_idx in range(2):
+        for threshold in batched.cut_points[feature_idx]:
+            left = X[:, feature_idx] <= threshold
+            gain = calculate_impurity(y) - calculate_weighted_impurity(y[left], y[~left])
+            if gain > best_gain + 1e-12:
+                best_gain, best_split = gain, (feature_idx, threshold)
+    feature_idx, threshold, gain = batched.best_split()
+    assert (feature_idx, threshold) == best_split
+    assert gain == pytest.approx(best_gain)
+
+
+def test_streaming_stats_rejects_bad_input():
+    stats = StreamingSplitStats([(0, 1)], n_classes=2)
+    with pytest.raises(ValueError):
+        stats.add([[0.5], [0.6]], [0])
+    with pytest.raises(ValueError):
+        stats.add([[0.5]], [2])
+    assert stats.best_split() == (None, None, -1)
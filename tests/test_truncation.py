@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+import tree_core
+from conftest import make_noisy_data
+from tree_core import PruningPath, TreeTruncator, build_tree
+
+
+def test_shared_truncator_from_threads(noisy_data, tree_arrays, monkeypatch):
+    # 缓存容量调小，让各线程不停地互相淘汰对方刚写入的子树
+    monkeypatch.setattr(tree_core, 'SUBTREE_CACHE_SIZE', 4)
+    X, y = noisy_data
+    model = DecisionTreeClassifier(random_state=0).fit(X, y)
+    expected_path = PruningPath(model, X)
+    alphas = expected_path.ccp_alphas[::max(1, expected_path.n_steps // 30)]
+    depths = range(1, expected_path.max_depth + 1)
+    expected_trees = {alpha: tree_arrays(expected_path.prune(alpha)) for alpha in alphas}
+    expected_predictions = {depth: expected_path.predict(depth) for depth in depths}
+
+    shared = PruningPath(model, X)
+    errors = []
+
+    def work(seed):
+        rng = np.random.default_rng(seed)
+        try:
+            for _ in range(200):
+                alpha = alphas[rng.integers(len(alphas))]
+                assert tree_arrays(shared.prune(alpha)) == expected_trees[alpha]
+                depth = int(rng.integers(1, expected_path.max_depth + 1))
+                np.testing.assert_array_equal(shared.predict(depth), expected_predictions[depth])
+        except Exception as e: # 断言失败和竞争导致的异常都收集到主线程
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert len(shared._cache) <= tree_core.SUBTREE_CACHE_SIZE
+
+
+def test_truncating_array_tree_equals_depth_limited_build(noisy_data, tree_arrays):
+    # build_tree 按层编号，截断完全树得到的节点顺序与直接限制深度构建的树相同
+    X, y = noisy_data
+    full = build_tree(X, y, criterion='entropy')
+    truncator = TreeTruncator(full, X)
+    for max_depth in range(1, full.max_depth + 2):
+        refit = build_tree(X, y, max_depth=max_depth, criterion='entropy')
+        truncated = truncator.truncate(max_depth)
+        assert tree_arrays(truncated) == tree_arrays(refit)
+        assert np.array_equal(truncated.value, refit.value)
+        assert truncated.max_depth == refit.max_depth
+        assert np.array_equal(truncator.predict(max_depth), refit.predict(X))
+
+
+def test_truncating_sklearn_tree_equals_refit(tree_arrays):
+    # 只有一个特征时 sklearn 的选择与随机顺序无关，限制深度重新训练的树与截断得到的树逐节点相同 (都是深度优先编号)
+    X, y = make_noisy_data(n_samples=500, n_features=1, n_classes=3, seed=11)
+    full = DecisionTreeClassifier(random_state=0).fit(X, y)
+    truncator = TreeTruncator(full, X)
+    X_test, y_test = make_noisy_data(n_samples=300, n_features=1, n_classes=3, seed=12)
+    accuracy = truncator.accuracy_by_depth(X_test, y_test)
+    for max_depth in range(1, truncator.max_depth + 1):
+        refit = DecisionTreeClassifier(max_depth=max_depth, random_state=0).fit(X, y)
+        assert tree_arrays(truncator.truncate(max_depth)) == tree_arrays(refit)
+        assert np.array_equal(truncator.predict(max_depth), refit.predict(X))
+        assert np.array_equal(truncator.predict(max_depth, truncator.compiled.apply(X_test)), refit.predict(X_test))
+        assert accuracy[max_depth] == np.mean(refit.predict(X_test) == y_test)
+    assert accuracy[0] == np.mean(y_test == full.classes_[np.argmax(full.tree_.value[0])])
+
+
+@pytest.mark.parametrize('criterion', ['gini', 'entropy'])
+def test_pruning_path_matches_sklearn(noisy_data, tree_arrays, criterion):
+    X, y = noisy_data
+    full = DecisionTreeClassifier(criterion=criterion, random_state=0).fit(X, y)
+    path = PruningPath(full, X)
+    expected = full.cost_complexity_pruning_path(X, y)
+    assert np.array_equal(path.ccp_alphas, expected.ccp_alphas)
+    assert np.array_equal(path.impurities, expected.impurities)
+
+    X_val, y_val = make_noisy_data(n_samples=300, seed=13)
+    val_accuracy = path.accuracy_path(X_val, y_val)
+    train_accuracy = path.accuracy_path(None, y) # X 为 None 时使用构建时传入的参考数据 (即 X)
+    # 每一步的有效 alpha，以及相邻两步之间的 alpha，都与用同样 ccp_alpha 重新训练的树相同
+    midpoints = (path.ccp_alphas[:-1] + path.ccp_alphas[1:]) / 2
+    for ccp_alpha in np.concatenate([path.ccp_alphas, midpoints])[::3]:
+        refit = DecisionTreeClassifier(criterion=criterion, ccp_alpha=ccp_alpha, random_state=0).fit(X, y)
+        assert tree_arrays(path.prune(ccp_alpha)) == tree_arrays(refit)
+        assert np.array_equal(path.predict_pruned(ccp_alpha), refit.predict(X))
+        step = path.step(ccp_alpha)
+        assert path.n_leaves[step] == refit.get_n_leaves()
+        assert train_accuracy[step] == np.mean(refit.predict(X) == y)
+        assert val_accuracy[step] == np.mean(refit.predict(X_val) == y_val)
@@ -0,0 +1,1317 @@
+# -*- coding: utf-8 -*-
+"""决策树教程用到的纯 NumPy 计算核心（不依赖 Streamlit，可单独导入）"""
+import heapq
+import multiprocessing
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# --- Impurity Engine ---
+# 支持的不纯度指标 (criterion) 及其显示名称；entropy 与 log_loss 按 sklearn 的约定以 2 为底，两者数值相同
+IMPURITY_NAMES = {'gini': 'Gini', 'entropy': 'Entropy', 'log_loss': 'Log loss'}
+
+def _check_criterion(criterion):
+    if criterion not in IMPURITY_NAMES:
+        raise ValueError(f"未知的 criterion: {criterion!r}，可选 {', '.join(map(repr, IMPURITY_NAMES))}")
+
+def impurity_from_counts(counts, criterion='gini', n=None):
+    """
+    由类别计数矩阵 (m, k) 一次性算出 m 个候选节点 / 子集的不纯度，返回形状为 (m,) 的数组
+    counts 也可以是单个计数向量 (k,)，此时返回一个数。n 为每行的样本数 (省略时按行求和)，样本数为 0 的行不纯度为 0。
+    gini = 1 - Σ p²；entropy = log_loss = -Σ p·log₂ p
+    """
+    _check_criterion(criterion)
+    counts = np.asarray(counts)
+    single = counts.ndim == 1
+    counts = counts.reshape(-1, counts.shape[-1])
+    n = counts.sum(axis=1) if n is None else np.asarray(n).reshape(-1)
+    proportions = counts / np.where(n > 0, n, 1)[:, None]
+    if criterion == 'gini':
+        impurity = 1 - np.sum(proportions**2, axis=1)
+    else:
+        log_p = np.log2(proportions, out=np.zeros(proportions.shape), where=proportions > 0)
+        impurity = 0.0 - np.sum(proportions * log_p, axis=1) # 0.0 - 0.0 得到 +0.0，纯净节点不会显示成 -0
+    impurity = np.where(n > 0, impurity, 0.0)
+    return impurity[0] if single else impurity
+
+def class_counts(y):
+    """各类别的样本数 (只含出现过的类别)；非负整数标签直接 np.bincount，其他标签 (字符串、负数等) 排序计数"""
+    y = np.asarray(y)
+    if len(y) > 0 and y.dtype.kind in 'iu' and y.min() >= 0:
+        counts = np.bincount(y)
+        return counts[counts > 0]
+    return np.unique(y, return_counts=True)[1]
+
+def calculate_impurity(y, criterion='gini'):
+    """计算一个节点 (或数据集) 的不纯度，标签可以是任意类别值"""
+    if len(y) == 0:
+        return 0
+    return impurity_from_counts(class_counts(y), criterion)
+
+def calculate_weighted_impurity(y_left, y_right, criterion='gini'):
+    """计算分割后左右子集按样本数加权的平均不纯度"""
+    n_left, n_right = len(y_left), len(y_right)
+    n_total = n_left + n_right
+    if n_total == 0:
+        return 0
+    return (n_left / n_total) * calculate_impurity(y_left, criterion) + \
+           (n_right / n_total) * calculate_impurity(y_right, criterion)
+
+def calculate_gini(y):
+    """计算一个节点 (或数据集) 的基尼不纯度"""
+    return calculate_impurity(y, 'gini')
+
+def calculate_weighted_gini(y_left, y_right):
+    """计算分割后的加权平均基尼不纯度"""
+    return calculate_weighted_impurity(y_left, y_right, 'gini')
+
+
+# --- Sort-and-Sweep Split Search ---
+def _encode_labels(y):
+    """把任意类别标签编码为 0..k-1 的整数，返回 (编码后的标签, 类别数)"""
+    classes, y_codes = np.unique(y, return_inverse=True)
+    return y_codes.reshape(-1), len(classes)
+
+def _sorted_prefix_counts(x, y_codes, n_classes):
+    """
+    对单个特征排序一次，并计算排序后的类别前缀计数
+    返回: 排序后的特征值 xs, 前缀计数 cum (形状 (n+1, k)，cum[i] 为前 i 个样本的各类别数)
+    """
+    order = np.argsort(x, kind='stable')
+    xs = x[order]
+    one_hot = np.zeros((len(xs), n_classes), dtype=np.int64)
+    one_hot[np.arange(len(xs)), y_codes[order]] = 1
+    cum = np.zeros((len(xs) + 1, n_classes), dtype=np.int64)
+    np.cumsum(one_hot, axis=0, out=cum[1:])
+    return xs, cum
+
+def _sweep_feature(xs, cum, current_impurity, min_samples_leaf=1, criterion='gini'):
+    """
+    在一个已排序的特征上一次性计算所有候选阈值的信息增益
+    左右子集样本数少于 min_samples_leaf 的阈值视为无效（增益为 -inf）
+    返回: 候选阈值 thresholds, 对应的信息增益 gains (没有候选阈值时为空数组)
+    """
+    # 潜在阈值是排序后相邻不同值的中点（与 np.unique + 中点 的取法相同）
+    change = np.flatnonzero(xs[1:] != xs[:-1])
+    if len(change) == 0:
+        return np.empty(0), np.empty(0)
+    thresholds = (xs[change] + xs[change + 1]) / 2
+    # 用二分查找确定 "<= 阈值" 的样本数，保证与逐个掩码比较的结果完全一致
+    n_left = np.searchsorted(xs, thresholds, side='right')
+    gains = _split_gains(cum[n_left], n_left, cum[len(xs)], len(xs), current_impurity, min_samples_leaf, criterion)
+    return thresholds, gains
+
+def _split_gains(left_counts, n_left, total_counts, n_total, current_impurity, min_samples_leaf=1, criterion='gini'):
+    """
+    由每个候选分割的左子集类别计数 (m, k) 批量计算信息增益 (左右子集的不纯度各一次向量化计算)
+    左右子集样本数少于 min_samples_leaf 的候选增益为 -inf
+    """
+    n_right = n_total - n_left
+    right_counts = total_counts - left_counts
+    # 子集为空的阈值不参与比较（例如两个相邻浮点数的中点恰好等于其中一个值）
+    valid = (n_left >= max(min_samples_leaf, 1)) & (n_right >= max(min_samples_leaf, 1))
+
+    impurity_left = impurity_from_counts(left_counts, criterion, n_left)
+    impurity_right = impurity_from_counts(right_counts, criterion, n_right)
+    weighted_impurity = (n_left / n_total) * impurity_left + (n_right / n_total) * impurity_right
+    return np.where(valid, current_impurity - weighted_impurity, -np.inf)
+
+
+def _select_best_split(curves):
+    """
+    依次遍历每个特征的 (thresholds, gains)，选出信息增益最大的分割
+    返回: best_feature_idx, best_threshold, max_info_gain
+    """
+    max_info_gain = -1 # 初始化为负数，确保只有正增益才有效
+    best_feature_idx = None
+    best_threshold = None
+
+    for feature_idx, (thresholds, gains) in enumerate(curves):
+        if len(thresholds) == 0:
+            # 如果只有一个唯一值，无法基于此特征分割
+            continue
+
+        # np.argmax 返回第一个最大值，等价于按阈值从小到大依次比较并只在严格更大时更新
+        best_pos = int(np.argmax(gains))
+        if gains[best_pos] > max_info_gain:
+            max_info_gain = gains[best_pos]
+            best_feature_idx = feature_idx
+            best_threshold = thresholds[best_pos]
+
+    # 只有当最大信息增益明确大于0时，才返回有效分割
+    # （避免浮点数精度问题导致微小的负增益被选中）
+    if max_info_gain > 1e-9: # 使用一个小的阈值
+        return best_feature_idx, best_threshold, max_info_gain
+    else:
+        return None, None, -1 # 表示找不到好的分割
+
+
+# --- Function to Find the Best Split ---
+def find_best_split(X, y, min_samples_leaf=1, n_jobs=1, backend='thread', criterion='gini'):
+    """
+    在给定数据集上找到最佳分割点（最大化信息增益）
+    每个特征只排序一次，然后用类别前缀计数一次性算出所有阈值的增益，
+    复杂度为 O(features × n log n)。
+    min_samples_leaf: 分割后左右子集至少需要包含的样本数（默认 1，即子集不能为空）
+    criterion: 不纯度指标 ('gini' / 'entropy' / 'log_loss')
+    n_jobs / backend: 大数据时把各特征的扫描分给线程池 ('thread') 或进程池 ('process')
+    返回: best_feature_idx, best_threshold, max_info_gain
+    """
+    n_samples, n_features = X.shape
+    if n_samples <= 1: # 如果样本太少，无法分割
+        return None, None, -1
+
+    current_impurity = calculate_impurity(y, criterion)
+    if current_impurity == 0: # 如果节点已经纯净，无需分割
+         return None, None, -1
+
+    y_codes, n_classes = _encode_labels(y)
+    evaluator = _SplitEvaluator(X, y_codes, n_classes, min_samples_leaf, criterion=criterion)
+    with _ParallelSplitter(evaluator, n_jobs, backend) as parallel:
+        return parallel.split_nodes([(None, current_impurity)])[0]
+
+
+# --- Precomputed Split Index ---
+# 一次分割的统计结果：左右子集的类别计数、不纯度以及信息增益
+SplitStats = namedtuple('SplitStats', ['left_counts', 'right_counts', 'impurity_left', 'impurity_right',
+                                       'weighted_impurity', 'info_gain'])
+
+class SplitIndex:
+    """
+    针对一个数据集预先构建的分割索引：保存每个特征排序后的取值和类别前缀计数。
+    构建一次后，任意阈值的左右计数只需一次二分查找 + O(1) 读取，
+    每个特征完整的 "信息增益-阈值" 曲线也在构建时一并算好。
+    """
+    def __init__(self, X, y, criterion='gini'):
+        _check_criterion(criterion)
+        self.criterion = criterion
+        self.n_samples, self.n_features = X.shape
+        self.classes, y_codes = np.unique(y, return_inverse=True)
+        y_codes = y_codes.reshape(-1)
+        self.n_classes = len(self.classes)
+        self.total_counts = np.bincount(y_codes, minlength=self.n_classes)
+        self.root_impurity = impurity_from_counts(self.total_counts, criterion) # 分割前的不纯度
+
+        self.sorted_values = []
+        self.prefix_counts = []
+        self.curves = [] # 每个特征的 (thresholds, gains)
+        for feature_idx in range(self.n_features):
+            xs, cum = _sorted_prefix_counts(X[:, feature_idx], y_codes, self.n_classes)
+            self.sorted_values.append(xs)
+            self.prefix_counts.append(cum)
+            self.curves.append(_sweep_feature(xs, cum, self.root_impurity, criterion=criterion))
+
+    def split_counts(self, feature_idx, threshold):
+        """返回 (左子集类别计数, 右子集类别计数)，左子集为 "特征 <= 阈值" 的样本"""
+        n_left = np.searchsorted(self.sorted_values[feature_idx], threshold, side='right')
+        left_counts = self.prefix_counts[feature_idx][n_left]
+        return left_counts, self.total_counts - left_counts
+
+    def evaluate(self, feature_idx, threshold):
+        """计算某个 (特征, 阈值) 分割的完整统计，结果与直接按掩码分割再计算不纯度相同"""
+        left_counts, right_counts = self.split_counts(feature_idx, threshold)
+        n_left, n_right = left_counts.sum(), right_counts.sum()
+        impurity_left, impurity_right = impurity_from_counts(np.stack([left_counts, right_counts]), self.criterion)
+        weighted_impurity = (n_left / self.n_samples) * impurity_left + (n_right / self.n_samples) * impurity_right
+        return SplitStats(left_counts, right_counts, impurity_left, impurity_right,
+                          weighted_impurity, self.root_impurity - weighted_impurity)
+
+    def gain_curve(self, feature_idx):
+        """返回该特征所有候选阈值及其信息增益 (thresholds, gains)"""
+        return self.curves[feature_idx]
+
+    def best_split(self):
+        """在预先算好的曲线上查找最佳分割，规则与 find_best_split 相同"""
+        return _select_best_split(self.curves)
+
+
+# --- Histogram-binned Approximate Split Search ---
+MAX_BINS = 255 # 每个特征最多 255 个箱，编码可以用 uint8 保存
+
+class BinnedFeatures:
+    """
+    把每个特征一次性量化为至多 max_bins 个分位数箱，编码以 uint8 保存（按列存放）。
+    cut_points[f][b] 是第 f 个特征第 b 个箱的上边界：编码 <= b 等价于 取值 <= cut_points[f][b]。
+    唯一值不超过 max_bins 个的特征直接用相邻唯一值的中点作为边界，此时结果与精确搜索相同。
+    """
+    def __init__(self, X, max_bins=MAX_BINS):
+        if not 2 <= max_bins <= MAX_BINS:
+            raise ValueError(f"max_bins 必须在 2 到 {MAX_BINS} 之间")
+        X = np.asarray(X, dtype=np.float64)
+        self.n_samples, self.n_features = X.shape
+        self.codes = np.empty(X.shape, dtype=np.uint8, order='F')
+        self.cut_points = []
+        for feature_idx in range(self.n_features):
+            col = X[:, feature_idx]
+            uniq = np.unique(col)
+            if len(uniq) <= max_bins:
+                cuts = (uniq[:-1] + uniq[1:]) / 2
+            else:
+                # 取内部分位数作为边界；重复的分位数合并，箱数只会更少
+                cuts = np.unique(np.quantile(col, np.linspace(0, 1, max_bins + 1)[1:-1]))
+            self.cut_points.append(cuts)
+            self.codes[:, feature_idx] = np.searchsorted(cuts, col, side='left')
+
+    @classmethod
+    def from_arrays(cls, codes, cut_points):
+        """用已有的编码和箱边界构造（例如进程池 worker 挂载共享内存中的编码）"""
+        binned = cls.__new__(cls)
+        binned.codes = codes
+        binned.cut_points = cut_points
+        binned.n_samples, binned.n_features = codes.shape
+        return binned
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(cuts.nbytes for cuts in self.cut_points)
+
+def _binned_feature_gains(binned, feature_idx, y_node, n_classes, sample_idx, current_impurity, min_samples_leaf=1,
+                          criterion='gini'):
+    """
+    用 np.bincount 构建节点在某个特征上的 (箱 × 类别) 直方图，并计算每个箱边界的信息增益
+    返回: 候选阈值 thresholds, 对应的信息增益 gains
+    """
+    cuts = binned.cut_points[feature_idx]
+    if len(cuts) == 0:
+        return np.empty(0), np.empty(0)
+    n_bins = len(cuts) + 1
+    codes = binned.codes[sample_idx, feature_idx].astype(np.intp)
+    hist = np.bincount(codes * n_classes + y_node, minlength=n_bins * n_classes).reshape(n_bins, n_classes)
+    cum = np.cumsum(hist, axis=0)
+    left_counts = cum[:-1] # 第 b 行: 编码 <= b 的样本，即 取值 <= cuts[b]
+    gains = _split_gains(left_counts, left_counts.sum(axis=1), cum[-1], len(sample_idx),
+                         current_impurity, min_samples_leaf, criterion)
+    return cuts, gains
+
+# --- Streaming Split Statistics ---
+STREAM_BINS = 1024 # 流式统计中每个特征的格子数 (候选阈值为格子之间的 STREAM_BINS - 1 条边界)
+
+class StreamingSplitStats:
+    """
+    数据逐点 / 分批到来时的分割统计：每个特征在固定的取值网格上维护 (格子 × 类别) 计数，
+    加入一个点只需在每个特征上找到它的格子 (二分查找，O(log 格子数)) 并把计数加一，与已有的点数无关；
+    最佳分割在格子边界上查找 (与分箱近似相同的规则)，每次查询 O(特征数 × 格子数 × 类别数)，也与点数无关。
+    落在 value_ranges 之外的点计入最边上的格子。接口与 SplitIndex 相同 (gain_curve / best_split / evaluate)。
+    """
+    def __init__(self, value_ranges, n_classes=2, n_bins=STREAM_BINS, criterion='gini', min_samples_leaf=1):
+        _check_criterion(criterion)
+        self.criterion = criterion
+        self.min_samples_leaf = min_samples_leaf
+        self.n_features = len(value_ranges)
+        self.n_classes = n_classes
+        self.n_bins = n_bins
+        # 与 BinnedFeatures 相同的约定: 编码 <= b 等价于 取值 <= cut_points[f][b]
+        self.cut_points = [np.linspace(low, high, n_bins + 1)[1:-1] for low, high in value_ranges]
+        self.counts = np.zeros((self.n_features, n_bins, n_classes), dtype=np.int64)
+        self.total_counts = np.zeros(n_classes, dtype=np.int64)
+        self.n_samples = 0
+        self._curves = None # 每个特征的 (thresholds, gains)，有新点加入时作废
+
+    def add(self, X, y):
+        """加入一个点 (X 为一维) 或一批点，y 为 0..n_classes-1 的类别编码"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.intp))
+        if X.shape != (len(y), self.n_features):
+            raise ValueError(f"X 的形状应为 ({len(y)}, {self.n_features})，实际为 {X.shape}")
+        if len(y) and (y.min() < 0 or y.max() >= self.n_classes):
+            raise ValueError(f"类别编码必须在 0 到 {self.n_classes - 1} 之间")
+        for feature_idx, cuts in enumerate(self.cut_points):
+            codes = np.searchsorted(cuts, X[:, feature_idx], side='left')
+            np.add.at(self.counts[feature_idx], (codes, y), 1)
+        self.total_counts += np.bincount(y, minlength=self.n_classes)
+        self.n_samples += len(y)
+        self._curves = None
+
+    @property
+    def root_impurity(self):
+        return impurity_from_counts(self.total_counts, self.criterion)
+
+    def gain_curve(self, feature_idx):
+        """返回该特征所有格子边界及其信息增益 (thresholds, gains)"""
+        if self._curves is None:
+            cum = np.cumsum(self.counts, axis=1)
+            left_counts = cum[:, :-1] # [f, b]: 特征 f 上 取值 <= cut_points[f][b] 的各类别样本数
+            self._curves = [(cuts, _split_gains(left, left.sum(axis=1), self.total_counts, self.n_samples,
+                                                self.root_impurity, self.min_samples_leaf, self.criterion))
+                            for cuts, left in zip(self.cut_points, left_counts)]
+        return self._curves[feature_idx]
+
+    def best_split(self):
+        """在所有格子边界中查找最佳分割，规则与 find_best_split 相同"""
+        if self.n_samples <= 1 or self.root_impurity == 0:
+            return None, None, -1
+        return _select_best_split([self.gain_curve(f) for f in range(self.n_features)])
+
+    def split_counts(self, feature_idx, threshold):
+        """返回 (左子集类别计数, 右子集类别计数)；阈值落在格子内部时按不超过它的最近一条格子边界计算"""
+        n_left_bins = np.searchsorted(self.cut_points[feature_idx], threshold, side='right')
+        left_counts = self.counts[feature_idx, :n_left_bins].sum(axis=0)
+        return left_counts, self.total_counts - left_counts
+
+    def evaluate(self, feature_idx, threshold):
+        """计算某个 (特征, 阈值) 分割的完整统计 (阈值按 split_counts 对齐到格子边界)"""
+        left_counts, right_counts = self.split_counts(feature_idx, threshold)
+        n_left, n_right = left_counts.sum(), right_counts.sum()
+        impurity_left, impurity_right = impurity_from_counts(np.stack([left_counts, right_counts]), self.criterion)
+        n_total = max(self.n_samples, 1)
+        weighted_impurity = (n_left / n_total) * impurity_left + (n_right / n_total) * impurity_right
+        return SplitStats(left_counts, right_counts, impurity_left, impurity_right,
+                          weighted_impurity, self.root_impurity - weighted_impurity)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + sum(cuts.nbytes for cuts in self.cut_points)
+
+# --- Parallel Split Evaluation ---
+# 节点样本数 × 特征数 低于此值时在主线程串行计算，任务调度的开销会超过并行的收益
+PARALLEL_MIN_WORK = 100_000
+
+class _SplitEvaluator:
+    """持有只读的训练数据 (原始特征或分箱编码)，计算单个节点 / 单个特征上的分割"""
+    def __init__(self, X, y_codes, n_classes, min_samples_leaf=1, binned=None, criterion='gini'):
+        self.X = X
+        self.y_codes = y_codes
+        self.n_classes = n_classes
+        self.min_samples_leaf = min_samples_leaf
+        self.binned = binned
+        self.criterion = criterion
+        self.n_samples, self.n_features = (binned.n_samples, binned.n_features) if binned is not None else X.shape
+
+    def resolve(self, sample_idx):
+        """sample_idx 为 None 表示全部样本（根节点），避免为根节点构造和传递整个索引数组"""
+        return np.arange(self.n_samples) if sample_idx is None else sample_idx
+
+    def feature_curve(self, feature_idx, sample_idx, y_node, current_impurity):
+        """返回某个特征上所有候选阈值及其信息增益"""
+        if self.binned is not None:
+            return _binned_feature_gains(self.binned, feature_idx, y_node, self.n_classes, sample_idx,
+                                         current_impurity, self.min_samples_leaf, self.criterion)
+        xs, cum = _sorted_prefix_counts(self.X[sample_idx, feature_idx], y_node, self.n_classes)
+        return _sweep_feature(xs, cum, current_impurity, self.min_samples_leaf, self.criterion)
+
+    def node_split(self, sample_idx, current_impurity):
+        """串行扫描所有特征，返回: best_feature_idx, best_threshold, max_info_gain"""
+        sample_idx = self.resolve(sample_idx)
+        y_node = self.y_codes[sample_idx]
+        return _select_best_split(self.feature_curve(feature_idx, sample_idx, y_node, current_impurity)
+                                  for feature_idx in range(self.n_features))
+
+# --- Shared Memory ---
+def share_array(array, blocks):
+    """
+    把数组复制进一块新的共享内存 (追加到 blocks 中，由调用方负责 close + unlink)，
+    返回 worker 挂载所需的 (名称, 形状, 类型, 存储顺序)
+    """
+    order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(shm)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, order=order)[...] = array
+    return shm.name, array.shape, array.dtype.str, order
+
+def attach_shared_arrays(shared_specs, blocks):
+    """在 worker 中按 share_array 的返回值挂载数组 (只读使用；共享内存由主进程创建和释放，worker 只按名称挂载)"""
+    arrays = {}
+    for key, (shm_name, shape, dtype, order) in shared_specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm) # 保持引用，否则共享内存会随对象一起被关闭
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+    return arrays
+
+# 进程池 worker 中的只读数据：通过共享内存挂载，任务本身只携带节点的样本索引
+_worker_evaluator = None
+_worker_shared_memory = []
+
+def _init_split_worker(shared_specs, n_classes, min_samples_leaf, cut_points, criterion):
+    """进程池初始化：按名称挂载共享内存中的数组，构造本进程的 _SplitEvaluator"""
+    global _worker_evaluator
+    arrays = attach_shared_arrays(shared_specs, _worker_shared_memory)
+    binned = None
+    if cut_points is not None:
+        binned = BinnedFeatures.from_arrays(arrays['codes'], cut_points)
+    _worker_evaluator = _SplitEvaluator(arrays.get('X'), arrays['y_codes'], n_classes, min_samples_leaf, binned,
+                                        criterion)
+
+def _worker_node_split(sample_idx, current_impurity):
+    return _worker_evaluator.node_split(sample_idx, current_impurity)
+
+def _worker_feature_curve(feature_idx, sample_idx, current_impurity):
+    sample_idx = _worker_evaluator.resolve(sample_idx)
+    y_node = _worker_evaluator.y_codes[sample_idx]
+    return _worker_evaluator.feature_curve(feature_idx, sample_idx, y_node, current_impurity)
+
+class _ParallelSplitter:
+    """
+    批量计算一组节点的最佳分割，可选线程池或进程池并行：
+    - 小节点 (样本数 × 特征数 < PARALLEL_MIN_WORK) 始终在主线程串行计算；
+    - 大节点数量不少于 n_jobs 时，每个节点作为一个任务 (兄弟子树并行)；
+    - 否则把大节点的各个特征拆成独立任务 (特征扫描并行)。
+    线程池直接共享主进程中的数组；进程池把数组放进共享内存，只挂载一次，任务不会序列化整个 X。
+    结果按输入顺序返回，与串行计算完全一致。
+    """
+    def __init__(self, evaluator, n_jobs=1, backend='thread'):
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"未知的 backend: {backend!r}，可选 'thread' 或 'process'")
+        self.evaluator = evaluator
+        self.n_jobs = max(1, int(n_jobs or 1))
+        self.backend = backend
+        self.executor = None
+        self._shared_memory = []
+
+    def __enter__(self):
+        if self.n_jobs > 1 and self.evaluator.n_samples * self.evaluator.n_features >= PARALLEL_MIN_WORK:
+            if self.backend == 'thread':
+                self.executor = ThreadPoolExecutor(max_workers=self.n_jobs)
+            else:
+                self.executor = self._start_process_pool()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for shm in self._shared_memory:
+            shm.close()
+            shm.unlink()
+        self._shared_memory = []
+
+    def _share(self, array):
+        return share_array(array, self._shared_memory)
+
+    def _start_process_pool(self):
+        evaluator = self.evaluator
+        shared_specs = {'y_codes': self._share(np.ascontiguousarray(evaluator.y_codes))}
+        cut_points = None
+        if evaluator.binned is not None:
+            shared_specs['codes'] = self._share(evaluator.binned.codes)
+            cut_points = evaluator.binned.cut_points
+        else:
+            shared_specs['X'] = self._share(np.ascontiguousarray(evaluator.X))
+        return ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_split_worker,
+                                   initargs=(shared_specs, evaluator.n_classes, evaluator.min_samples_leaf, cut_points,
+                                             evaluator.criterion))
+
+    def _submit_node(self, sample_idx, current_impurity):
+        if self.backend == 'thread':
+            return self.executor.submit(self.evaluator.node_split, sample_idx, current_impurity)
+        return self.executor.submit(_worker_node_split, sample_idx, current_impurity)
+
+    def _submit_feature(self, feature_idx, sample_idx, current_impurity):
+        if self.backend == 'thread':
+            evaluator = self.evaluator
+            sample_idx = evaluator.resolve(sample_idx)
+            y_node = evaluator.y_codes[sample_idx]
+            return self.executor.submit(evaluator.feature_curve, feature_idx, sample_idx, y_node, current_impurity)
+        return self.executor.submit(_worker_feature_curve, feature_idx, sample_idx, current_impurity)
+
+    def split_nodes(self, tasks):
+        """tasks: [(sample_idx, current_impurity), ...]；返回每个节点的 (feature, threshold, gain)"""
+        n_features = self.evaluator.n_features
+        large = []
+        if self.executor is not None:
+            large = [i for i, (sample_idx, _) in enumerate(tasks)
+                     if len(self.evaluator.resolve(sample_idx)) * n_features >= PARALLEL_MIN_WORK]
+
+        pending = {}
+        if len(large) >= self.n_jobs or n_features == 1:
+            for i in large:
+                pending[i] = self._submit_node(*tasks[i])
+        else:
+            for i in large:
+                sample_idx, current_impurity = tasks[i]
+                pending[i] = [self._submit_feature(feature_idx, sample_idx, current_impurity)
+                              for feature_idx in range(n_features)]
+
+        # 小节点在等待并行任务的同时直接在主线程计算
+        results = [None] * len(tasks)
+        for i, (sample_idx, current_impurity) in enumerate(tasks):
+            if i not in pending:
+                results[i] = self.evaluator.node_split(sample_idx, current_impurity)
+
+        for i, future in pending.items():
+            if isinstance(future, list):
+                results[i] = _select_best_split(f.result() for f in future)
+            else:
+                results[i] = future.result()
+        return results
+
+
+# --- Array-backed Decision Tree ---
+TREE_LEAF = -1 # 叶节点的 children_left / children_right
+TREE_UNDEFINED = -2 # 叶节点的 feature / threshold
+
+class ArrayTree:
+    """
+    用扁平的并行 NumPy 数组保存的决策树，布局与 sklearn 的 clf.tree_ 相同：
+    第 i 个节点的信息分别存放在 feature[i], threshold[i], children_left[i], children_right[i],
+    value[i] (各类别样本数), impurity[i], n_node_samples[i] 中。
+    整棵树只占用这几个数组，节点再多也不会产生成千上万个 Python 对象。
+    criterion 是构建时使用的不纯度指标 (impurity 数组按它计算)，与 sklearn 模型的同名属性对应；
+    input_dtype 是预测时比较阈值所用的精度 (由 sklearn 模型截断得到的树与 sklearn 一样用 float32)。
+    """
+    def __init__(self, classes, capacity=15, criterion='gini', input_dtype=np.float64):
+        self.classes = np.asarray(classes)
+        self.criterion = criterion
+        self.input_dtype = input_dtype
+        self.n_classes = len(self.classes)
+        self.node_count = 0
+        self.max_depth = 0
+        self.feature = np.full(capacity, TREE_UNDEFINED, dtype=np.intp)
+        self.threshold = np.full(capacity, TREE_UNDEFINED, dtype=np.float64)
+        self.children_left = np.full(capacity, TREE_LEAF, dtype=np.intp)
+        self.children_right = np.full(capacity, TREE_LEAF, dtype=np.intp)
+        self.value = np.zeros((capacity, self.n_classes), dtype=np.float64)
+        self.impurity = np.zeros(capacity, dtype=np.float64)
+        self.n_node_samples = np.zeros(capacity, dtype=np.intp)
+
+    _node_arrays = ('feature', 'threshold', 'children_left', 'children_right',
+                    'value', 'impurity', 'n_node_samples')
+
+    def _resize(self, capacity):
+        """把所有节点数组扩容（或收缩）到 capacity 个节点"""
+        fill = {'feature': TREE_UNDEFINED, 'threshold': TREE_UNDEFINED,
+                'children_left': TREE_LEAF, 'children_right': TREE_LEAF}
+        for name in self._node_arrays:
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], fill.get(name, 0), dtype=old.dtype)
+            n = min(len(old), capacity)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def _add_node(self, counts, impurity):
+        """追加一个（暂时为叶子的）节点，返回其编号；容量不足时按倍数扩容"""
+        if self.node_count == len(self.impurity):
+            self._resize(2 * len(self.impurity) + 1)
+        node_id = self.node_count
+        self.value[node_id] = counts
+        self.impurity[node_id] = impurity
+        self.n_node_samples[node_id] = counts.sum()
+        self.node_count += 1
+        return node_id
+
+    def is_leaf(self, node_id):
+        return self.children_left[node_id] == TREE_LEAF
+
+    def apply(self, X):
+        """返回每个样本最终落入的叶节点编号"""
+        return CompiledTree(self).apply(X)
+
+    def predict(self, X):
+        """预测类别：取叶节点中样本最多的类别"""
+        return CompiledTree(self).predict(X)
+
+    def node_info_gain(self, node_id):
+        """内部节点这次分割带来的信息增益（叶节点返回 0）"""
+        if self.is_leaf(node_id):
+            return 0.0
+        left, right = self.children_left[node_id], self.children_right[node_id]
+        n = self.n_node_samples[node_id]
+        weighted = (self.n_node_samples[left] / n) * self.impurity[left] + \
+                   (self.n_node_samples[right] / n) * self.impurity[right]
+        return self.impurity[node_id] - weighted
+
+
+def build_tree(X, y, max_depth=None, min_samples_leaf=1, splitter='exact', max_bins=MAX_BINS,
+               n_jobs=1, backend='thread', criterion='gini'):
+    """
+    递归地（按层）构建完整的决策树
+    满足以下任一条件即成为叶节点: 纯净、达到 max_depth、样本数不足以分成两个 min_samples_leaf、
+    或找不到信息增益大于 0 的分割。
+    splitter: 'exact' 在每个节点调用与 find_best_split 相同的排序扫描逻辑；
+              'binned' 先把特征量化为至多 max_bins 个分位数箱，节点上只用直方图在箱边界中找分割，
+              适合 10⁵ 行以上的大数据（不再排序，额外内存只有 uint8 编码）。
+    n_jobs / backend: 同一层的节点互不依赖，大节点 (及其特征扫描) 可以交给线程池或进程池并行计算；
+              节点编号和结果与串行构建完全相同。
+    criterion: 不纯度指标 ('gini' / 'entropy' / 'log_loss')，节点不纯度和分割增益都由 impurity_from_counts 计算
+    返回: ArrayTree
+    """
+    if splitter not in ('exact', 'binned'):
+        raise ValueError(f"未知的 splitter: {splitter!r}，可选 'exact' 或 'binned'")
+    _check_criterion(criterion)
+    X = np.asarray(X, dtype=np.float64)
+    classes, y_codes = np.unique(y, return_inverse=True)
+    y_codes = y_codes.reshape(-1)
+    n_classes = len(classes)
+    tree = ArrayTree(classes, criterion=criterion)
+    binned = BinnedFeatures(X, max_bins) if splitter == 'binned' else None
+    evaluator = _SplitEvaluator(X, y_codes, n_classes, min_samples_leaf, binned, criterion)
+
+    def make_node(sample_idx):
+        counts = np.bincount(y_codes[sample_idx], minlength=n_classes)
+        return tree._add_node(counts, impurity_from_counts(counts, criterion))
+
+    with _ParallelSplitter(evaluator, n_jobs, backend) as parallel:
+        frontier = [(make_node(np.arange(len(X))), np.arange(len(X)))]
+        depth = 0
+        while frontier:
+            tree.max_depth = depth
+            if max_depth is not None and depth >= max_depth:
+                break
+            # 先筛掉纯净或样本太少的节点，再一次性计算这一层所有节点的最佳分割
+            candidates = [(node_id, sample_idx) for node_id, sample_idx in frontier
+                          if len(sample_idx) >= 2 * min_samples_leaf and tree.impurity[node_id] > 0]
+            splits = parallel.split_nodes([(sample_idx, tree.impurity[node_id])
+                                           for node_id, sample_idx in candidates])
+
+            # 按节点顺序分配子节点编号，保证与逐个节点 (先进先出) 处理时的编号一致
+            next_frontier = []
+            for (node_id, sample_idx), (feature_idx, threshold, _) in zip(candidates, splits):
+                if feature_idx is None:
+                    continue
+                go_left = X[sample_idx, feature_idx] <= threshold
+                left_idx, right_idx = sample_idx[go_left], sample_idx[~go_left]
+                left_id, right_id = make_node(left_idx), make_node(right_idx)
+                tree.feature[node_id] = feature_idx
+                tree.threshold[node_id] = threshold
+                tree.children_left[node_id] = left_id
+                tree.children_right[node_id] = right_id
+                next_frontier.append((left_id, left_idx))
+                next_frontier.append((right_id, right_idx))
+            frontier = next_frontier
+            if frontier:
+                depth += 1
+
+    tree._resize(tree.node_count) # 去掉预留的空位
+    return tree
+
+
+def decision_stump(X, y, feature, threshold, criterion='gini'):
+    """只有一次分割 "特征 feature <= threshold" 的树 (例如教程中手工给出的示例规则)，各节点的计数按 (X, y) 统计"""
+    classes, y_codes = np.unique(y, return_inverse=True)
+    y_codes = y_codes.reshape(-1)
+    tree = ArrayTree(classes, capacity=3, criterion=criterion)
+    for rows in (slice(None), X[:, feature] <= threshold, X[:, feature] > threshold):
+        counts = np.bincount(y_codes[rows], minlength=len(classes))
+        tree._add_node(counts, impurity_from_counts(counts, criterion))
+    tree.feature[0], tree.threshold[0] = feature, threshold
+    tree.children_left[0], tree.children_right[0] = 1, 2
+    tree.max_depth = 1
+    return tree
+
+def subtree_sizes(tree):
+    """每个节点为根的子树中的节点数 (含自身)；子节点编号总是大于父节点，倒序累加一遍即可"""
+    tree = getattr(tree, 'tree_', tree)
+    sizes = np.ones(tree.node_count, dtype=np.intp)
+    children_left, children_right = tree.children_left, tree.children_right
+    for node_id in range(tree.node_count - 1, -1, -1):
+        if children_left[node_id] != TREE_LEAF:
+            sizes[node_id] += sizes[children_left[node_id]] + sizes[children_right[node_id]]
+    return sizes
+
+def tree_to_dot(tree, feature_names, class_names, expanded_nodes=None, max_depth=None, min_samples=None,
+                impurity_name=None):
+    """
+    把 ArrayTree 或 sklearn 决策树转换为 DOT 源码字符串（可直接传给 st.graphviz_chart）
+    expanded_nodes: 只展开这些节点的子树；为 None 时展开整棵树。未展开的内部节点按叶节点显示。
+    max_depth / min_samples: 折叠模式。深度达到 max_depth、或样本数少于 min_samples 的内部节点
+    折叠成一个汇总节点 (显示子树的节点数和叶子数)，无论树有多大，图中的节点数都有上限。
+    impurity_name: 节点中不纯度的显示名称，默认按模型的 criterion 取
+    """
+    if impurity_name is None:
+        impurity_name = IMPURITY_NAMES.get(getattr(tree, 'criterion', 'gini'), 'Gini')
+    tree = getattr(tree, 'tree_', tree)
+    children_left, children_right = tree.children_left, tree.children_right
+    values = node_class_values(tree)
+    sizes = subtree_sizes(tree) if max_depth is not None or min_samples is not None else None
+    lines = ['digraph Tree {']
+
+    def quote(text):
+        return '"' + text.replace('"', '\\"').replace('\n', '\\n') + '"'
+
+    stack = [(0, 0)]
+    while stack:
+        node_id, depth = stack.pop()
+        n_samples = tree.n_node_samples[node_id]
+        impurity = tree.impurity[node_id]
+        is_leaf = children_left[node_id] == TREE_LEAF
+        expand = not is_leaf and (expanded_nodes is None or node_id in expanded_nodes)
+        collapse = expand and ((max_depth is not None and depth >= max_depth)
+                               or (min_samples is not None and n_samples < min_samples))
+        pred = class_names[int(np.argmax(values[node_id]))] if n_samples > 0 else "空"
+        if collapse:
+            n_leaves = (sizes[node_id] + 1) // 2 # 二叉树: 叶子数 = (节点数 + 1) / 2
+            label = (f"... 折叠的子树 ...\n{sizes[node_id]} 个节点 / {n_leaves} 个叶子\n"
+                     f"{impurity_name}={impurity:.3f}\nSamples={n_samples}\nPred: {pred}")
+            lines.append(f'{node_id} [label={quote(label)}, shape=box, style=dashed] ;')
+            continue
+        if expand:
+            name = feature_names[tree.feature[node_id]]
+            label = f"{name} <= {tree.threshold[node_id]:.2f} ?\n{impurity_name}={impurity:.3f}\nSamples={n_samples}"
+        else:
+            label = f"{impurity_name}={impurity:.3f}\nSamples={n_samples}\nPred: {pred}"
+        lines.append(f'{node_id} [label={quote(label)}] ;')
+        if expand:
+            left, right = children_left[node_id], children_right[node_id]
+            lines.append(f'{node_id} -> {left} [label={quote("是 (True)")}] ;')
+            lines.append(f'{node_id} -> {right} [label={quote("否 (False)")}] ;')
+            stack.extend([(right, depth + 1), (left, depth + 1)])
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+# --- Analytic Decision Regions ---
+def node_class_values(tree):
+    """把 value 统一成 (节点数, 类别数) 的二维数组（sklearn 的 tree_.value 形状为 (节点数, 1, 类别数)）"""
+    return tree.value.reshape(tree.node_count, -1)
+
+def leaf_rectangles(tree, x_range, y_range):
+    """
+    对二维特征上训练的树 (sklearn 的 clf.tree_ 或 ArrayTree) 只遍历一次节点数组，
+    推导出每个叶节点在 x_range × y_range 内对应的矩形区域。
+    父节点编号总是小于子节点编号，因此按编号顺序遍历即可把边界从根一路传递到叶子。
+    返回: leaf_ids, boxes (形状 (叶子数, 4)，每行为 x0, x1, y0, y1), leaf_classes (叶节点多数类的类别下标)
+    """
+    n_nodes = tree.node_count
+    lower = np.empty((n_nodes, 2))
+    upper = np.empty((n_nodes, 2))
+    lower[0] = x_range[0], y_range[0]
+    upper[0] = x_range[1], y_range[1]
+    children_left, children_right = tree.children_left, tree.children_right
+    feature, threshold = tree.feature, tree.threshold
+
+    for node_id in range(n_nodes):
+        left, right = children_left[node_id], children_right[node_id]
+        if left == TREE_LEAF:
+            continue
+        f = feature[node_id]
+        if f > 1:
+            raise ValueError("leaf_rectangles 只适用于在两个特征上训练的树")
+        lower[left], upper[left] = lower[node_id], upper[node_id]
+        lower[right], upper[right] = lower[node_id], upper[node_id]
+        upper[left, f] = min(upper[node_id, f], threshold[node_id]) # 左子树: 特征 <= 阈值
+        lower[right, f] = max(lower[node_id, f], threshold[node_id]) # 右子树: 特征 > 阈值
+
+    leaf_ids = np.flatnonzero(children_left[:n_nodes] == TREE_LEAF)
+    boxes = np.column_stack([lower[leaf_ids, 0], upper[leaf_ids, 0], lower[leaf_ids, 1], upper[leaf_ids, 1]])
+    leaf_classes = np.argmax(node_class_values(tree)[leaf_ids], axis=1)
+    return leaf_ids, boxes, leaf_classes
+
+
+# --- Vectorized Bulk Prediction ---
+PREDICT_CHUNK_SIZE = 65_536 # 分块预测时每块的行数，临时数组的内存与块大小成正比
+
+class CompiledTree:
+    """
+    把已训练的树 (sklearn 模型或 ArrayTree) 导出为紧凑的只读数组，用于批量预测
+    所有样本一起从根节点出发，每一步用 NumPy 花式索引让仍在内部节点的样本同时前进一层，
+    循环次数等于树的深度，而不是样本数；不需要 DataFrame，也没有 sklearn 每次调用的输入检查开销。
+    """
+    def __init__(self, model):
+        tree = getattr(model, 'tree_', model)
+        n_nodes = tree.node_count
+        node_ids = np.arange(n_nodes)
+        self.classes = np.asarray(model.classes_ if hasattr(model, 'classes_') else model.classes)
+        self.is_leaf = np.asarray(tree.children_left[:n_nodes]) == TREE_LEAF
+        # 叶节点改写成指向自己的 "自环" (阈值 +inf，总是走向自身)，
+        # 已经到达叶节点的行可以跟着其余行继续前进而不改变结果，省去每层筛选活动行的开销
+        self.feature = np.where(self.is_leaf, 0, tree.feature[:n_nodes]).astype(np.intp)
+        self.threshold = np.where(self.is_leaf, np.inf, tree.threshold[:n_nodes])
+        self.children_left = np.where(self.is_leaf, node_ids, tree.children_left[:n_nodes]).astype(np.intp)
+        self.children_right = np.where(self.is_leaf, node_ids, tree.children_right[:n_nodes]).astype(np.intp)
+        self.leaf_class = np.argmax(node_class_values(tree), axis=1)
+        self.max_depth = int(tree.max_depth)
+        # sklearn 在比较前会把输入转换为 float32，这里保持一致才能得到完全相同的预测
+        # (由 sklearn 模型截断得到的 ArrayTree 也记录了 float32)
+        self.input_dtype = np.float32 if hasattr(model, 'tree_') else getattr(model, 'input_dtype', np.float64)
+
+    def _apply_block(self, X):
+        """逐层路由一个 C 连续的数据块，返回每行的叶节点编号"""
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        nodes = np.zeros(n_rows, dtype=np.intp)
+        active = None # None 表示所有行都还在内部节点
+        for _ in range(self.max_depth):
+            rows = np.arange(n_rows) if active is None else active
+            current = nodes if active is None else nodes[active]
+            # 在展平的数组上按 行号 × 列数 + 特征号 取值，比二维花式索引快
+            go_left = flat[rows * n_features + self.feature[current]] <= self.threshold[current]
+            nxt = np.where(go_left, self.children_left[current], self.children_right[current])
+            if active is None:
+                nodes = nxt
+            else:
+                nodes[active] = nxt
+            keep = ~self.is_leaf[nxt]
+            n_keep = np.count_nonzero(keep)
+            if n_keep == 0:
+                break
+            if n_keep < len(nxt) // 2: # 超过一半的行已到达叶节点时才压缩活动行
+                active = np.flatnonzero(keep) if active is None else active[keep]
+        return nodes
+
+    def apply(self, X, chunk_size=PREDICT_CHUNK_SIZE):
+        """返回每个样本落入的叶节点编号；chunk_size 为 None 时一次处理全部行"""
+        X = X.to_numpy() if hasattr(X, 'to_numpy') else X
+        n_rows = len(X)
+        chunk_size = chunk_size or max(n_rows, 1)
+        leaves = np.empty(n_rows, dtype=np.intp)
+        for start in range(0, n_rows, chunk_size):
+            block = np.ascontiguousarray(X[start:start + chunk_size], dtype=self.input_dtype)
+            leaves[start:start + chunk_size] = self._apply_block(block)
+        return leaves
+
+    def predict(self, X, chunk_size=PREDICT_CHUNK_SIZE):
+        """批量预测类别，百万行的数据也只占用一个数据块大小的临时内存"""
+        return self.classes[self.leaf_class[self.apply(X, chunk_size)]]
+
+
+class CompiledForest:
+    """
+    把森林 (sklearn 的 RandomForestClassifier，或一组训练在相同类别上的树) 中所有树的节点数组首尾拼接，
+    每棵树的节点编号加上偏移量，叶节点同样改写成自环。预测时每个 (样本, 树) 组合都是一条路径，
+    所有路径一起逐层前进，循环次数等于最深的树的深度，而不是树的棵数。
+    投票方式: 'soft' 对各树叶子的类别比例取平均 (与 sklearn 的 predict_proba 相同，至多相差舍入误差)，
+    'hard' 统计各树多数类的票数
+    """
+    def __init__(self, model):
+        estimators = getattr(model, 'estimators_', model)
+        trees = [getattr(estimator, 'tree_', estimator) for estimator in estimators]
+        self.classes = np.asarray(model.classes_ if hasattr(model, 'classes_') else estimators[0].classes)
+        self.n_trees = len(trees)
+        node_counts = np.array([tree.node_count for tree in trees])
+        self.roots = np.concatenate([[0], np.cumsum(node_counts)[:-1]]).astype(np.intp)
+        is_leaf, feature, threshold, children_left, children_right, proba = [], [], [], [], [], []
+        for root, tree in zip(self.roots, trees):
+            n_nodes = tree.node_count
+            leaf = np.asarray(tree.children_left[:n_nodes]) == TREE_LEAF
+            node_ids = root + np.arange(n_nodes)
+            is_leaf.append(leaf)
+            feature.append(np.where(leaf, 0, tree.feature[:n_nodes]))
+            threshold.append(np.where(leaf, np.inf, tree.threshold[:n_nodes]))
+            children_left.append(np.where(leaf, node_ids, root + tree.children_left[:n_nodes]))
+            children_right.append(np.where(leaf, node_ids, root + tree.children_right[:n_nodes]))
+            values = node_class_values(tree)
+            proba.append(values / np.maximum(values.sum(axis=1, keepdims=True), np.finfo(np.float64).tiny))
+        self.is_leaf = np.concatenate(is_leaf)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        # children[2 * i] / children[2 * i + 1] 是节点 i 的左/右子节点，每层只需一次取值
+        self.children = np.column_stack([np.concatenate(children_left), np.concatenate(children_right)]).ravel()
+        self.children = self.children.astype(np.intp)
+        leaf_proba = np.concatenate(proba) # 每个节点作为叶子时的类别比例
+        self.leaf_class = np.argmax(leaf_proba, axis=1)
+        self.class_proba = np.ascontiguousarray(leaf_proba.T) # 按类别分行存放，逐类别取值更快
+        self.max_depth = max(int(tree.max_depth) for tree in trees)
+        self.input_dtype = np.float32 if hasattr(trees[0], 'weighted_n_node_samples') else np.float64
+
+    def _apply_block(self, X):
+        """逐层路由一个数据块中的所有 (样本, 树) 路径，返回形状 (行数, 树的棵数) 的叶节点编号"""
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        nodes = np.tile(self.roots, n_rows)
+        offsets = np.repeat(np.arange(n_rows) * n_features, self.n_trees) # 每条路径所在行的起始位置
+        active = None
+        for _ in range(self.max_depth):
+            current = nodes if active is None else nodes[active]
+            row_offsets = offsets if active is None else offsets[active]
+            go_right = flat[row_offsets + self.feature[current]] > self.threshold[current]
+            nxt = self.children[2 * current + go_right]
+            if active is None:
+                nodes = nxt
+            else:
+                nodes[active] = nxt
+            keep = ~self.is_leaf[nxt]
+            n_keep = np.count_nonzero(keep)
+            if n_keep == 0:
+                break
+            if n_keep < len(nxt) // 2: # 超过一半的路径已到达叶节点时才压缩活动路径
+                active = np.flatnonzero(keep) if active is None else active[keep]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def apply(self, X, chunk_size=PREDICT_CHUNK_SIZE):
+        """返回每个样本在每棵树中落入的叶节点 (拼接后的全局编号)，形状 (行数, 树的棵数)"""
+        X = X.to_numpy() if hasattr(X, 'to_numpy') else X
+        rows_per_chunk = max(1, (chunk_size or len(X) * self.n_trees) // self.n_trees) # 每块的路径数约为 chunk_size
+        leaves = np.empty((len(X), self.n_trees), dtype=np.intp)
+        for start in range(0, len(X), rows_per_chunk):
+            block = np.ascontiguousarray(X[start:start + rows_per_chunk], dtype=self.input_dtype)
+            leaves[start:start + rows_per_chunk] = self._apply_block(block)
+        return leaves
+
+    def predict_proba(self, X, voting='soft', chunk_size=PREDICT_CHUNK_SIZE):
+        """各类别的概率 (soft) 或得票比例 (hard)，形状 (行数, 类别数)"""
+        if voting not in ('soft', 'hard'):
+            raise ValueError(f"未知的 voting: {voting!r}，可选 'soft' 或 'hard'")
+        X = X.to_numpy() if hasattr(X, 'to_numpy') else X
+        n_classes = len(self.classes)
+        rows_per_chunk = max(1, (chunk_size or len(X) * self.n_trees) // self.n_trees)
+        proba = np.empty((len(X), n_classes))
+        for start in range(0, len(X), rows_per_chunk):
+            leaves = self.apply(X[start:start + rows_per_chunk], chunk_size=None)
+            if voting == 'soft': # 沿树的方向求和，每个类别一次取值
+                leaves_by_tree = leaves.T
+                block_proba = np.column_stack([class_proba[leaves_by_tree].sum(axis=0)
+                                               for class_proba in self.class_proba]) / self.n_trees
+            else: # 每行每个类别的票数：(行号, 类别) 展平后一次 bincount
+                rows = np.repeat(np.arange(len(leaves)), self.n_trees)
+                votes = np.bincount(rows * n_classes + self.leaf_class[leaves.ravel()],
+                                    minlength=len(leaves) * n_classes)
+                block_proba = votes.reshape(len(leaves), n_classes) / self.n_trees
+            proba[start:start + rows_per_chunk] = block_proba
+        return proba
+
+    def predict(self, X, voting='soft', chunk_size=PREDICT_CHUNK_SIZE):
+        """批量预测类别 (票数/概率相同时取编号较小的类别，与 sklearn 一致)"""
+        return self.classes[np.argmax(self.predict_proba(X, voting, chunk_size), axis=1)]
+
+
+# --- Decision Path Tracing ---
+# 一批样本的决策路径：indicator 是 (样本数, 节点数) 的 CSR 稀疏矩阵 (与 sklearn 的 decision_path 相同，
+# 第 i 行中为 1 的列就是第 i 个样本从根到叶经过的节点)，leaves 是每个样本到达的叶节点
+DecisionPaths = namedtuple('DecisionPaths', ['indicator', 'leaves'])
+
+class PathTracer:
+    """
+    批量追踪决策路径 (sklearn 模型或 ArrayTree)。树中每个叶节点的路径是唯一的，所以先用 CompiledTree 一次算出所有样本的叶节点，
+    再把 "叶节点 -> 根到叶的节点序列" 查表展开成 CSR 矩阵，整个过程没有逐样本的 Python 循环。
+    """
+    def __init__(self, model):
+        tree = getattr(model, 'tree_', model)
+        self.n_nodes = tree.node_count
+        self.compiled = CompiledTree(model)
+        self.feature = np.asarray(tree.feature[:self.n_nodes])
+        self.threshold = np.asarray(tree.threshold[:self.n_nodes])
+        self.children_left = np.asarray(tree.children_left[:self.n_nodes])
+        self.is_leaf = self.compiled.is_leaf
+        self.leaf_class = self.compiled.leaf_class
+        self.classes = self.compiled.classes
+        # 逐层求出每个节点的父节点和深度 (循环次数等于树的深度)
+        self.parent = np.full(self.n_nodes, -1, dtype=np.intp)
+        self.depth = np.zeros(self.n_nodes, dtype=np.intp)
+        level = np.array([0])
+        while len(level):
+            level = level[~self.is_leaf[level]]
+            children = np.concatenate([self.children_left[level], tree.children_right[:self.n_nodes][level]])
+            self.parent[children] = np.tile(level, 2)
+            self.depth[children] = np.tile(self.depth[level], 2) + 1
+            level = children
+
+    def node_path(self, node_id):
+        """从根节点到 node_id 的节点编号 (含两端)"""
+        path = [int(node_id)]
+        while path[-1] != 0:
+            path.append(int(self.parent[path[-1]]))
+        return np.array(path[::-1], dtype=np.intp)
+
+    def trace(self, X, chunk_size=PREDICT_CHUNK_SIZE):
+        """返回所有样本的决策路径 (DecisionPaths)"""
+        from scipy.sparse import csr_matrix # sklearn 的依赖；用到路径追踪时才导入
+
+        leaves = self.compiled.apply(X, chunk_size)
+        unique_leaves, inverse = np.unique(leaves, return_inverse=True)
+        # 每个出现过的叶节点的路径，按根到叶的顺序首尾相接存放在 flat_paths 中
+        lengths = self.depth[unique_leaves] + 1
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        flat_paths = np.empty(offsets[-1], dtype=np.intp)
+        current = unique_leaves.copy()
+        for step in range(int(lengths.max(initial=0))): # 从叶节点往上走，写在各自路径的末尾往前第 step 个位置
+            alive = step < lengths
+            flat_paths[offsets[1:][alive] - 1 - step] = current[alive]
+            current[alive] = self.parent[current[alive]]
+
+        # 按样本展开：第 i 行的路径就是其叶节点的路径
+        row_lengths = lengths[inverse]
+        indptr = np.concatenate([[0], np.cumsum(row_lengths)])
+        starts = np.repeat(offsets[:-1][inverse] - indptr[:-1], row_lengths)
+        indices = flat_paths[starts + np.arange(indptr[-1])]
+        indicator = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                               shape=(len(leaves), self.n_nodes))
+        return DecisionPaths(indicator, leaves)
+
+    def node_visits(self, paths):
+        """每个节点被多少个样本经过 (根节点为样本总数)"""
+        return np.bincount(paths.indicator.indices, minlength=self.n_nodes)
+
+    def common_paths(self, paths, top=10):
+        """
+        最常见的路径：路径由叶节点唯一确定，按到达每个叶节点的样本数从多到少排列
+        返回 [(叶节点, 样本数, 根到叶的节点编号)]，最多 top 条
+        """
+        counts = np.bincount(paths.leaves, minlength=self.n_nodes)
+        order = np.argsort(-counts, kind='stable')[:top]
+        return [(int(leaf), int(counts[leaf]), self.node_path(leaf)) for leaf in order if counts[leaf] > 0]
+
+    def explain(self, x, path):
+        """
+        一个样本沿路径的每一步：[(节点, 特征, 阈值, 样本的取值, 是否走向左子树)]，最后一项是叶节点 (后四项为 None)
+        path 为该样本的路径 (例如 paths.indicator[i].indices)
+        """
+        steps = []
+        for node_id, next_id in zip(path[:-1], path[1:]):
+            feature = int(self.feature[node_id])
+            steps.append((int(node_id), feature, float(self.threshold[node_id]), float(x[feature]),
+                          bool(next_id == self.children_left[node_id])))
+        steps.append((int(path[-1]), None, None, None, None))
+        return steps
+
+
+# --- Depth Truncation and Pruning ---
+SUBTREE_CACHE_SIZE = 64 # 每个截断器/剪枝路径最多保留的子树个数 (按生成顺序淘汰)
+
+class TreeTruncator:
+    """
+    由一棵完全生长的树 (sklearn 模型或 ArrayTree) 直接得到任意 max_depth 的树，不需要重新训练：
+    每个节点的分割只取决于落入它的样本，深度受限的树就是完全树去掉深于 max_depth 的部分，
+    内部节点本来就保存着各类别的样本数，截断后直接作为叶子的预测依据。
+    构建时 O(节点数) 算出每个节点的深度和父节点；truncate() / predict() 每个深度也只需 O(节点数)。
+    X: 可选的参考数据 (通常是训练集)，构建时在完全树上路由一次，之后 predict() 不必再遍历树
+    """
+    def __init__(self, model, X=None):
+        tree = getattr(model, 'tree_', model)
+        n_nodes = tree.node_count
+        self.classes = np.asarray(model.classes_ if hasattr(model, 'classes_') else model.classes)
+        self.criterion = getattr(model, 'criterion', 'gini')
+        self.input_dtype = np.float32 if hasattr(model, 'tree_') else getattr(model, 'input_dtype', np.float64)
+        self.feature = np.asarray(tree.feature[:n_nodes])
+        self.threshold = np.asarray(tree.threshold[:n_nodes])
+        self.children_left = np.asarray(tree.children_left[:n_nodes])
+        self.children_right = np.asarray(tree.children_right[:n_nodes])
+        self.impurity = np.asarray(tree.impurity[:n_nodes])
+        self.n_node_samples = np.asarray(tree.n_node_samples[:n_nodes])
+        values = node_class_values(tree)
+        if hasattr(model, 'tree_'): # 新版 sklearn 的 value 保存的是类别比例，换算回样本数
+            totals = values.sum(axis=1, keepdims=True)
+            values = values / np.where(totals > 0, totals, 1) * self.n_node_samples[:, None]
+        self.counts = values
+        self.node_class = np.argmax(values, axis=1)
+        self.is_leaf = self.children_left == TREE_LEAF
+
+        # 按层遍历一次：levels[d] 是深度为 d 的所有节点，parent[i] 是节点 i 的父节点
+        self.depth = np.zeros(n_nodes, dtype=np.intp)
+        self.parent = np.full(n_nodes, -1, dtype=np.intp)
+        self.levels = []
+        level = np.zeros(1, dtype=np.intp)
+        while len(level):
+            self.depth[level] = len(self.levels)
+            self.levels.append(level)
+            internal = level[~self.is_leaf[level]]
+            self.parent[self.children_left[internal]] = internal
+            self.parent[self.children_right[internal]] = internal
+            level = np.concatenate([self.children_left[internal], self.children_right[internal]])
+        self.max_depth = len(self.levels) - 1
+        self.compiled = CompiledTree(model) # 新数据先在完全树中找到叶子，再映射到截断后的树
+        self.leaves = None if X is None else self.compiled.apply(X) # 参考数据在完全树中落入的叶子
+        self._cache = {}
+        self._cache_lock = threading.Lock() # 截断器通过 st.cache_resource 被所有会话 (各自的线程) 共享
+
+    def _cached(self, key, compute):
+        """
+        按 key 缓存子树等结果，超过 SUBTREE_CACHE_SIZE 个时淘汰最早的
+        compute() 在锁外执行 (它可能再调用 _cached)，两个线程同时算同一个键时保留先写入的结果
+        """
+        with self._cache_lock:
+            value = self._cache.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+            while len(self._cache) >= SUBTREE_CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = value
+        return value
+
+    def _collapse(self, collapsed, first_level=1):
+        """
+        把 collapsed 标记的内部节点变成叶子，返回每个节点在新树中对应的节点：
+        保留的节点对应自己，被去掉的节点对应变成叶子的那个祖先。父节点总在上一层，逐层继承即可
+        first_level 之前的各层不会被去掉，可以跳过
+        """
+        mapping = np.arange(len(self.depth))
+        for level in self.levels[max(first_level, 1):]:
+            parents = self.parent[level]
+            cut = collapsed[parents] | (mapping[parents] != parents)
+            mapping[level] = np.where(cut, mapping[parents], level)
+        return mapping
+
+    def _subtree(self, mapping):
+        """由 _collapse 的结果构建 ArrayTree (保留的节点按原来的顺序重新编号)"""
+        kept = np.flatnonzero(mapping == np.arange(len(mapping)))
+        new_ids = np.full(len(mapping), TREE_LEAF, dtype=np.intp)
+        new_ids[kept] = np.arange(len(kept))
+        left = self.children_left[kept]
+        internal = ~self.is_leaf[kept]
+        internal[internal] = mapping[left[internal]] == left[internal] # 子节点被去掉的节点变成叶子
+        tree = ArrayTree(self.classes, capacity=0, criterion=self.criterion, input_dtype=self.input_dtype)
+        tree.feature = np.where(internal, self.feature[kept], TREE_UNDEFINED).astype(np.intp)
+        tree.threshold = np.where(internal, self.threshold[kept], TREE_UNDEFINED).astype(np.float64)
+        tree.children_left = np.where(internal, new_ids[left], TREE_LEAF)
+        tree.children_right = np.where(internal, new_ids[self.children_right[kept]], TREE_LEAF)
+        tree.value = self.counts[kept]
+        tree.impurity = self.impurity[kept].astype(np.float64)
+        tree.n_node_samples = self.n_node_samples[kept].astype(np.intp)
+        tree.node_count = len(kept)
+        tree.max_depth = int(self.depth[kept].max())
+        return tree
+
+    def _predict(self, mapping, leaves):
+        leaves = self.leaves if leaves is None else leaves
+        return self.classes[self.node_class[mapping[leaves]]]
+
+    def ancestors(self, max_depth):
+        """每个节点在截断后的树中对应的节点 (深于 max_depth 的节点映射到它在第 max_depth 层的祖先)"""
+        max_depth = min(max_depth, self.max_depth)
+        return self._cached(('ancestors', max_depth),
+                            lambda: self._collapse(self.depth >= max_depth, first_level=max_depth + 1))
+
+    def truncate(self, max_depth):
+        """返回截断到 max_depth 层的 ArrayTree；同一深度只构建一次"""
+        max_depth = min(max_depth, self.max_depth)
+        return self._cached(('truncate', max_depth), lambda: self._subtree(self.ancestors(max_depth)))
+
+    def predict(self, max_depth, leaves=None):
+        """
+        深度为 max_depth 的树的预测，由样本在完全树中的叶子编号直接映射得到 (不再遍历树)
+        leaves 省略时使用构建时传入的参考数据
+        """
+        return self._predict(self.ancestors(max_depth), leaves)
+
+    def node_counts(self, X, y):
+        """X, y 在完全树每个节点上的各类别样本数 (叶子处计数，再逐层向上累加)"""
+        leaves = self.leaves if X is None else self.compiled.apply(X)
+        class_ids = np.searchsorted(self.classes, y)
+        counts = np.zeros((len(self.depth), len(self.classes)), dtype=np.intp)
+        np.add.at(counts, (leaves, class_ids), 1)
+        for level in reversed(self.levels[1:]):
+            np.add.at(counts, self.parent[level], counts[level])
+        return counts
+
+    def accuracy_by_depth(self, X=None, y=None):
+        """
+        截断到每个深度 (下标 d = 0..max_depth) 的树在 X, y 上的准确率，一次 O(节点数 + 样本数) 全部算出：
+        深度为 d 的树的叶子是第 d 层的所有节点，加上更浅处本来就是叶子的节点
+        """
+        counts = self.node_counts(X, y)
+        correct = counts[np.arange(len(counts)), self.node_class] # 节点作为叶子时预测正确的样本数
+        n_levels = self.max_depth + 1
+        at_depth = np.bincount(self.depth, weights=correct, minlength=n_levels)
+        leaves_at_depth = np.bincount(self.depth[self.is_leaf], weights=correct[self.is_leaf], minlength=n_levels)
+        shallower_leaves = np.concatenate([[0], np.cumsum(leaves_at_depth)[:-1]])
+        return (at_depth + shallower_leaves) / len(y)
+
+def truncate_tree(model, max_depth):
+    """把完全生长的树截断到 max_depth 层，返回 ArrayTree (见 TreeTruncator)"""
+    return TreeTruncator(model).truncate(max_depth)
+
+
+class PruningPath(TreeTruncator):
+    """
+    代价复杂度剪枝 (Cost-Complexity Pruning) 的完整路径，由完全生长的树一次算出，与 sklearn 的
+    cost_complexity_pruning_path / ccp_alpha 逐步一致：每一步剪掉有效 alpha 最小的分支
+    (alpha 相同时剪编号最小的)，ccp_alphas[s] / impurities[s] 是第 s 步的有效 alpha 和子树叶子的不纯度之和。
+    每个内部节点只记录它在哪一步变成叶子 (prune_step)，任意一步的子树都由此 O(节点数) 得到。
+    """
+    def __init__(self, model, X=None):
+        super().__init__(model, X)
+        n_nodes = len(self.depth)
+        # r_node: 节点变成叶子时对总代价的贡献；r_branch / n_leaves: 当前子树中该分支的代价和叶子数
+        # 累加顺序与 sklearn 相同 (按叶子编号逐个加到所有祖先上)，alpha 相等时的选择才会一致
+        r_node = self.n_node_samples * self.impurity / self.n_node_samples[0]
+        leaf_ids = np.flatnonzero(self.is_leaf)
+        branch_nodes, branch_leaves = [leaf_ids], [leaf_ids]
+        ancestors = leaf_ids
+        while True:
+            ancestors = self.parent[ancestors]
+            has_parent = ancestors >= 0
+            if not has_parent.any():
+                break
+            ancestors = ancestors[has_parent]
+            branch_nodes.append(ancestors)
+            branch_leaves.append(branch_leaves[-1][has_parent])
+        branch_nodes, branch_leaves = np.concatenate(branch_nodes), np.concatenate(branch_leaves)
+        order = np.argsort(branch_leaves, kind='stable') # 先按叶子编号，同一叶子由近到远
+        r_branch = np.zeros(n_nodes)
+        np.add.at(r_branch, branch_nodes[order], r_node[branch_leaves[order]])
+        n_leaves = np.bincount(branch_nodes, minlength=n_nodes)
+
+        def alpha(node):
+            return (r_node[node] - r_branch[node]) / (n_leaves[node] - 1)
+
+        # 最小堆 + 版本号：分支被剪掉后祖先的 alpha 会变化，旧的堆条目按版本号作废
+        internal_nodes = np.flatnonzero(~self.is_leaf)
+        heap = list(zip(alpha(internal_nodes).tolist(), internal_nodes.tolist(), [0] * len(internal_nodes)))
+        heapq.heapify(heap)
+        # 逐个节点的更新用 Python 列表比 NumPy 标量索引快得多
+        r_branch, n_leaves, r_node = r_branch.tolist(), n_leaves.tolist(), r_node.tolist()
+        parent = self.parent.tolist()
+        children_left, children_right = self.children_left.tolist(), self.children_right.tolist()
+        version = [0] * n_nodes
+        alive = [True] * n_nodes
+        prune_step = {}
+        ccp_alphas, impurities = [0.0], [r_branch[0]]
+        while heap:
+            effective_alpha, node, node_version = heapq.heappop(heap)
+            if not alive[node] or node_version != version[node]:
+                continue
+            # 分支下的节点都不再属于子树
+            stack = [children_left[node], children_right[node]]
+            while stack:
+                descendant = stack.pop()
+                if alive[descendant]:
+                    alive[descendant] = False
+                    if children_left[descendant] != TREE_LEAF:
+                        stack += [children_left[descendant], children_right[descendant]]
+            prune_step[node] = len(ccp_alphas)
+            n_pruned_leaves = n_leaves[node] - 1
+            n_leaves[node] = 0
+            r_diff = r_node[node] - r_branch[node]
+            r_branch[node] = r_node[node]
+            ancestor = parent[node]
+            while ancestor >= 0:
+                n_leaves[ancestor] -= n_pruned_leaves
+                r_branch[ancestor] += r_diff
+                version[ancestor] += 1
+                heapq.heappush(heap, ((r_node[ancestor] - r_branch[ancestor]) / (n_leaves[ancestor] - 1),
+                                      ancestor, version[ancestor]))
+                ancestor = parent[ancestor]
+            ccp_alphas.append(effective_alpha)
+            impurities.append(r_branch[0])
+        self.ccp_alphas = np.array(ccp_alphas)
+        self.impurities = np.array(impurities)
+        self.n_steps = len(ccp_alphas)
+        self.prune_step = np.full(n_nodes, self.n_steps, dtype=np.intp) # 从不单独剪掉的节点记为 n_steps
+        self.prune_step[list(prune_step)] = list(prune_step.values())
+
+        # 节点 i 在第 [leaf_from, leaf_until) 步是子树的叶子：原来的叶子从第 0 步开始，
+        # 内部节点从它被剪掉的那一步开始，到它的某个祖先被剪掉为止
+        removed = np.full(n_nodes, self.n_steps, dtype=np.intp)
+        for level in self.levels[1:]:
+            parents = self.parent[level]
+            removed[level] = np.minimum(removed[parents], self.prune_step[parents])
+        leaf_from = np.where(self.is_leaf, 0, self.prune_step)
+        self._leaf_steps = (leaf_from, np.maximum(removed, leaf_from))
+        self.n_leaves = self.path_sum(np.ones(n_nodes, dtype=np.intp))
+
+    def path_sum(self, node_values):
+        """每一步子树的所有叶子上 node_values 之和 (按节点成为叶子的区间做差分，O(节点数 + 步数))"""
+        leaf_from, leaf_until = self._leaf_steps
+        totals = np.zeros(self.n_steps + 1, dtype=np.asarray(node_values).dtype)
+        np.add.at(totals, leaf_from, node_values)
+        np.subtract.at(totals, leaf_until, node_values)
+        return np.cumsum(totals[:-1])
+
+    def accuracy_path(self, X=None, y=None):
+        """每一步子树在 X, y 上的准确率 (X 省略时使用构建时传入的参考数据)"""
+        counts = self.node_counts(X, y)
+        return self.path_sum(counts[np.arange(len(counts)), self.node_class]) / len(y)
+
+    def step(self, ccp_alpha):
+        """ccp_alpha 对应的剪枝步数：与 sklearn 一样，剪到第一个有效 alpha 大于 ccp_alpha 的步骤之前"""
+        return int(np.searchsorted(np.maximum.accumulate(self.ccp_alphas[1:]), ccp_alpha, side='right'))
+
+    def step_mapping(self, step):
+        """每个节点在第 step 步的子树中对应的节点"""
+        return self._cached(('step_mapping', step), lambda: self._collapse(self.prune_step <= step))
+
+    def prune(self, ccp_alpha):
+        """返回 ccp_alpha 对应的剪枝后的 ArrayTree (与 sklearn 用同样的 ccp_alpha 训练的树相同)"""
+        step = self.step(ccp_alpha)
+        return self._cached(('prune', step), lambda: self._subtree(self.step_mapping(step)))
+
+    def predict_pruned(self, ccp_alpha, leaves=None):
+        """剪枝后的树的预测，由完全树中的叶子编号直接映射得到"""
+        return self._predict(self.step_mapping(self.step(ccp_alpha)), leaves)